@@ -0,0 +1,204 @@
+"""
+Offline throughput benchmark for upload_therapist_directory.
+
+Runs the real pipeline against local stand-ins (see fake_services.py): a page
+server, a fake OpenAI endpoint and a fake Pinecone index, so it costs no quota
+and never touches clinic websites. Every run starts with empty caches and
+reports profiles/sec, per-stage latency (from the run's PerformanceTracker)
+and peak Python memory (tracemalloc) for each concurrency setting.
+
+Usage:
+    python benchmark_ingest.py --profiles 200 --concurrency 1,4,8
+    python benchmark_ingest.py --pages-dir saved_pages/ --llm-latency 0.5 --rpm 300
+    python benchmark_ingest.py --json results.json
+    python benchmark_ingest.py --baseline results.json  # exit 1 on more errors or lower throughput
+"""
+
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from fake_services import FakeOpenAI, FakePinecone, FakePineconeIndex, PageServer
+
+# The stages worth comparing between runs, in pipeline order.
+REPORT_STAGES = ["fetch", "parse", "extract", "llm:long_summary", "embed", "upsert"]
+
+
+def workers_for(concurrency):
+    """Scale the slow, I/O-bound stages with the concurrency setting."""
+    return {
+        "fetch": 2 * concurrency,
+        "parse": max(1, concurrency // 2),
+        "extract": concurrency,
+        "llm": concurrency,
+    }
+
+
+def fresh_state(upload_therapist, workdir, index, concurrency):
+    """Point every cache and store at an empty directory, so runs don't warm each other up."""
+    import openai_limiter
+    from embedding_cache import EmbeddingCache
+    from http_fetch import Fetcher, PageStore
+    from ingest_journal import IngestJournal
+    from llm_cache import LLMCache
+    from page_state import PageStateStore
+    from vector_manifest import VectorManifest
+
+    u = upload_therapist
+    u.embedding_cache = EmbeddingCache(os.path.join(workdir, "embeddings.sqlite3"))
+    u.page_state = PageStateStore(os.path.join(workdir, "page_state.sqlite3"))
+    u.llm_cache = LLMCache(os.path.join(workdir, "llm.sqlite3"), mode="off")
+    u.journal = IngestJournal(os.path.join(workdir, "journal.sqlite3"))
+    u.fetcher = Fetcher(
+        PageStore(os.path.join(workdir, "pages")),
+        max_per_host=workers_for(concurrency)["fetch"],
+        politeness_delay=0,
+    )
+    u.VectorManifest = lambda: VectorManifest(os.path.join(workdir, "manifest.json"))
+    u.get_index = lambda: index
+    u.PERF_DIR = os.path.join(workdir, "perf")
+    openai_limiter._controllers.clear()
+
+
+def run_once(upload_therapist, links, concurrency, pinecone, quiet=True):
+    with tempfile.TemporaryDirectory() as workdir:
+        pinecone.vectors.clear()
+        fresh_state(upload_therapist, workdir, FakePineconeIndex(pinecone.url), concurrency)
+
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+        output = io.StringIO() if quiet else sys.stdout
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(output):
+            errors = upload_therapist.upload_therapist_directory(
+                links, workers=workers_for(concurrency)
+            )
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        summaries = sorted(glob.glob(os.path.join(workdir, "perf", "*-summary.json")))
+        with open(summaries[-1]) as f:
+            percentiles = json.load(f)["percentiles"]
+
+    return {
+        "concurrency": concurrency,
+        "profiles": len(links),
+        "errors": len(errors),
+        "seconds": elapsed,
+        "profiles_per_sec": len(links) / elapsed,
+        "peak_mb": peak / 1024 / 1024,
+        "stages": percentiles,
+    }
+
+
+def print_results(results):
+    print(f"{'conc':>5}{'profiles':>10}{'errors':>8}{'secs':>9}{'prof/s':>9}{'peak MB':>9}")
+    for result in results:
+        print(
+            f"{result['concurrency']:>5}{result['profiles']:>10}{result['errors']:>8}"
+            f"{result['seconds']:>9.2f}{result['profiles_per_sec']:>9.2f}{result['peak_mb']:>9.1f}"
+        )
+    print()
+    print(f"{'conc':>5}  {'stage':<20}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for result in results:
+        for stage in REPORT_STAGES:
+            row = result["stages"].get(stage)
+            if row:
+                print(
+                    f"{result['concurrency']:>5}  {stage:<20}{row['count']:>7}"
+                    f"{row['p50']:>10.1f}{row['p95']:>10.1f}{row['p99']:>10.1f}"
+                )
+
+
+def regressions(results, baseline, tolerance):
+    """
+    Settings with more errors than the baseline (any, if it has no run at that
+    setting), or whose throughput dropped more than tolerance below it. A run
+    where profiles fail finishes faster, so throughput alone can't tell.
+    """
+    previous = {result["concurrency"]: result for result in baseline}
+    found = []
+    for result in results:
+        before = previous.get(result["concurrency"])
+        allowed_errors = before["errors"] if before else 0
+        if result["errors"] > allowed_errors:
+            found.append(
+                f"concurrency {result['concurrency']}: {result['errors']} of "
+                f"{result['profiles']} profiles failed (baseline: {allowed_errors})"
+            )
+        elif before and result["profiles_per_sec"] < before["profiles_per_sec"] * (1 - tolerance):
+            found.append(
+                f"concurrency {result['concurrency']}: {before['profiles_per_sec']:.2f} -> "
+                f"{result['profiles_per_sec']:.2f} profiles/sec"
+            )
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profiles", type=int, default=100, help="generated profiles to ingest")
+    parser.add_argument("--pages-dir", help="serve saved *.html pages instead of generated ones")
+    parser.add_argument("--concurrency", default="1,4,8", help="comma-separated settings to run")
+    parser.add_argument("--page-latency", type=float, default=0.05, help="seconds per page request")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="seconds per chat completion")
+    parser.add_argument("--embedding-latency", type=float, default=0.05, help="seconds per embeddings request")
+    parser.add_argument("--rpm", type=int, help="fake OpenAI requests per minute per model before 429s")
+    parser.add_argument("--pinecone-latency", type=float, default=0.02, help="seconds per Pinecone request")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--baseline", help="results file from an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed throughput drop vs the baseline")
+    parser.add_argument("--verbose", action="store_true", help="show the pipeline's own output")
+    args = parser.parse_args()
+
+    pages = PageServer(args.pages_dir, count=args.profiles, latency=args.page_latency).start()
+    openai = FakeOpenAI(
+        latency=args.llm_latency, embedding_latency=args.embedding_latency, rpm=args.rpm
+    ).start()
+    pinecone = FakePinecone(latency=args.pinecone_latency).start()
+
+    # The OpenAI client is built when upload_therapist is imported.
+    os.environ["OPENAI_BASE_URL"] = openai.url + "/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    import upload_therapist
+
+    results = []
+    try:
+        links = pages.links()
+        for concurrency in [int(value) for value in args.concurrency.split(",")]:
+            print(f"Running {len(links)} profiles at concurrency {concurrency}...")
+            results.append(
+                run_once(upload_therapist, links, concurrency, pinecone, quiet=not args.verbose)
+            )
+    finally:
+        pages.stop()
+        openai.stop()
+        pinecone.stop()
+
+    print()
+    print_results(results)
+    print(f"\nFake OpenAI: {openai.stats}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(results, json.load(f), args.tolerance)
+        if found:
+            print("\nRegressions:")
+            for line in found:
+                print(f"  {line}")
+            sys.exit(1)
+        print("\nNo regressions against the baseline.")
+
+
+if __name__ == "__main__":
+    main()
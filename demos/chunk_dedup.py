@@ -0,0 +1,105 @@
+"""
+Deduplicates chunks across files before they are embedded.
+
+Repos full of similar JSON configs and license headers split into many
+identical chunks. Chunks are keyed by a hash of their text with whitespace
+collapsed (the same normalization as the embedding cache), each unique chunk
+is kept once, and every place it came from is listed in its "sources"
+metadata as "<source>#<chunk number within that source>".
+
+Vector IDs derived from the key (content_id) are content addressed within a
+scope (e.g. one repo): the same text always maps to the same vector, so
+uploading it again overwrites rather than duplicates, while two scopes that
+manage their vectors separately never share one.
+
+Boilerplate can appear in hundreds of files, so at most MAX_SOURCES locations
+are stored, fewer if the metadata would pass Pinecone's 40KB limit, and
+"source_count" always has the full number.
+
+Usage:
+    deduper = ChunkDeduper()
+    for doc in docs:
+        deduper.add(doc)
+    unique = list(deduper.documents())
+    print(deduper.stats())  # {"chunks": 900, "unique": 240, "dedup_ratio": 3.75}
+"""
+
+import hashlib
+import uuid
+
+from embedding_cache import normalize_text
+from pinecone_writer import valid_metadata_size
+
+MAX_SOURCES = 100
+
+
+def chunk_key(text):
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def content_id(key, scope=""):
+    """Deterministic vector ID for a chunk key within a scope."""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"chunk:{scope}:{key}"))
+
+
+def location(source, number):
+    return f"{source}#{number}"
+
+
+def set_sources(metadata, locations, text=""):
+    """
+    Store up to MAX_SOURCES locations in metadata["sources"] and their total
+    in metadata["source_count"], keeping fewer if the metadata, with the chunk
+    text the vector store adds under "text", would be over Pinecone's limit.
+    """
+    kept = list(locations[:MAX_SOURCES])
+    while True:
+        metadata["sources"] = kept
+        metadata["source_count"] = len(locations)
+        if not kept or valid_metadata_size({**metadata, "text": text}, verbose=False):
+            return metadata
+        kept = kept[: len(kept) // 2]
+
+
+def dedup_stats(chunks, unique):
+    """dedup_ratio is chunks per unique chunk, so 1.0 means nothing was duplicated."""
+    return {
+        "chunks": chunks,
+        "unique": unique,
+        "dedup_ratio": round(chunks / unique, 2) if unique else 1.0,
+    }
+
+
+class ChunkDeduper:
+    def __init__(self, scope=""):
+        self.scope = scope
+        self.unique = {}  # key -> first Document with that text
+        self.sources = {}  # key -> [locations]
+        self._numbers = {}  # source -> chunks seen from it so far
+        self.chunks = 0
+
+    def add(self, doc):
+        """Add a chunk; returns True if its text hadn't been seen before."""
+        source = doc.metadata.get("source")
+        number = self._numbers.get(source, 0)
+        self._numbers[source] = number + 1
+        self.chunks += 1
+        key = chunk_key(doc.page_content)
+        self.sources.setdefault(key, []).append(location(source, number))
+        if key in self.unique:
+            return False
+        self.unique[key] = doc
+        return True
+
+    def documents(self):
+        """
+        The unique chunks, in first-seen order, with their locations (see
+        set_sources) and the vector ID in metadata["vector_id"].
+        """
+        for key, doc in self.unique.items():
+            set_sources(doc.metadata, self.sources[key], doc.page_content)
+            doc.metadata["vector_id"] = content_id(key, self.scope)
+            yield doc
+
+    def stats(self):
+        return dedup_stats(self.chunks, len(self.unique))
@@ -2,100 +2,728 @@
 pip install --upgrade --quiet  youtube-transcript-api pypdf langchain-openai langchain pinecone
 """
 from langchain_pinecone import PineconeVectorStore
-from langchain_community.document_loaders import PyPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_openai import OpenAIEmbeddings
-from langchain_community.document_loaders import (
-    PyPDFLoader,
-    GithubFileLoader,
-)
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
 from dotenv import load_dotenv
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pypdf import PdfReader
+import functools
+import itertools
 import os
+import tempfile
+import threading
+import time
+import uuid
+
+from chunk_dedup import ChunkDeduper, chunk_key, content_id, dedup_stats, location, set_sources
+from embedding_cache import EmbeddingCache
+from github_loader import (
+    GithubArchive,
+    RepoManifest,
+    archive_files,
+    github_manifest_path,
+    is_code_file,
+    vector_locations,
+)
+from local_index import get_local_index, use_local_backend
+from pdf_manifest import PdfManifest, chunk_id, folder_scope, pdf_manifest_path
+from pipeline import Pipeline, Stage
+from retriever import TEXT_KEY, Retriever
+
 load_dotenv()
 
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps a LangChain embeddings model with the on-disk EmbeddingCache,
+    so unchanged chunks are never embedded twice.
+    """
+
+    def __init__(self, embeddings_model, cache=None):
+        self.embeddings_model = embeddings_model
+        self.cache = cache or EmbeddingCache()
+        self.model = embeddings_model.model
+        self.dimensions = getattr(embeddings_model, "dimensions", None)
+
+    def embed_documents(self, texts):
+        vectors = self.cache.get_many(self.model, self.dimensions, texts)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            new_vectors = self.embeddings_model.embed_documents([texts[i] for i in missing])
+            self.cache.put_many(
+                self.model, self.dimensions, [texts[i] for i in missing], new_vectors
+            )
+            for i, vector in zip(missing, new_vectors):
+                vectors[i] = vector
+        return vectors
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+class LocalVectorStore:
+    """
+    The part of PineconeVectorStore used here (add_documents, delete), over a
+    LocalVectorIndex. Chunk text is kept under the same "text" metadata key.
+    """
+
+    def __init__(self, index, embedding):
+        self.index = index
+        self.embedding = embedding
+
+    def add_documents(self, documents, ids=None):
+        ids = ids or [str(uuid.uuid4()) for _ in documents]
+        vectors = self.embedding.embed_documents([doc.page_content for doc in documents])
+        self.index.upsert(
+            vectors=[
+                {"id": vector_id, "values": vector, "metadata": {**doc.metadata, TEXT_KEY: doc.page_content}}
+                for vector_id, vector, doc in zip(ids, vectors, documents)
+            ]
+        )
+        return ids
+
+    def delete(self, ids):
+        self.index.delete(ids=ids)
+
+
+def get_vector_store(index_name, embedding):
+    """Pinecone, or the local index with VECTOR_BACKEND=local."""
+    if use_local_backend():
+        return LocalVectorStore(get_local_index(index_name), embedding)
+    return PineconeVectorStore.from_existing_index(embedding=embedding, index_name=index_name)
+
+
+def get_embeddings_model():
+    """text-embedding-3-small behind the on-disk cache."""
+    return CachedEmbeddings(
+        OpenAIEmbeddings(
+            model="text-embedding-3-small",
+            openai_api_key=os.getenv("OPENAI_API_KEY"),
+            disallowed_special=(),
+        )
+    )
+
+
+def _github_splitter():
+    return RecursiveCharacterTextSplitter(chunk_size=250, chunk_overlap=50)
+
+
+def _github_doc(path, content, commit):
+    return Document(
+        page_content=content.decode("utf-8", errors="replace"),
+        metadata={"source": path, "path": path, "sha": commit},
+    )
+
+
+def iter_github_docs(username, repository, ref=None, file_filter=is_code_file, api_url=None):
+    """
+    Yield chunks of the JSX and JSON files in a repo, one file at a time.
+
+    The repo is fetched as one tarball of the resolved commit, instead of one
+    API call per file.
+    """
+    archive = GithubArchive(username, repository, api_url=api_url)
+    text_splitter = _github_splitter()
+    commit = archive.resolve(ref)
+    with tempfile.TemporaryDirectory() as directory:
+        tarball = archive.download(commit, directory)
+        for path, content in archive_files(tarball, file_filter):
+            yield from text_splitter.split_documents([_github_doc(path, content, commit)])
+
+
 def github_files_to_docs(username, repository):
+    """Load all the JSX and JSON files from a repo."""
+    return list(iter_github_docs(username, repository))
+
+
+def _repo_dedup_stats(locations):
+    """dedup_stats for a repo from RepoManifest.locations()."""
+    return dedup_stats(sum(len(places) for places in locations.values()), len(locations))
+
+
+def sync_github_repo(
+    username,
+    repository,
+    index_name="ai41",
+    ref=None,
+    file_filter=is_code_file,
+    api_url=None,
+    manifest=None,
+):
     """
-    Load all the JSX and JSON files from a repo.
+    Bring the index in line with a GitHub repo, using a RepoManifest.
+
+    When the ref still points at the commit indexed last time, this is one API
+    call and nothing else. Otherwise the new commit is downloaded as a single
+    tarball and diffed against the manifest by content hash, and only new and
+    changed files are chunked.
 
-    If you have issues: https://github.com/langchain-ai/langchain/issues/17453
+    Chunks are deduplicated across the whole repo: each distinct text is one
+    vector with an ID addressed by repo and content, listing the "<path>#<chunk>"
+    locations it appears at in metadata["sources"] (capped; see set_sources).
+    Only vectors whose text is new or whose locations moved are uploaded, and
+    vectors no file refers to any more are deleted, including any a failed file
+    did upload. The commit is only recorded once every upload made it, so
+    failures are retried on the next run.
+    Returns {"commit", "new", "changed", "removed", "unchanged", "failed", "dedup"}.
     """
-    loader = GithubFileLoader(
-        repo=f"{username}/{repository}",  # username/repo
-        access_token=os.getenv("GITHUB_PERSONAL_ACCESS_TOKEN"),
-        github_api_url="https://api.github.com",
-        file_filter=lambda file_path: file_path.endswith(
-            (".jsx", ".json")
-        ),  # add file types in a tuple
+    manifest = manifest or RepoManifest(github_manifest_path(index_name, username, repository))
+    archive = GithubArchive(username, repository, api_url=api_url)
+    commit = archive.resolve(ref)
+    summary = {"commit": commit, "new": [], "changed": [], "removed": [], "unchanged": 0, "failed": []}
+    if commit == manifest.commit:
+        print(f"{username}/{repository} is already indexed at {commit[:7]}.")
+        summary["unchanged"] = len(manifest.files)
+        summary["dedup"] = _repo_dedup_stats(manifest.locations())
+        return summary
+
+    with tempfile.TemporaryDirectory() as directory:
+        tarball = archive.download(commit, directory)
+        diff = manifest.diff(tarball, file_filter)
+        pending = {**diff["new"], **diff["changed"]}
+        summary.update(
+            new=sorted(diff["new"]),
+            changed=sorted(diff["changed"]),
+            removed=diff["removed"],
+            unchanged=diff["unchanged"],
+        )
+        print(
+            f"{username}/{repository} @ {commit[:7]}: {len(diff['new'])} new, "
+            f"{len(diff['changed'])} changed, {len(diff['removed'])} removed, "
+            f"{diff['unchanged']} unchanged."
+        )
+        if not pending and not diff["removed"]:
+            manifest.commit = commit
+            manifest.save()
+            summary["dedup"] = _repo_dedup_stats(manifest.locations())
+            return summary
+
+        text_splitter = _github_splitter()
+        texts = {}
+        # Vectors are shared between files of this repo only: another repo
+        # synced into the same index has its own manifest and reference counts.
+        scope = f"{username}/{repository}"
+
+        def chunk_files(paths):
+            ids = {}
+            for path, content in archive_files(tarball, lambda path: path in paths):
+                ids[path] = []
+                for doc in text_splitter.split_documents([_github_doc(path, content, commit)]):
+                    vector_id = content_id(chunk_key(doc.page_content), scope)
+                    texts.setdefault(vector_id, doc.page_content)
+                    ids[path].append(vector_id)
+            return ids
+
+        new_ids = chunk_files(pending)
+        before = manifest.locations()
+        after_files = {
+            path: entry["vector_ids"]
+            for path, entry in manifest.files.items()
+            if path not in diff["removed"]
+        }
+        after_files.update(new_ids)
+        after = vector_locations(after_files)
+        touched = [vector_id for vector_id, places in after.items() if places != before.get(vector_id)]
+
+        # A shared chunk that only lost a location still needs its text to be
+        # re-uploaded; take it from one of the unchanged files that has it.
+        missing = {min(after[vector_id])[0] for vector_id in touched if vector_id not in texts}
+        if missing:
+            chunk_files(missing)
+
+        def touched_docs():
+            for vector_id in touched:
+                places = sorted(after[vector_id])
+                metadata = {"source": places[0][0], "path": places[0][0], "sha": commit}
+                set_sources(
+                    metadata,
+                    [location(path, number) for path, number in places],
+                    texts[vector_id],
+                )
+                metadata["vector_id"] = vector_id
+                yield Document(page_content=texts[vector_id], metadata=metadata)
+
+        failed = {}
+        upload_failed = False
+        if touched:
+            report = upload_document_stream(
+                touched_docs(), index_name, id_for=lambda doc: doc.metadata.pop("vector_id")
+            )
+            upload_failed = report["failed"] > 0
+            # Failures are reported by first location; hold back every new or
+            # changed file that shares a vector with a failed one.
+            failed_sources = {}
+            for batch in report["failed_batches"]:
+                for source in batch["sources"]:
+                    failed_sources.setdefault(source, batch["error"])
+            failed_ids = {
+                vector_id: failed_sources[min(after[vector_id])[0]]
+                for vector_id in touched
+                if min(after[vector_id])[0] in failed_sources
+            }
+            for path, vector_ids in new_ids.items():
+                for vector_id in vector_ids:
+                    if vector_id in failed_ids:
+                        failed[path] = failed_ids[vector_id]
+                        break
+
+    for path in pending:
+        if path in failed:
+            # Keep the old version's entry; it is retried next run.
+            print(f"Not recording {path}: {failed[path]}")
+            continue
+        manifest.record(path, pending[path], new_ids[path])
+    for path in diff["removed"]:
+        manifest.forget(path)
+
+    current = manifest.locations()
+    # What a failed file did upload goes too, unless a recorded file has it;
+    # the retry uploads it again.
+    candidates = list(before)
+    for path in failed:
+        candidates.extend(new_ids[path])
+    stale = [vector_id for vector_id in dict.fromkeys(candidates) if vector_id not in current]
+    if stale:
+        db = get_vector_store(index_name, get_embeddings_model())
+        for start in range(0, len(stale), 1000):
+            db.delete(ids=stale[start : start + 1000])
+        print(f"Deleted {len(stale)} stale vectors.")
+    if not upload_failed:
+        manifest.commit = commit
+    manifest.save()
+    summary["failed"] = sorted(failed)
+    summary["dedup"] = _repo_dedup_stats(current)
+    print(
+        f"Dedup: {summary['dedup']['chunks']} chunks stored as {summary['dedup']['unique']} "
+        f"vectors ({summary['dedup']['dedup_ratio']}x)."
     )
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=250, chunk_overlap=50)
-    docs = loader.load_and_split(text_splitter=text_splitter)
-    return docs
+    return summary
+
+
+# Large PDFs are parsed in ranges of this many pages, so one big file can
+# use several workers.
+PDF_PAGES_PER_TASK = 50
+
 
-def pdf_folder_to_docs(folder_path):
+def _load_pdf_range(file_path, start, end, text_splitter=None):
     """
-    Load all PDFs in a directory and split them into documents.
-    Each PDF file is loaded and processed individually using the PyPDFLoader.
+    Parse pages [start, end) of a PDF and split them, in a worker process.
+    Documents carry the same source/page metadata as PyPDFLoader's.
     """
-    # Initialize an empty list to hold all documents from all PDF files.
-    all_docs = []
+    reader = PdfReader(file_path)
+    docs = [
+        Document(
+            page_content=reader.pages[page].extract_text(),
+            metadata={"source": file_path, "page": page},
+        )
+        for page in range(start, end)
+    ]
+    text_splitter = text_splitter or RecursiveCharacterTextSplitter()
+    return text_splitter.split_documents(docs)
+
 
-    # Iterate over each file in the specified directory.
-    for filename in os.listdir(folder_path):
-        # Check if the file is a PDF by its extension.
-        if filename.endswith(".pdf"):
-            # Construct the full path to the PDF file.
-            file_path = os.path.join(folder_path, filename)
-            print(
-                f"Processing {file_path}..."
-            )  # Optional: print the file being processed.
+def _pdf_tasks(file_paths, pages_per_task):
+    """(file_path, start, end) page ranges for every PDF, plus files that can't be opened."""
+    tasks = []
+    errors = []
+    for file_path in file_paths:
+        try:
+            page_count = len(PdfReader(file_path).pages)
+        except Exception as e:
+            errors.append({"file": file_path, "error": str(e)})
+            continue
+        for start in range(0, page_count, pages_per_task):
+            tasks.append((file_path, start, min(start + pages_per_task, page_count)))
+    return tasks, errors
 
-            # Load and split the PDF into documents.
-            loader = PyPDFLoader(file_path)
-            docs = loader.load_and_split()
 
-            # Add the documents from this PDF to the list of all documents.
-            all_docs.extend(docs)
+def _parse_pdf_ranges(tasks, workers, text_splitter=None, max_pending=None):
+    """
+    Yield (task, docs) in task order, docs being the exception if the range
+    failed. At most max_pending ranges (default 2 per worker) are parsed
+    ahead of the consumer, so a slow consumer holds back the pool.
+    """
+    if workers == 1:
+        for task in tasks:
+            try:
+                yield task, _load_pdf_range(*task, text_splitter)
+            except Exception as e:
+                yield task, e
+        return
+
+    max_pending = max_pending or 2 * workers
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        tasks = iter(tasks)
+        while True:
+            while len(pending) < max_pending:
+                task = next(tasks, None)
+                if task is None:
+                    break
+                pending.append((task, pool.submit(_load_pdf_range, *task, text_splitter)))
+            if not pending:
+                return
+            task, future = pending.popleft()
+            try:
+                yield task, future.result()
+            except Exception as e:
+                yield task, e
+
+
+def _pdf_paths(folder_path):
+    return [
+        os.path.join(folder_path, filename)
+        for filename in sorted(os.listdir(folder_path))
+        if filename.endswith(".pdf")
+    ]
+
+
+def iter_pdf_files(
+    file_paths,
+    workers=None,
+    pages_per_task=PDF_PAGES_PER_TASK,
+    text_splitter=None,
+    on_error=None,
+):
+    """
+    Yield the chunks of the given PDFs, in file and page order, while the
+    next page ranges are parsed in worker processes.
+
+    Unlike load_pdf_folder, chunks are passed on as soon as their range is
+    parsed, so a file that fails part way has already yielded its earlier
+    ranges. Failures are printed, and passed to on_error(file_path, message).
+    """
+    tasks, errors = _pdf_tasks(file_paths, pages_per_task)
+    for error in errors:
+        print(f"Error processing {error['file']}: {error['error']}")
+        if on_error:
+            on_error(error["file"], error["error"])
+    workers = workers or os.cpu_count() or 1
+    print(f"Parsing {len(file_paths)} PDFs as {len(tasks)} page ranges on {workers} workers...")
+
+    for task, docs in _parse_pdf_ranges(tasks, workers, text_splitter):
+        if isinstance(docs, Exception):
+            message = f"pages {task[1]}-{task[2] - 1}: {docs}"
+            print(f"Error processing {task[0]} {message}")
+            if on_error:
+                on_error(task[0], message)
+            continue
+        yield from docs
+
+
+def iter_pdf_docs(folder_path, workers=None, pages_per_task=PDF_PAGES_PER_TASK, text_splitter=None):
+    """Yield the chunks of every PDF in a folder; see iter_pdf_files."""
+    yield from iter_pdf_files(_pdf_paths(folder_path), workers, pages_per_task, text_splitter)
+
+
+def load_pdf_folder(
+    folder_path, workers=None, pages_per_task=PDF_PAGES_PER_TASK, text_splitter=None
+):
+    """
+    Parse and split every PDF in a folder on a pool of worker processes.
+
+    Files are handled in sorted filename order and documents come back in file
+    and page order, whatever order the workers finish in. workers defaults to
+    the number of CPUs; workers=1 parses in this process.
+    Returns (docs, errors), errors being [{"file", "error"}] in file order.
+    A file with an error contributes no documents.
+    """
+    file_paths = _pdf_paths(folder_path)
+    tasks, errors = _pdf_tasks(file_paths, pages_per_task)
+    workers = workers or os.cpu_count() or 1
+    print(f"Parsing {len(file_paths)} PDFs as {len(tasks)} page ranges on {workers} workers...")
+
+    failed = {error["file"]: error["error"] for error in errors}
+    results = {}
+    for task, docs in _parse_pdf_ranges(tasks, workers, text_splitter):
+        if isinstance(docs, Exception):
+            failed.setdefault(task[0], f"pages {task[1]}-{task[2] - 1}: {docs}")
+        else:
+            results[task] = docs
+
+    all_docs = []
+    for task in tasks:
+        if task[0] not in failed:
+            all_docs.extend(results[task])
+    errors = [{"file": path, "error": failed[path]} for path in file_paths if path in failed]
+    return all_docs, errors
+
+
+def pdf_folder_to_docs(folder_path, workers=None, pages_per_task=PDF_PAGES_PER_TASK):
+    """
+    Load all PDFs in a directory and split them into documents.
+    PDFs are parsed in parallel (see load_pdf_folder); files that fail are
+    reported and left out.
+    """
+    all_docs, errors = load_pdf_folder(folder_path, workers, pages_per_task)
+    for error in errors:
+        print(f"Error processing {error['file']}: {error['error']}")
 
-    # Optionally, print the length of all documents loaded and the content of a specific one.
     print(f"Total documents loaded: {len(all_docs)}")
 
     return all_docs
 
-def upload_documents_to_pinecone(documents, index_name="ai41"):
-    """Uses the OpenAI Embeddings model to upload a list of documents to a Pinecone index."""
+# Chunks per add_documents call; a failed upload only loses its own batch.
+UPLOAD_BATCH_SIZE = 100
+
+
+class BatchUploadError(Exception):
+    """An upload batch failed. batch numbers it, so its chunks are reported together."""
+
+    def __init__(self, batch, error):
+        super().__init__(str(error))
+        self.batch = batch
+
+
+class UploadProgress:
+    """Counts uploaded and failed chunks and prints progress as batches finish."""
+
+    def __init__(self, every=1000):
+        self.every = every
+        self.uploaded = 0
+        self.failed = 0
+        self.failed_batches = {}  # batch number -> {"error", "chunks", "sources"}
+        self.start = time.monotonic()
+        self._next_report = every
+        self._lock = threading.Lock()
+
+    def on_result(self, doc):
+        with self._lock:
+            self.uploaded += 1
+            self._maybe_report()
+
+    def on_failure(self, failure):
+        with self._lock:
+            self.failed += 1
+            error = failure["error"]
+            # Anything but a BatchUploadError failed on its own.
+            key = error.batch if isinstance(error, BatchUploadError) else ("item", self.failed)
+            batch = self.failed_batches.setdefault(
+                key, {"error": str(error), "chunks": 0, "sources": set()}
+            )
+            batch["chunks"] += 1
+            batch["sources"].add(failure["item"].metadata.get("source"))
+            self._maybe_report()
+
+    def _maybe_report(self):
+        # Caller holds self._lock.
+        if self.uploaded + self.failed >= self._next_report:
+            self._next_report += self.every
+            self.print_progress()
+
+    def print_progress(self):
+        elapsed = time.monotonic() - self.start
+        rate = self.uploaded / elapsed if elapsed else 0.0
+        print(
+            f"Uploaded {self.uploaded} chunks, {self.failed} failed, "
+            f"{rate:.1f} chunks/sec, {elapsed:.0f}s elapsed"
+        )
+
+    def report(self):
+        return {
+            "uploaded": self.uploaded,
+            "failed": self.failed,
+            "failed_batches": [
+                {**batch, "sources": sorted(str(source) for source in batch["sources"])}
+                for batch in self.failed_batches.values()
+            ],
+        }
+
+
+def upload_document_stream(
+    docs,
+    index_name="ai41",
+    batch_size=UPLOAD_BATCH_SIZE,
+    workers=2,
+    progress_every=1000,
+    id_for=None,
+):
+    """
+    Embed and upload chunks from any iterable (e.g. iter_pdf_docs) in batches.
+
+    The iterable is read only as fast as batches are uploaded: at most a few
+    batches per worker are buffered, so memory doesn't depend on the size of
+    the corpus. A batch that fails is reported and skipped; the rest of the
+    upload carries on.
+    id_for(doc) gives each chunk's vector ID; by default Pinecone IDs are random.
+    Returns {"uploaded", "failed", "failed_batches": [{"error", "chunks", "sources"}]}.
+    """
+    embeddings_model = get_embeddings_model()
+    db = get_vector_store(index_name, embeddings_model)
+
+    batch_numbers = itertools.count()
+
+    def upload_batch(batch):
+        number = next(batch_numbers)
+        try:
+            if id_for:
+                db.add_documents(documents=batch, ids=[id_for(doc) for doc in batch])
+            else:
+                db.add_documents(documents=batch)
+        except Exception as e:
+            raise BatchUploadError(number, e) from e
+        return batch
+
+    progress = UploadProgress(every=progress_every)
+    pipeline = Pipeline(
+        [Stage("upload", upload_batch, workers, batch_size=batch_size, batch_wait=1.0)],
+        max_queue=batch_size * workers,
+    )
+    pipeline.run(docs, on_result=progress.on_result, on_failure=progress.on_failure)
+
+    progress.print_progress()
+    report = progress.report()
+    for batch in report["failed_batches"]:
+        print(f"Failed batch of {batch['chunks']} chunks from {batch['sources']}: {batch['error']}")
+    print(f"Embedding cache: {embeddings_model.cache.stats()}")
+    return report
+
+
+def sync_pdf_folder(folder_path, index_name="ai41", workers=None, manifest=None):
+    """
+    Bring the index in line with a folder of PDFs, using a PdfManifest.
+
+    Only new and changed files are parsed and embedded. Their chunks get
+    deterministic IDs. A file that fails part way keeps its old version; the
+    chunks it did upload are deleted, so nothing is left unrecorded. Once a
+    changed file is uploaded, its old vectors are deleted, as are those of
+    removed files. Each folder has its own manifest, so syncing several
+    folders into one index leaves the others alone. When nothing changed,
+    this only stats the files: no parsing and no API calls.
+    Returns {"new", "changed", "removed", "unchanged", "failed"} lists/counts.
+    """
+    manifest = manifest or PdfManifest(pdf_manifest_path(index_name, folder_path))
+    scope = folder_scope(folder_path)
+    diff = manifest.diff(folder_path)
+    pending = {**diff["new"], **diff["changed"]}
+    summary = {
+        "new": sorted(diff["new"]),
+        "changed": sorted(diff["changed"]),
+        "removed": diff["removed"],
+        "unchanged": diff["unchanged"],
+        "failed": [],
+    }
+    print(
+        f"PDFs: {len(diff['new'])} new, {len(diff['changed'])} changed, "
+        f"{len(diff['removed'])} removed, {diff['unchanged']} unchanged."
+    )
+    if not pending and not diff["removed"]:
+        if manifest.dirty:
+            manifest.save()
+        return summary
+
+    db = get_vector_store(index_name, get_embeddings_model())
+    names = {os.path.join(folder_path, name): name for name in pending}
+    new_ids = {name: [] for name in pending}
+    failed = {}
+
+    def with_ids(docs):
+        # Number each file's chunks in order as they stream past.
+        for doc in docs:
+            name = names[doc.metadata["source"]]
+            vector_id = chunk_id(scope, name, pending[name]["sha256"], len(new_ids[name]))
+            new_ids[name].append(vector_id)
+            doc.metadata["vector_id"] = vector_id
+            yield doc
+
+    def parse_failed(file_path, message):
+        failed[names[file_path]] = message
+
+    if pending:
+        docs = iter_pdf_files(sorted(names), workers, on_error=parse_failed)
+        report = upload_document_stream(
+            with_ids(docs), index_name, id_for=lambda doc: doc.metadata.pop("vector_id")
+        )
+        for batch in report["failed_batches"]:
+            for source in batch["sources"]:
+                failed.setdefault(names[source], batch["error"])
+
+    stale = []
+    for name in pending:
+        if name in failed:
+            # Keep the old version's vectors and entry; it is retried next run.
+            # Ranges that made it before the failure were upserted under the
+            # new version's IDs, which no manifest entry refers to: drop them.
+            print(f"Not recording {name}: {failed[name]}")
+            stale.extend(new_ids[name])
+            continue
+        current = set(new_ids[name])
+        stale.extend(vector_id for vector_id in manifest.vector_ids(name) if vector_id not in current)
+        manifest.record(name, pending[name], new_ids[name])
+    for name in diff["removed"]:
+        stale.extend(manifest.vector_ids(name))
+        manifest.forget(name)
+
+    for start in range(0, len(stale), 1000):
+        db.delete(ids=stale[start : start + 1000])
+    if stale:
+        print(f"Deleted {len(stale)} stale vectors.")
+    manifest.save()
+    summary["failed"] = sorted(failed)
+    return summary
+
+
+def source_root(documents):
+    """The directory (or URL prefix) all the documents' sources share, or "" if none."""
+    sources = [str(doc.metadata.get("source") or "") for doc in documents]
+    if not all(sources):
+        return ""
+    try:
+        return os.path.commonpath([os.path.dirname(source) for source in sources])
+    except ValueError:  # a mix of absolute and relative paths
+        return ""
+
+
+def upload_documents_to_pinecone(documents, index_name="ai41", dedupe=True, scope=None):
+    """
+    Uses the OpenAI Embeddings model to upload a list of documents to a Pinecone index.
+
+    With dedupe, identical chunks are embedded and stored once, with all their
+    locations in metadata["sources"]. Their vector IDs are then derived from
+    the chunk text and scope instead of being random, so uploading the same
+    chunk under the same scope again overwrites it. scope defaults to the
+    directory the documents' sources share; pass the same scope for uploads
+    that should share vectors, and different ones for corpora that must not
+    overwrite each other's.
+    """
     if not documents:
         print(f"ERROR: Incomplete documents: {documents}")
         return False
 
-    embeddings_model = OpenAIEmbeddings(
-        model="text-embedding-3-small", openai_api_key=os.getenv("OPENAI_API_KEY"), disallowed_special=()
-    )
+    if not dedupe:
+        return upload_document_stream(documents, index_name=index_name)
 
-    db = PineconeVectorStore.from_existing_index(
-        embedding=embeddings_model, index_name=index_name
+    deduper = ChunkDeduper(scope=source_root(documents) if scope is None else scope)
+    for doc in documents:
+        deduper.add(doc)
+    stats = deduper.stats()
+    print(
+        f"Dedup: {stats['chunks']} chunks -> {stats['unique']} unique ({stats['dedup_ratio']}x)."
     )
+    report = upload_document_stream(
+        deduper.documents(), index_name, id_for=lambda doc: doc.metadata.pop("vector_id")
+    )
+    report["dedup"] = stats
+    return report
 
-    upload_status = db.add_documents(documents=documents)
+@functools.lru_cache(maxsize=None)
+def get_retriever(index_name="ai41"):
+    """One warm Retriever per index, shared by every call in the process."""
+    return Retriever(index_name)
 
-    return upload_status
 
 def pinecone_similarity_search(user_msg, index_name="ai41") -> str:
     """
     Do a similarity search on the Pinecone vector store.
 
-    Documentation
-    ----
-    https://api.python.langchain.com/en/latest/vectorstores/langchain_pinecone.vectorstores.PineconeVectorStore.html#langchain_pinecone.vectorstores.PineconeVectorStore.similarity_search
+    Kept for callers that want a string; use get_retriever(index_name).search
+    for structured results, or search_many for several queries at once.
     """
     try:
-        embeddings_model = OpenAIEmbeddings(
-            model="text-embedding-3-small", openai_api_key=os.getenv("OPENAI_API_KEY")
-        )
-        vectorstore = PineconeVectorStore.from_existing_index(
-            embedding=embeddings_model, index_name=index_name
-        )
-
-        result = vectorstore.similarity_search(query=user_msg, k=6)
+        result = get_retriever(index_name).search(user_msg, k=6)
 
         return str(result)
     except Exception as e:
@@ -103,16 +731,11 @@ def pinecone_similarity_search(user_msg, index_name="ai41") -> str:
         return error
 
 if __name__ == "__main__":
-    """Upload PDFs (do this once)"""
-    # docs = pdf_folder_to_docs("pdfs")
-    # print(docs)
-    # print(len(docs))
-    # status = upload_documents_to_pinecone(docs)
+    """Upload PDFs (re-run to sync new, changed and removed files)"""
+    # status = sync_pdf_folder("pdfs", workers=os.cpu_count())
     # print(status)
-    """Upload GitHub Directory (do this once)"""
-    # docs = github_files_to_docs("shawnesquivel", "ai-41-start")
-    # print(docs)
-    # status = upload_documents_to_pinecone(docs)
+    """Upload GitHub Directory (re-run to index only what changed since the last commit)"""
+    # status = sync_github_repo("shawnesquivel", "ai-41-start")
     # print(status)
     """Test it out"""
     result = pinecone_similarity_search("tell me about my packages in the json file")
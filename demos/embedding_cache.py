@@ -0,0 +1,145 @@
+"""
+On-disk embedding cache.
+
+Vectors are keyed by (model, dimensions, normalized text hash) and stored as
+float32 blobs in SQLite. When the cache grows past max_bytes, the least
+recently used vectors are evicted.
+
+Usage:
+    cache = EmbeddingCache()
+    vectors = cache.get_many("text-embedding-3-small", None, texts)  # None for misses
+    cache.put_many("text-embedding-3-small", None, texts, new_vectors)
+    print(cache.stats())
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+
+DEFAULT_PATH = os.getenv(
+    "EMBEDDING_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "embeddings.sqlite3"),
+)
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024  # 512MB
+
+
+def normalize_text(text):
+    """Collapse whitespace so formatting-only changes hit the same entry."""
+    return " ".join(text.split())
+
+
+def cache_key(model, dimensions, text):
+    normalized = normalize_text(text)
+    raw = f"{model}\x00{dimensions or ''}\x00{normalized}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(self, path=DEFAULT_PATH, max_bytes=DEFAULT_MAX_BYTES):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL
+            )"""
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)"
+        )
+        self._db.commit()
+
+    def get_many(self, model, dimensions, texts):
+        """Return a list lined up with texts: the cached vector, or None on a miss."""
+        keys = [cache_key(model, dimensions, text) for text in texts]
+        found = {}
+        with self._lock:
+            # Stay well under SQLite's limit on query parameters.
+            for start in range(0, len(keys), 500):
+                chunk = keys[start : start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._db.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                    chunk,
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array("f", blob).tolist()
+
+            if found:
+                now = time.time()
+                self._db.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found],
+                )
+                self._db.commit()
+
+            vectors = [found.get(key) for key in keys]
+            hits = sum(1 for vector in vectors if vector is not None)
+            self.hits += hits
+            self.misses += len(vectors) - hits
+        return vectors
+
+    def put_many(self, model, dimensions, texts, vectors):
+        now = time.time()
+        rows = [
+            (cache_key(model, dimensions, text), model, array("f", vector).tobytes(), now)
+            for text, vector in zip(texts, vectors)
+        ]
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, model, vector, last_used) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            self._db.commit()
+            self._evict()
+
+    def _evict(self):
+        """Drop least recently used vectors until the cache fits in max_bytes."""
+        total = self._size_bytes()
+        if total <= self.max_bytes:
+            return
+        rows = self._db.execute(
+            "SELECT key, length(vector) FROM embeddings ORDER BY last_used"
+        ).fetchall()
+        evict = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            evict.append((key,))
+            total -= size
+        self._db.executemany("DELETE FROM embeddings WHERE key = ?", evict)
+        self._db.commit()
+        self.evictions += len(evict)
+
+    def _size_bytes(self):
+        return self._db.execute(
+            "SELECT COALESCE(SUM(length(vector)), 0) FROM embeddings"
+        ).fetchone()[0]
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(length(vector)), 0) FROM embeddings"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": size,
+        }
@@ -0,0 +1,520 @@
+"""
+Local stand-ins for the services the ingestion pipeline talks to, for
+benchmarks that shouldn't spend OpenAI/Pinecone quota or hit clinic websites.
+
+- PageServer: serves saved clinic pages from a directory (GET /<file stem>/),
+  or generated therapist profiles (GET /team/therapist-<n>/).
+- FakeOpenAI: /v1/chat/completions and /v1/embeddings with configurable
+  latency, x-ratelimit-* headers and 429s past a requests-per-minute limit.
+  Point the SDK at it with OPENAI_BASE_URL.
+- FakePinecone: an in-memory index behind a REST API (/vectors/upsert,
+  /vectors/fetch, /vectors/list, /query), and FakePineconeIndex, a client
+  with the same methods the pipeline uses on the gRPC index.
+- FakeGitHub: repos pushed as snapshots, served like the GitHub API
+  (/repos/<owner>/<repo>/commits/<ref>, /tarball/<sha>). Point
+  GithubArchive at it with api_url or GITHUB_API_URL.
+
+Usage:
+    with PageServer(count=200) as pages, FakeOpenAI(latency=0.2, rpm=500) as openai:
+        links = pages.links()
+        os.environ["OPENAI_BASE_URL"] = openai.url + "/v1"
+"""
+
+import base64
+import hashlib
+import io
+import json
+from array import array
+import os
+import re
+import struct
+import tarfile
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlsplit
+
+import requests
+
+from local_index import matches_filter
+
+FIRST_NAMES = ["Avery", "Jordan", "Priya", "Mateo", "Keiko", "Amara", "Liam", "Sofia", "Noah", "Leila"]
+LAST_NAMES = ["Nguyen", "Okafor", "Brennan", "Sandhu", "Moreau", "Castillo", "Kowalski", "Haddad"]
+
+
+class _Service:
+    """A ThreadingHTTPServer on a free local port, run in a daemon thread."""
+
+    def __init__(self, handler):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.server.daemon_threads = True
+        self.server.service = self
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def send(self, status, body, content_type="application/json", headers=None):
+        if not isinstance(body, bytes):
+            body = (body if isinstance(body, str) else json.dumps(body)).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def therapist_page(number, bio_paragraphs=6):
+    """A made-up profile page with the usual chrome around it."""
+    name = f"{FIRST_NAMES[number % len(FIRST_NAMES)]} {LAST_NAMES[number // len(FIRST_NAMES) % len(LAST_NAMES)]}"
+    bio = "\n".join(
+        f"<p>{name} works with adults facing anxiety, grief and life transitions. "
+        f"Sessions draw on CBT, EFT and mindfulness, paced to what each client needs. ({paragraph})</p>"
+        for paragraph in range(bio_paragraphs)
+    )
+    return f"""<!DOCTYPE html>
+<html><head><title>{name} | Example Counselling</title></head>
+<body>
+<header><nav><a href="/">Home</a> <a href="/team/">Our Team</a> <a href="/book/">Book Now</a></nav>
+<img src="https://cdn.example.com/logo.png" alt="Example Counselling logo" width="200" height="60"></header>
+<main>
+<h1>{name}</h1>
+<p>Registered Clinical Counsellor, MA Counselling Psychology</p>
+<img src="https://cdn.example.com/team/therapist-{number}.jpg" alt="{name}" width="600" height="600">
+{bio}
+<p>Fees: $150 per 50 minute session. Online and in person in Vancouver, BC.</p>
+<a href="https://booking.example.com/{number}">Book with {name}</a>
+</main>
+<footer><p>© 2024 Example Counselling. All rights reserved.</p><a href="/privacy/">Privacy Policy</a></footer>
+</body></html>"""
+
+
+class _PageHandler(_Handler):
+    def do_GET(self):
+        service = self.server.service
+        if service.latency:
+            time.sleep(service.latency)
+        page = service.page(urlsplit(self.path).path)
+        if page is None:
+            self.send(404, "not found", "text/plain")
+            return
+        etag = f'"{zlib.crc32(page.encode("utf-8")):08x}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send(304, b"", "text/html", {"ETag": etag})
+            return
+        self.send(200, page, "text/html; charset=utf-8", {"ETag": etag})
+
+
+class PageServer(_Service):
+    """
+    Serves every *.html file in pages_dir as /<file stem>/, or, without a
+    directory, count generated profiles as /team/therapist-<n>/.
+    """
+
+    def __init__(self, pages_dir=None, count=100, latency=0.0, bio_paragraphs=6):
+        super().__init__(_PageHandler)
+        self.latency = latency
+        self.bio_paragraphs = bio_paragraphs
+        self.saved = {}
+        if pages_dir:
+            for filename in sorted(os.listdir(pages_dir)):
+                if filename.endswith(".html"):
+                    with open(os.path.join(pages_dir, filename), encoding="utf-8", errors="replace") as f:
+                        self.saved[f"/{filename[:-5]}/"] = f.read()
+        self.count = 0 if self.saved else count
+
+    def page(self, path):
+        if self.saved:
+            return self.saved.get(path)
+        match = re.fullmatch(r"/team/therapist-(\d+)/", path)
+        if match and int(match.group(1)) < self.count:
+            return therapist_page(int(match.group(1)), self.bio_paragraphs)
+        return None
+
+    def links(self):
+        if self.saved:
+            return [self.url + path for path in self.saved]
+        return [f"{self.url}/team/therapist-{number}/" for number in range(self.count)]
+
+
+def fake_embedding(text, dimensions):
+    """Deterministic unit-ish vector derived from the text."""
+    seed = zlib.crc32(text.encode("utf-8"))
+    return [((seed * (i + 1)) % 1000) / 1000 - 0.5 for i in range(dimensions)]
+
+
+class _OpenAIHandler(_Handler):
+    def do_POST(self):
+        service = self.server.service
+        request = self.read_json()
+        model = request.get("model", "")
+        path = urlsplit(self.path).path
+        limited, headers = service.admit(model)
+        if limited:
+            self.send(
+                429,
+                {"error": {"message": "Rate limit reached (fake)", "type": "requests", "code": "rate_limit_exceeded"}},
+                headers=headers,
+            )
+            return
+
+        if path.endswith("/embeddings"):
+            time.sleep(service.embedding_latency)
+            self.send(200, service.embeddings(request), headers=headers)
+        elif path.endswith("/chat/completions"):
+            time.sleep(service.latency)
+            self.send(200, service.chat_completion(request), headers=headers)
+        else:
+            self.send(404, {"error": {"message": f"Unknown path {path}"}})
+
+
+class FakeOpenAI(_Service):
+    """
+    latency / embedding_latency: seconds per chat / embeddings request.
+    rpm: requests per minute per model before answering 429 (None for no limit).
+    """
+
+    def __init__(self, latency=0.2, embedding_latency=0.05, rpm=None, tpm=1_000_000, dimensions=1536):
+        super().__init__(_OpenAIHandler)
+        self.latency = latency
+        self.embedding_latency = embedding_latency
+        self.rpm = rpm
+        self.tpm = tpm
+        self.dimensions = dimensions
+        self.stats = {"chat": 0, "embeddings": 0, "rate_limited": 0}
+        self._requests = {}  # model -> request times in the last minute
+        self._lock = threading.Lock()
+
+    def admit(self, model):
+        """Returns (rate limited?, x-ratelimit headers) for one request."""
+        now = time.monotonic()
+        with self._lock:
+            window = [t for t in self._requests.get(model, []) if now - t < 60]
+            limit = self.rpm or 1_000_000
+            limited = len(window) >= limit
+            if limited:
+                self.stats["rate_limited"] += 1
+                reset = 60 - (now - window[0])
+            else:
+                window.append(now)
+                reset = 60 - (now - window[0])
+            self._requests[model] = window
+        headers = {
+            "x-ratelimit-limit-requests": str(limit),
+            "x-ratelimit-remaining-requests": str(max(0, limit - len(window))),
+            "x-ratelimit-reset-requests": f"{reset:.3f}s",
+            "x-ratelimit-limit-tokens": str(self.tpm),
+            "x-ratelimit-remaining-tokens": str(self.tpm),
+            "x-ratelimit-reset-tokens": "0s",
+        }
+        return limited, headers
+
+    def embeddings(self, request):
+        with self._lock:
+            self.stats["embeddings"] += 1
+        inputs = request["input"]
+        inputs = [inputs] if isinstance(inputs, str) else inputs
+        dimensions = request.get("dimensions") or self.dimensions
+        data = []
+        for position, text in enumerate(inputs):
+            vector = fake_embedding(str(text), dimensions)
+            if request.get("encoding_format") == "base64":
+                vector = base64.b64encode(struct.pack(f"<{dimensions}f", *vector)).decode("ascii")
+            data.append({"object": "embedding", "index": position, "embedding": vector})
+        tokens = sum(len(str(text)) // 4 + 1 for text in inputs)
+        return {
+            "object": "list",
+            "data": data,
+            "model": request.get("model"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+    def chat_completion(self, request):
+        with self._lock:
+            self.stats["chat"] += 1
+        messages = request.get("messages", [])
+        system = next((m["content"] for m in messages if m["role"] == "system"), "")
+        user = "\n".join(m["content"] for m in messages if m["role"] == "user")
+        if (request.get("response_format") or {}).get("type") == "json_object":
+            if "profile page from the link" in system:
+                photo = re.search(r"https://[^\s'\",]+\.(?:jpe?g|png|webp)", user)
+                content = json.dumps({"profile_link": photo.group(0) if photo else None})
+            else:
+                name = re.search(r"\b([A-Z][a-z]+ [A-Z][a-z]+)\b", user)
+                content = json.dumps(
+                    {
+                        "name": name.group(1) if name else "Alex Morgan",
+                        "gender": None,
+                        "available_online": True,
+                        "location": "Vancouver, BC",
+                        "country": "Canada",
+                        "specialties": ["Anxiety", "Grief"],
+                        "approaches": ["CBT", "EFT"],
+                        "languages": ["English"],
+                        "fees": ["$150"],
+                        "bio": user[:1500],
+                    }
+                )
+        else:
+            content = " ".join((system + " " + user).split())[:600]
+        prompt_tokens = sum(len(m["content"]) // 4 + 1 for m in messages)
+        completion_tokens = len(content) // 4 + 1
+        return {
+            "id": f"chatcmpl-fake-{self.stats['chat']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model"),
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                    "logprobs": None,
+                }
+            ],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+
+class _PineconeHandler(_Handler):
+    def do_GET(self):
+        service = self.server.service
+        time.sleep(service.latency)
+        url = urlsplit(self.path)
+        params = parse_qs(url.query)
+        if url.path == "/vectors/fetch":
+            self.send(200, {"vectors": service.fetch(params.get("ids", []))})
+        elif url.path == "/vectors/list":
+            limit = int(params.get("limit", ["100"])[0])
+            token = params.get("paginationToken", [None])[0]
+            self.send(200, service.list(limit, token))
+        else:
+            self.send(404, {"message": f"Unknown path {url.path}"})
+
+    def do_POST(self):
+        service = self.server.service
+        time.sleep(service.latency)
+        path = urlsplit(self.path).path
+        request = self.read_json()
+        if path == "/vectors/upsert":
+            self.send(200, {"upsertedCount": service.upsert(request["vectors"])})
+        elif path == "/query":
+            self.send(200, {"matches": service.query(request)})
+        else:
+            self.send(404, {"message": f"Unknown path {path}"})
+
+
+class FakePinecone(_Service):
+    """An in-memory index. latency: seconds per request."""
+
+    def __init__(self, latency=0.02):
+        super().__init__(_PineconeHandler)
+        self.latency = latency
+        self.vectors = {}
+        self._lock = threading.Lock()
+
+    def upsert(self, vectors):
+        with self._lock:
+            for vector in vectors:
+                # float32 arrays, so the fake index doesn't dominate the benchmark's memory.
+                self.vectors[vector["id"]] = {**vector, "values": array("f", vector["values"])}
+        return len(vectors)
+
+    def fetch(self, ids):
+        with self._lock:
+            return {
+                vector_id: {**self.vectors[vector_id], "values": list(self.vectors[vector_id]["values"])}
+                for vector_id in ids
+                if vector_id in self.vectors
+            }
+
+    def list(self, limit, token=None):
+        with self._lock:
+            ids = sorted(self.vectors)
+        start = int(token or 0)
+        page = ids[start : start + limit]
+        pagination = {"next": str(start + limit)} if start + limit < len(ids) else None
+        return {"vectors": [{"id": vector_id} for vector_id in page], "pagination": pagination}
+
+    def query(self, request):
+        query = request["vector"]
+        with self._lock:
+            candidates = [
+                vector
+                for vector in self.vectors.values()
+                if matches_filter(vector.get("metadata") or {}, request.get("filter"))
+            ]
+        scored = sorted(
+            ((sum(a * b for a, b in zip(query, vector["values"])), vector) for vector in candidates),
+            key=lambda pair: -pair[0],
+        )[: request.get("topK", 10)]
+        return [
+            {
+                "id": vector["id"],
+                "score": score,
+                **({"metadata": vector.get("metadata")} if request.get("includeMetadata") else {}),
+            }
+            for score, vector in scored
+        ]
+
+
+class FakePineconeIndex:
+    """
+    Client for FakePinecone with the index methods the pipeline uses
+    (upsert, fetch, list, query), returning objects shaped like the SDK's.
+    """
+
+    def __init__(self, url):
+        self.url = url.rstrip("/")
+        self.session = requests.Session()
+
+    def upsert(self, vectors, namespace=None):
+        response = self.session.post(f"{self.url}/vectors/upsert", json={"vectors": vectors})
+        response.raise_for_status()
+        return response.json()
+
+    def fetch(self, ids):
+        response = self.session.get(f"{self.url}/vectors/fetch", params={"ids": ids})
+        response.raise_for_status()
+        vectors = {
+            vector_id: SimpleNamespace(id=vector_id, values=vector["values"], metadata=vector.get("metadata"))
+            for vector_id, vector in response.json()["vectors"].items()
+        }
+        return SimpleNamespace(vectors=vectors)
+
+    def list(self, limit=100):
+        token = None
+        while True:
+            params = {"limit": limit, **({"paginationToken": token} if token else {})}
+            response = self.session.get(f"{self.url}/vectors/list", params=params)
+            response.raise_for_status()
+            body = response.json()
+            ids = [vector["id"] for vector in body["vectors"]]
+            if ids:
+                yield ids
+            if not body.get("pagination"):
+                return
+            token = body["pagination"]["next"]
+
+    def query(self, vector, top_k=10, filter=None, include_metadata=False, **kwargs):
+        body = {"vector": vector, "topK": top_k, "includeMetadata": include_metadata}
+        if filter:
+            body["filter"] = filter
+        response = self.session.post(f"{self.url}/query", json=body)
+        response.raise_for_status()
+        matches = [
+            SimpleNamespace(**{"metadata": None, **match}) for match in response.json()["matches"]
+        ]
+        return SimpleNamespace(matches=matches)
+
+
+class _GitHubHandler(_Handler):
+    def do_GET(self):
+        service = self.server.service
+        time.sleep(service.latency)
+        path = urlsplit(self.path).path
+        match = re.fullmatch(r"/repos/([^/]+/[^/]+)/(commits|tarball)/(.+)", path)
+        if path.startswith("/codeload/"):
+            # Like codeload.github.com, where the API redirects tarball requests.
+            repo, commit = path[len("/codeload/"):].rsplit("/", 1)
+            tarball = service.tarball(repo, commit)
+            if tarball is None:
+                self.send(404, {"message": "Not Found"})
+            else:
+                self.send(200, tarball, "application/x-gzip")
+            return
+        commit = service.resolve(match.group(1), match.group(3)) if match else None
+        if commit is None:
+            self.send(404, {"message": "Not Found"})
+        elif match.group(2) == "commits":
+            service.count("commits")
+            self.send(200, {"sha": commit})
+        else:
+            service.count("tarballs")
+            self.send(302, b"", "text/plain", {"Location": f"/codeload/{match.group(1)}/{commit}"})
+
+
+class FakeGitHub(_Service):
+    """
+    Repos as a series of snapshots. push("owner/repo", {path: text}) makes a
+    new commit holding exactly those files and returns its SHA; HEAD and
+    "main" resolve to the latest one. stats counts API calls by kind.
+    """
+
+    def __init__(self, latency=0.0):
+        super().__init__(_GitHubHandler)
+        self.latency = latency
+        self.commits = {}  # repo -> {sha: {path: bytes}}
+        self.heads = {}  # repo -> latest sha
+        self.stats = {"commits": 0, "tarballs": 0}
+        self._lock = threading.Lock()
+
+    def push(self, repo, files):
+        snapshot = {
+            path: text.encode("utf-8") if isinstance(text, str) else text
+            for path, text in files.items()
+        }
+        digest = hashlib.sha1(self.heads.get(repo, "").encode("utf-8"))
+        for path in sorted(snapshot):
+            digest.update(path.encode("utf-8") + b"\0" + snapshot[path])
+        commit = digest.hexdigest()
+        with self._lock:
+            self.commits.setdefault(repo, {})[commit] = snapshot
+            self.heads[repo] = commit
+        return commit
+
+    def count(self, kind):
+        with self._lock:
+            self.stats[kind] += 1
+
+    def resolve(self, repo, ref):
+        with self._lock:
+            if ref in ("HEAD", "main"):
+                return self.heads.get(repo)
+            return ref if ref in self.commits.get(repo, {}) else None
+
+    def tarball(self, repo, commit):
+        """A gzipped tarball laid out like GitHub's, under "<owner>-<repo>-<short sha>/"."""
+        with self._lock:
+            snapshot = self.commits.get(repo, {}).get(commit)
+        if snapshot is None:
+            return None
+        root = f"{repo.replace('/', '-')}-{commit[:7]}"
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode="w:gz") as tar:
+            for path, content in sorted(snapshot.items()):
+                info = tarfile.TarInfo(f"{root}/{path}")
+                info.size = len(content)
+                tar.addfile(info, io.BytesIO(content))
+        return buffer.getvalue()
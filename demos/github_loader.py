@@ -0,0 +1,164 @@
+"""
+Fetches a GitHub repo as a single tarball, and remembers what was indexed from it.
+
+GithubFileLoader makes one API call per matching file on every run. Here a run
+costs one call to resolve the ref to a commit, and, only if that commit is not
+the one indexed last time, one tarball download. The tarball is read locally;
+files are never written out, so paths in the archive can't escape anywhere.
+
+RepoManifest records the indexed commit and, per file, its content hash and
+vector IDs. Diffing the new tarball against it by hash finds the new, changed
+and removed files exactly, however many commits apart the two runs are.
+
+The API URL defaults to $GITHUB_API_URL or https://api.github.com, so a local
+server (see FakeGitHub in fake_services.py) or GitHub Enterprise can stand in.
+
+Usage:
+    archive = GithubArchive("shawnesquivel", "ai-41-start")
+    commit = archive.resolve()
+    tarball = archive.download(commit, tmp_dir)
+    for path, content in archive_files(tarball, is_code_file):
+        ...
+"""
+
+import hashlib
+import json
+import os
+import tarfile
+import threading
+
+import requests
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+GITHUB_API_URL = os.getenv("GITHUB_API_URL", "https://api.github.com")
+
+
+def is_code_file(path):
+    return path.endswith((".jsx", ".json"))
+
+
+def github_manifest_path(index_name, owner, repo):
+    """One manifest per index and repo, since the vector IDs are only meaningful there."""
+    return os.path.join(CACHE_DIR, f"github_manifest-{index_name}-{owner}-{repo}.json")
+
+
+def content_hash(content):
+    return hashlib.sha256(content).hexdigest()
+
+
+def vector_locations(vector_ids_by_path):
+    """
+    {vector ID: {(path, chunk number)}} from {path: vector IDs in chunk order}.
+    A vector shared by several chunks has all of their locations.
+    """
+    locations = {}
+    for path, vector_ids in vector_ids_by_path.items():
+        for number, vector_id in enumerate(vector_ids):
+            locations.setdefault(vector_id, set()).add((path, number))
+    return locations
+
+
+class GithubArchive:
+    def __init__(self, owner, repo, api_url=None, token=None, timeout=60):
+        self.owner = owner
+        self.repo = repo
+        self.api_url = (api_url or GITHUB_API_URL).rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers["Accept"] = "application/vnd.github+json"
+        token = token or os.getenv("GITHUB_PERSONAL_ACCESS_TOKEN")
+        if token:
+            self.session.headers["Authorization"] = f"Bearer {token}"
+
+    def _url(self, *parts):
+        return "/".join([self.api_url, "repos", self.owner, self.repo, *parts])
+
+    def resolve(self, ref=None):
+        """The commit SHA a branch, tag or SHA points at (the default branch if None)."""
+        response = self.session.get(self._url("commits", ref or "HEAD"), timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()["sha"]
+
+    def download(self, commit, directory):
+        """Stream the tarball of a commit into directory and return its path."""
+        path = os.path.join(directory, f"{self.owner}-{self.repo}-{commit}.tar.gz")
+        with self.session.get(self._url("tarball", commit), stream=True, timeout=self.timeout) as response:
+            response.raise_for_status()
+            with open(path, "wb") as f:
+                for block in response.iter_content(1024 * 1024):
+                    f.write(block)
+        return path
+
+
+def archive_files(tarball_path, file_filter=is_code_file):
+    """
+    Yield (path, bytes) for each regular file in a GitHub tarball that passes
+    file_filter, with the archive's top-level "<owner>-<repo>-<sha>/" stripped.
+    """
+    with tarfile.open(tarball_path, "r:gz") as tar:
+        for member in tar:
+            if not member.isfile() or "/" not in member.name:
+                continue
+            path = member.name.split("/", 1)[1]
+            if not file_filter(path):
+                continue
+            yield path, tar.extractfile(member).read()
+
+
+class RepoManifest:
+    def __init__(self, path):
+        self.path = path
+        self.commit = None  # last commit whose files were all indexed
+        self.files = {}  # path in the repo -> {"sha256", "vector_ids" in chunk order}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+            self.commit = data.get("commit")
+            self.files = data.get("files", {})
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with self._lock:
+            data = {"commit": self.commit, "files": dict(self.files)}
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    def diff(self, tarball_path, file_filter=is_code_file):
+        """
+        Compare a tarball with the manifest. New and changed files come with
+        their content hash.
+        """
+        new, changed = {}, {}
+        unchanged = 0
+        seen = set()
+        for path, content in archive_files(tarball_path, file_filter):
+            seen.add(path)
+            sha256 = content_hash(content)
+            entry = self.files.get(path)
+            if entry is None:
+                new[path] = sha256
+            elif entry["sha256"] != sha256:
+                changed[path] = sha256
+            else:
+                unchanged += 1
+        removed = sorted(path for path in self.files if path not in seen)
+        return {"new": new, "changed": changed, "removed": removed, "unchanged": unchanged}
+
+    def record(self, path, sha256, vector_ids):
+        with self._lock:
+            self.files[path] = {"sha256": sha256, "vector_ids": list(vector_ids)}
+
+    def forget(self, path):
+        with self._lock:
+            return self.files.pop(path, None)
+
+    def vector_ids(self, path):
+        with self._lock:
+            return list(self.files.get(path, {}).get("vector_ids", []))
+
+    def locations(self):
+        with self._lock:
+            return vector_locations({path: entry["vector_ids"] for path, entry in self.files.items()})
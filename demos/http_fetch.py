@@ -0,0 +1,199 @@
+"""
+Shared HTTP fetch layer for scraping clinic websites.
+
+- One requests.Session for the whole process, so connections to the same clinic
+  domain are kept alive and reused.
+- At most max_per_host requests in flight per host, and at least
+  politeness_delay seconds between request starts to the same host.
+- gzip/deflate, plus brotli when the brotli package is installed.
+- Pages are stored zlib-compressed on disk, addressed by content hash. Repeat
+  fetches revalidate with ETag/Last-Modified, so unchanged pages come back as a
+  cheap 304 and are served from the store.
+- offline=True serves only stored pages, so later stages can re-run without
+  touching the network.
+
+Usage:
+    fetcher = Fetcher()
+    page = fetcher.fetch("https://thrivedowntown.com/our-team/andrew-jarvis/")
+    page.text, page.status, page.from_store
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
+
+try:
+    import brotli  # noqa: F401  (urllib3 decodes br responses when this is installed)
+
+    ACCEPT_ENCODING = "gzip, deflate, br"
+except ImportError:
+    ACCEPT_ENCODING = "gzip, deflate"
+
+DEFAULT_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), ".cache", "pages"
+)
+
+
+class FetchedPage:
+    def __init__(self, url, text, status, from_store):
+        self.url = url
+        self.text = text
+        self.status = status
+        self.from_store = from_store
+
+
+class PageStore:
+    """Compressed, content-addressed page bodies plus the validators for each URL."""
+
+    def __init__(self, path=DEFAULT_PATH):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            os.path.join(path, "index.sqlite3"), check_same_thread=False
+        )
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                body_hash TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL NOT NULL
+            )"""
+        )
+        self._db.commit()
+
+    def _body_path(self, body_hash):
+        return os.path.join(self.path, body_hash[:2], f"{body_hash}.zz")
+
+    def lookup(self, url):
+        """(etag, last_modified, body_hash) for a stored URL, or None."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT etag, last_modified, body_hash FROM pages WHERE url = ?", (url,)
+            ).fetchone()
+
+    def read(self, body_hash):
+        with open(self._body_path(body_hash), "rb") as f:
+            return zlib.decompress(f.read()).decode("utf-8")
+
+    def write(self, url, text, etag=None, last_modified=None):
+        body = text.encode("utf-8")
+        body_hash = hashlib.sha256(body).hexdigest()
+        body_path = self._body_path(body_hash)
+        # Identical pages (e.g. the same page under two URLs) share one file.
+        if not os.path.exists(body_path):
+            os.makedirs(os.path.dirname(body_path), exist_ok=True)
+            tmp_path = f"{body_path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(zlib.compress(body, 6))
+            os.replace(tmp_path, body_path)
+        self.touch(url, body_hash, etag, last_modified)
+        return body_hash
+
+    def touch(self, url, body_hash, etag, last_modified):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO pages (url, body_hash, etag, last_modified, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                (url, body_hash, etag, last_modified, time.time()),
+            )
+            self._db.commit()
+
+
+class Fetcher:
+    def __init__(
+        self,
+        store=None,
+        max_per_host=2,
+        politeness_delay=0.5,
+        pool_size=20,
+        offline=False,
+        user_agent="Mozilla/5.0 (compatible; MatchyaBot/1.0)",
+    ):
+        self.store = store or PageStore()
+        self.max_per_host = max_per_host
+        self.politeness_delay = politeness_delay
+        self.offline = offline
+        self.stats = {"fetched": 0, "not_modified": 0, "offline": 0}
+
+        self.session = requests.Session()
+        retry = Retry(total=5, backoff_factor=0.3, status_forcelist=[500, 502, 503, 504])
+        adapter = HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update(
+            {"User-Agent": user_agent, "Accept-Encoding": ACCEPT_ENCODING}
+        )
+
+        self._lock = threading.Lock()
+        self._host_slots = {}
+        self._next_start = {}
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _host_slot(self, host):
+        with self._lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = threading.BoundedSemaphore(self.max_per_host)
+            return self._host_slots[host]
+
+    def _wait_turn(self, host):
+        """Space out request starts to the same host by politeness_delay."""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start.get(host, now))
+            self._next_start[host] = start + self.politeness_delay
+        if start > now:
+            time.sleep(start - now)
+
+    def fetch(self, url, timeout=10):
+        stored = self.store.lookup(url)
+        if self.offline:
+            if not stored:
+                raise Exception(f"Page not in the store (offline mode): {url}")
+            self._count("offline")
+            return FetchedPage(url, self.store.read(stored[2]), 200, True)
+
+        headers = {}
+        if stored:
+            etag, last_modified, _ = stored
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+
+        host = urlsplit(url).netloc.lower()
+        with self._host_slot(host):
+            self._wait_turn(host)
+            try:
+                response = self.session.get(url, timeout=timeout, headers=headers)
+                if response.status_code != 304:
+                    response.raise_for_status()
+            except requests.exceptions.RequestException as e:
+                raise Exception(f"Failed to load page {url}") from e
+
+        if response.status_code == 304 and stored:
+            self._count("not_modified")
+            self.store.touch(url, stored[2], stored[0], stored[1])
+            return FetchedPage(url, self.store.read(stored[2]), 304, True)
+
+        self._count("fetched")
+        self.store.write(
+            url,
+            response.text,
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+        )
+        return FetchedPage(url, response.text, response.status_code, False)
@@ -0,0 +1,190 @@
+"""
+Durable journal of ingestion progress, per link and stage.
+
+Every journaled stage records its status ("done", "skipped" or "failed") and,
+when done, the job fields it produced. A crashed run can then resume: finished
+links are left out, and completed stages are restored from the journal instead
+of being re-run. Links with a failed stage are the dead-letter queue; retrying
+them re-runs only the failed stage and whatever comes after it.
+
+Usage:
+    journal = IngestJournal()
+    stage_fn = journaled("extract", stage_extract, journal, keys=("therapist_json",), resume=True)
+    ...
+    journal.failed_links()  # dead letters
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from pipeline import FinishItem, SkipItem
+
+DEFAULT_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), ".cache", "ingest_journal.sqlite3"
+)
+# The stage that means a link is completely finished.
+FINAL_STAGE = "upload"
+
+
+class IngestJournal:
+    def __init__(self, path=DEFAULT_PATH):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS link_stages (
+                link TEXT NOT NULL,
+                stage TEXT NOT NULL,
+                status TEXT NOT NULL,
+                output TEXT,
+                error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (link, stage)
+            )"""
+        )
+        self._db.commit()
+
+    def _record(self, link, stage, status, output=None, error=None):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT attempts FROM link_stages WHERE link = ? AND stage = ?",
+                (link, stage),
+            ).fetchone()
+            attempts = (row[0] if row else 0) + 1
+            self._db.execute(
+                "INSERT OR REPLACE INTO link_stages (link, stage, status, output, error, attempts, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    link,
+                    stage,
+                    status,
+                    json.dumps(output) if output is not None else None,
+                    error,
+                    attempts,
+                    time.time(),
+                ),
+            )
+            self._db.commit()
+
+    def mark_done(self, link, stage, output=None):
+        self._record(link, stage, "done", output=output or {})
+
+    def mark_skipped(self, link, stage, reason):
+        self._record(link, stage, "skipped", error=reason)
+
+    def mark_failed(self, link, stage, error):
+        self._record(link, stage, "failed", error=error)
+
+    def completed(self, link, stage):
+        """The saved output of a finished stage, or None."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT output FROM link_stages WHERE link = ? AND stage = ? AND status = 'done'",
+                (link, stage),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def is_finished(self, link):
+        """True if the link made it all the way through, or was skipped on purpose."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT 1 FROM link_stages WHERE link = ? AND ((stage = ? AND status = 'done') OR status = 'skipped') LIMIT 1",
+                (link, FINAL_STAGE),
+            ).fetchone()
+        return row is not None
+
+    def failed_links(self):
+        """Dead letters: {link: (stage, error, attempts)} for links with a failed stage."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT link, stage, error, attempts FROM link_stages WHERE status = 'failed' ORDER BY updated_at"
+            ).fetchall()
+        return {link: (stage, error, attempts) for link, stage, error, attempts in rows}
+
+    def reset(self, links):
+        """Forget earlier progress for links that are about to be processed from scratch."""
+        with self._lock:
+            self._db.executemany(
+                "DELETE FROM link_stages WHERE link = ?", [(link,) for link in links]
+            )
+            self._db.commit()
+
+
+def journaled(stage, fn, journal, keys=None, resume=False, unneeded_after=None):
+    """
+    Wrap a single-item stage function so its outcome is journaled.
+
+    keys: job fields the stage produces; saved when it succeeds and restored
+    instead of re-running it when resuming. None for stages whose output
+    can't be stored (a fetched page, a parsed tree): they always re-run.
+    unneeded_after: when resuming, skip this stage entirely once that later
+    stage is done (e.g. no need to fetch a page whose LLM stage finished).
+    """
+
+    def run(job):
+        link = job["link"]
+        if resume:
+            if unneeded_after and journal.completed(link, unneeded_after) is not None:
+                return job
+            saved = journal.completed(link, stage) if keys is not None else None
+            if saved is not None:
+                job.update(saved)
+                return job
+
+        try:
+            job = fn(job)
+        except FinishItem:
+            raise
+        except SkipItem as e:
+            journal.mark_skipped(link, stage, str(e))
+            raise
+        except Exception as e:
+            journal.mark_failed(link, stage, str(e))
+            raise
+        journal.mark_done(link, stage, {key: job[key] for key in keys or () if key in job})
+        return job
+
+    return run
+
+
+def journaled_batch(stage, fn, journal, keys=(), resume=False):
+    """journaled() for batch stage functions."""
+
+    def run(jobs):
+        outputs = list(jobs)
+        todo = []
+        for position, job in enumerate(jobs):
+            saved = journal.completed(job["link"], stage) if resume else None
+            if saved is not None:
+                job.update(saved)
+            else:
+                todo.append(position)
+        if not todo:
+            return outputs
+
+        try:
+            results = fn([jobs[position] for position in todo])
+        except Exception as e:
+            for position in todo:
+                journal.mark_failed(jobs[position]["link"], stage, str(e))
+            raise
+
+        for position, result in zip(todo, results):
+            link = jobs[position]["link"]
+            if isinstance(result, FinishItem):
+                pass
+            elif isinstance(result, SkipItem):
+                journal.mark_skipped(link, stage, str(result))
+            elif isinstance(result, Exception):
+                journal.mark_failed(link, stage, str(result))
+            else:
+                journal.mark_done(link, stage, {key: result[key] for key in keys if key in result})
+            outputs[position] = result
+        return outputs
+
+    return run
@@ -0,0 +1,114 @@
+"""
+Streams therapist links from a file or stdin for the ingestion CLI.
+
+Input is one link per line, or NDJSON with one {"link": ..., ...} object per
+line; the two can be mixed. Blank lines and lines starting with "#" are
+ignored. Nothing is read ahead, so memory stays flat however long the list is.
+
+Sharding is by a stable hash of the canonical link, so every process that is
+given the same input and shard count agrees on who does what, the same
+therapist always lands in the same shard, and shard i/N can be split further
+into P sub-shards (i + N*k)/(N*P) for k in range(P).
+
+Usage:
+    with open_links("links.ndjson") as lines:
+        for link in select_links(lines, shard=(0, 4), since=parse_since("2024-07-01"), limit=100):
+            ...
+"""
+
+import argparse
+import contextlib
+import hashlib
+import json
+import sys
+from datetime import datetime, timezone
+
+from vector_manifest import canonical_link
+
+
+def parse_shard(value):
+    """ "i/N" -> (i, N), with 0 <= i < N. Used as an argparse type, so errors are ArgumentTypeError."""
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"shard must look like i/N, got {value!r}")
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"shard index must be in 0..N-1, got {value!r}")
+    return index, count
+
+
+def shard_of(link, count):
+    digest = hashlib.sha1(canonical_link(link).encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % count
+
+
+def _as_utc(moment):
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+
+def parse_since(value):
+    """ISO 8601 date/time or a Unix timestamp; naive times are taken as UTC."""
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value, tz=timezone.utc)
+    try:
+        return datetime.fromtimestamp(float(value), tz=timezone.utc)
+    except ValueError:
+        return _as_utc(datetime.fromisoformat(value.replace("Z", "+00:00")))
+
+
+@contextlib.contextmanager
+def open_links(path):
+    """Lines from path, or from stdin for "-"."""
+    if path == "-":
+        yield sys.stdin
+    else:
+        with open(path, encoding="utf-8") as f:
+            yield f
+
+
+def read_records(lines):
+    """Yield {"link": ..., ...} for each link line or NDJSON object."""
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if line.startswith("{"):
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                print(f"Skipping line {number}: bad JSON ({e})")
+                continue
+            if not record.get("link"):
+                print(f"Skipping line {number}: no link")
+                continue
+            yield record
+        else:
+            yield {"link": line}
+
+
+def select_links(lines, shard=None, since=None, since_field="updated_at", limit=None):
+    """
+    Yield the links this process should handle.
+
+    shard: (i, N) to keep only links whose hash falls in shard i of N.
+    since: datetime; NDJSON records whose since_field is older are dropped.
+    Records without the field are kept, since there's no telling how old they are.
+    limit: stop after this many links.
+    """
+    selected = 0
+    for record in read_records(lines):
+        if limit is not None and selected >= limit:
+            return
+        link = record["link"]
+        if shard and shard_of(link, shard[1]) != shard[0]:
+            continue
+        if since and record.get(since_field) is not None:
+            try:
+                updated = parse_since(record[since_field])
+            except (TypeError, ValueError):
+                print(f"Keeping {link}: can't read {since_field}={record[since_field]!r}")
+            else:
+                if updated < since:
+                    continue
+        selected += 1
+        yield link
@@ -0,0 +1,169 @@
+"""
+Cache for chat-completion responses, keyed on the full request.
+
+The key is a hash of (model, messages, response_format, temperature), so any
+change to a prompt is a miss. Only temperature=0 requests are cached; anything
+else is meant to vary between calls. Entries expire after ttl seconds, and the
+least recently used ones are evicted past max_entries. Recent entries are also
+kept in memory.
+
+Modes:
+    "on"      read from and write to the cache (default)
+    "off"     always call the API
+    "replay"  serve only from the cache and raise CacheMiss otherwise (always,
+              for temperature != 0), so the pipeline can be re-run or
+              benchmarked without any API calls
+
+Usage:
+    cache = LLMCache(mode="replay")
+    content = cache.get_or_call(request, lambda: call_openai(**request))
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), ".cache", "llm_responses.sqlite3"
+)
+MODES = ("on", "off", "replay")
+
+
+class CacheMiss(Exception):
+    pass
+
+
+def request_key(request):
+    keyed = {
+        "model": request.get("model"),
+        "messages": request.get("messages"),
+        "response_format": request.get("response_format"),
+        "temperature": request.get("temperature"),
+    }
+    raw = json.dumps(keyed, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    def __init__(
+        self,
+        path=DEFAULT_PATH,
+        mode="on",
+        ttl=30 * 24 * 3600,
+        max_entries=50000,
+        memory_entries=2000,
+    ):
+        if mode not in MODES:
+            raise ValueError(f"LLM cache mode must be one of {MODES}, got {mode}")
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.mode = mode
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                content TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )"""
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)"
+        )
+        self._db.commit()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and now - entry[1] < self.ttl:
+                self._memory.move_to_end(key)
+                return entry[0]
+
+            row = self._db.execute(
+                "SELECT content, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if not row or now - row[1] >= self.ttl:
+                return None
+            self._db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            self._remember(key, row[0], row[1])
+            return row[0]
+
+    def put(self, key, model, content):
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, model, content, created_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, model, content, now, now),
+            )
+            self._evict(now)
+            self._db.commit()
+            self._remember(key, content, now)
+
+    def _remember(self, key, content, created_at):
+        self._memory[key] = (content, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict(self, now):
+        self._db.execute("DELETE FROM responses WHERE created_at <= ?", (now - self.ttl,))
+        count = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        if count > self.max_entries:
+            self._db.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY last_used LIMIT ?)",
+                (count - self.max_entries,),
+            )
+
+    def get_or_call(self, request, call):
+        """Return the cached content for request, or call() and cache what it returns."""
+        if self.mode == "off":
+            return call()
+        if request.get("temperature") != 0:
+            # Never cached, so replay can't serve it either.
+            if self.mode == "replay":
+                with self._lock:
+                    self.misses += 1
+                raise CacheMiss(
+                    f"{request.get('model')} request with temperature "
+                    f"{request.get('temperature')} is never cached (replay mode)"
+                )
+            return call()
+
+        key = request_key(request)
+        content = self.get(key)
+        if content is not None:
+            with self._lock:
+                self.hits += 1
+            return content
+
+        with self._lock:
+            self.misses += 1
+        if self.mode == "replay":
+            raise CacheMiss(f"No cached {request.get('model')} response (replay mode)")
+        content = call()
+        self.put(key, request.get("model"), content)
+        return content
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "mode": self.mode,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,77 @@
+"""
+Per-item dependency graph for LLM calls.
+
+Each LLMStage names the stages it needs and the model it runs on. run_graph
+starts every stage as soon as its dependencies are done, so independent calls
+run at the same time, and a cheap follow-up call can work from an earlier
+call's (much shorter) output instead of the full input.
+
+Usage:
+    graph = [
+        LLMStage("long_summary", long_summary, model="gpt-4o"),
+        LLMStage("short_summary", short_summary, needs=("long_summary",), model="gpt-4o-mini"),
+    ]
+    outputs, errors = run_graph(graph, job, executor)
+
+Each stage function is called as fn(item, outputs, model), where outputs holds
+the results of the stages it needs.
+"""
+
+from concurrent.futures import FIRST_COMPLETED, wait
+
+
+class LLMStage:
+    def __init__(self, name, fn, needs=(), model=None):
+        self.name = name
+        self.fn = fn
+        self.needs = tuple(needs)
+        self.model = model
+
+
+class DependencyFailed(Exception):
+    pass
+
+
+def run_graph(stages, item, executor):
+    """
+    Run every stage once its needs are met.
+
+    Returns (outputs, errors): {stage name: output} for stages that finished and
+    {stage name: exception} for stages that raised or whose dependency failed.
+    """
+    names = {stage.name for stage in stages}
+    for stage in stages:
+        unknown = set(stage.needs) - names
+        if unknown:
+            raise ValueError(f"LLM stage {stage.name} needs unknown stages {unknown}")
+
+    outputs = {}
+    errors = {}
+    pending = list(stages)
+    running = {}
+    while pending or running:
+        for stage in list(pending):
+            failed = [need for need in stage.needs if need in errors]
+            if failed:
+                errors[stage.name] = DependencyFailed(f"{stage.name} needs {failed[0]}, which failed")
+                pending.remove(stage)
+            elif all(need in outputs for need in stage.needs):
+                # Hand each stage a snapshot, so it can't see results it didn't ask for.
+                inputs = {need: outputs[need] for need in stage.needs}
+                future = executor.submit(stage.fn, item, inputs, stage.model)
+                running[future] = stage
+                pending.remove(stage)
+
+        if not running:
+            for stage in pending:
+                errors[stage.name] = DependencyFailed(f"{stage.name} is part of a dependency cycle")
+            break
+
+        finished, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in finished:
+            stage = running.pop(future)
+            try:
+                outputs[stage.name] = future.result()
+            except Exception as e:
+                errors[stage.name] = e
+    return outputs, errors
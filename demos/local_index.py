@@ -0,0 +1,319 @@
+"""
+Exact vector search in process, for running without Pinecone.
+
+Vectors are L2-normalized and stored as float32 rows in a memory-mapped file,
+so cosine similarity is a dot product and the OS pages the matrix in and out
+as needed. A query is one matrix multiply per block of rows, with top-k taken
+by np.argpartition, so many queries are scored in a single pass over the
+vectors. IDs and metadata are kept in memory and appended to a JSON Lines
+log next to the vectors; upserting an existing ID overwrites its row, and
+deletes are logged as tombstones.
+
+LocalVectorIndex has the index methods the pipeline uses (upsert, fetch,
+list, query, delete) and returns objects shaped like the SDK's, so it can
+stand in wherever a Pinecone index is used. Set VECTOR_BACKEND=local to use
+it instead of Pinecone; indexes live in LOCAL_INDEX_DIR (default
+.cache/local_index).
+
+Usage:
+    index = LocalVectorIndex(local_index_path("therapists"))
+    index.upsert(vectors=[{"id": "a", "values": embedding, "metadata": {"gender": "female"}}])
+    matches = index.query(vector=query_embedding, top_k=10, filter={"gender": "female"}).matches
+"""
+
+import functools
+import json
+import os
+import threading
+from types import SimpleNamespace
+
+import numpy as np
+
+LOCAL_INDEX_DIR = os.getenv(
+    "LOCAL_INDEX_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "local_index"),
+)
+# Rows scored per matrix multiply: 16384 x 1536 float32 is 96MB.
+BLOCK_ROWS = 16384
+MIN_CAPACITY = 1024
+
+
+def use_local_backend():
+    return os.getenv("VECTOR_BACKEND", "pinecone") == "local"
+
+
+def local_index_path(index_name):
+    return os.path.join(LOCAL_INDEX_DIR, index_name)
+
+
+@functools.lru_cache(maxsize=None)
+def get_local_index(index_name, dimensions=1536):
+    """One LocalVectorIndex per name, shared by every caller in the process."""
+    return LocalVectorIndex(local_index_path(index_name), dimensions)
+
+
+def matches_filter(metadata, filter):
+    """Pinecone's metadata filter language: $eq, $ne, $in, $nin, $gt(e), $lt(e), $exists, $and, $or."""
+    for field, condition in (filter or {}).items():
+        if field == "$and":
+            if not all(matches_filter(metadata, part) for part in condition):
+                return False
+            continue
+        if field == "$or":
+            if not any(matches_filter(metadata, part) for part in condition):
+                return False
+            continue
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        value = metadata.get(field)
+        for op, expected in condition.items():
+            if op == "$exists" and (field in metadata) != expected:
+                return False
+            if op == "$eq" and not (value == expected or (isinstance(value, list) and expected in value)):
+                return False
+            if op == "$ne" and value == expected:
+                return False
+            if op == "$in" and not (
+                value in expected or (isinstance(value, list) and set(value) & set(expected))
+            ):
+                return False
+            if op == "$nin" and value in expected:
+                return False
+            if op in ("$gt", "$gte", "$lt", "$lte"):
+                if not isinstance(value, (int, float)):
+                    return False
+                if (
+                    (op == "$gt" and not value > expected)
+                    or (op == "$gte" and not value >= expected)
+                    or (op == "$lt" and not value < expected)
+                    or (op == "$lte" and not value <= expected)
+                ):
+                    return False
+    return True
+
+
+def normalize_rows(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _top_k(scores, rows, k):
+    """
+    Best k (scores, rows) per query from (queries, n) scores, unsorted. rows
+    is shared by every query (n,) or per query (queries, n).
+    """
+    if rows.ndim == 1:
+        rows = np.broadcast_to(rows, scores.shape)
+    if scores.shape[1] > k:
+        best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        return np.take_along_axis(scores, best, axis=1), np.take_along_axis(rows, best, axis=1)
+    return scores, rows
+
+
+class LocalVectorIndex:
+    def __init__(self, path, dimensions=1536, block_rows=BLOCK_ROWS):
+        self.vectors_path = f"{path}.f32"
+        self.rows_path = f"{path}.jsonl"
+        self.dimensions = dimensions
+        self.block_rows = block_rows
+        self.ids = []  # row -> vector ID, None once deleted
+        self.metadata = []  # row -> metadata dict
+        self.rows = {}  # vector ID -> row
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.vectors_path) or ".", exist_ok=True)
+
+        if os.path.exists(self.rows_path):
+            with open(self.rows_path) as f:
+                for line in f:
+                    entry = json.loads(line)
+                    self._set_row(entry["row"], entry.get("id"), entry.get("metadata"))
+        if not os.path.exists(self.vectors_path):
+            open(self.vectors_path, "wb").close()
+        self._capacity = os.path.getsize(self.vectors_path) // (4 * dimensions)
+        self._vectors = self._map()
+        self._log = open(self.rows_path, "a")
+
+    def _map(self):
+        if not self._capacity:
+            return np.zeros((0, self.dimensions), dtype=np.float32)
+        return np.memmap(
+            self.vectors_path, dtype=np.float32, mode="r+", shape=(self._capacity, self.dimensions)
+        )
+
+    def _set_row(self, row, vector_id, metadata):
+        # Caller holds self._lock, or is __init__.
+        while len(self.ids) <= row:
+            self.ids.append(None)
+            self.metadata.append(None)
+        previous = self.ids[row]
+        if previous is not None and self.rows.get(previous) == row:
+            del self.rows[previous]
+        self.ids[row] = vector_id
+        self.metadata[row] = None
+        if vector_id is not None:
+            self.metadata[row] = metadata or {}
+            self.rows[vector_id] = row
+
+    def _reserve(self, count):
+        # Caller holds self._lock. Grow the file by doubling, then remap it.
+        if count <= self._capacity:
+            return
+        capacity = max(MIN_CAPACITY, self._capacity)
+        while capacity < count:
+            capacity *= 2
+        if isinstance(self._vectors, np.memmap):
+            self._vectors.flush()
+        with open(self.vectors_path, "r+b") as f:
+            f.truncate(capacity * self.dimensions * 4)
+        self._capacity = capacity
+        self._vectors = self._map()
+
+    def __len__(self):
+        return len(self.rows)
+
+    def upsert(self, vectors, namespace=None, **kwargs):
+        """vectors: dicts {"id", "values", "metadata"} or (id, values[, metadata]) tuples."""
+        records = [
+            (vector["id"], vector["values"], vector.get("metadata"))
+            if isinstance(vector, dict)
+            else (vector[0], vector[1], vector[2] if len(vector) > 2 else None)
+            for vector in vectors
+        ]
+        if not records:
+            return {"upserted_count": 0}
+        values = normalize_rows([values for _, values, _ in records])
+        if values.shape[1] != self.dimensions:
+            raise ValueError(f"Expected {self.dimensions} dimensions, got {values.shape[1]}")
+
+        with self._lock:
+            assigned = {}
+            next_row = len(self.ids)
+            for vector_id, _, _ in records:
+                if vector_id not in assigned:
+                    assigned[vector_id] = self.rows.get(vector_id)
+                    if assigned[vector_id] is None:
+                        assigned[vector_id] = next_row
+                        next_row += 1
+            self._reserve(next_row)
+            rows = [assigned[vector_id] for vector_id, _, _ in records]
+            # Vectors first, then the log, so a crash never logs a row without its vector.
+            self._vectors[rows] = values
+            if isinstance(self._vectors, np.memmap):
+                self._vectors.flush()
+            for row, (vector_id, _, metadata) in zip(rows, records):
+                self._set_row(row, vector_id, metadata)
+                self._log.write(json.dumps({"row": row, "id": vector_id, "metadata": metadata or {}}) + "\n")
+            self._log.flush()
+        return {"upserted_count": len(records)}
+
+    def delete(self, ids, namespace=None, **kwargs):
+        with self._lock:
+            for vector_id in ids:
+                row = self.rows.get(vector_id)
+                if row is None:
+                    continue
+                self._vectors[row] = 0
+                self._set_row(row, None, None)
+                self._log.write(json.dumps({"row": row, "id": None}) + "\n")
+            self._log.flush()
+        return {}
+
+    def fetch(self, ids, namespace=None, **kwargs):
+        with self._lock:
+            vectors = {
+                vector_id: SimpleNamespace(
+                    id=vector_id,
+                    values=self._vectors[self.rows[vector_id]].tolist(),
+                    metadata=self.metadata[self.rows[vector_id]],
+                )
+                for vector_id in ids
+                if vector_id in self.rows
+            }
+        return SimpleNamespace(vectors=vectors)
+
+    def list(self, limit=100, namespace=None, **kwargs):
+        """Pages of vector IDs, like the SDK's list()."""
+        with self._lock:
+            ids = sorted(self.rows)
+        for start in range(0, len(ids), limit):
+            yield ids[start : start + limit]
+
+    def metadata_rows(self, start=0):
+        """Snapshot of the metadata from row start on, None for deleted rows."""
+        with self._lock:
+            return self.metadata[start:]
+
+    def candidate_rows(self, filter=None):
+        """Rows of live vectors whose metadata passes the filter, or None for every row."""
+        with self._lock:
+            if not filter and len(self.rows) == len(self.ids):
+                return None
+            return np.array(
+                [
+                    row
+                    for row, metadata in enumerate(self.metadata)
+                    if metadata is not None and (not filter or matches_filter(metadata, filter))
+                ],
+                dtype=np.int64,
+            )
+
+    def search(self, vectors, top_k=10, filter=None, rows=None):
+        """
+        Exact top_k for each query vector, as [[(vector ID, score, metadata)], ...]
+        best first. rows restricts scoring to those rows (e.g. from
+        candidate_rows); otherwise the filter is applied first.
+        """
+        queries = normalize_rows(vectors)
+        if rows is None:
+            rows = self.candidate_rows(filter)
+        with self._lock:
+            matrix = self._vectors
+            total = len(self.ids)
+        if rows is not None:
+            total = len(rows)
+        if not total or top_k < 1:
+            return [[] for _ in queries]
+
+        best_scores, best_rows = [], []
+        for start in range(0, total, self.block_rows):
+            if rows is None:
+                block_rows = np.arange(start, min(start + self.block_rows, total))
+                block = matrix[start : start + len(block_rows)]
+            else:
+                block_rows = rows[start : start + self.block_rows]
+                block = matrix[block_rows]
+            scores, found = _top_k(queries @ block.T, block_rows, top_k)
+            best_scores.append(scores)
+            best_rows.append(found)
+        scores, found = _top_k(np.hstack(best_scores), np.hstack(best_rows), top_k)
+
+        results = []
+        with self._lock:
+            for query_scores, query_rows in zip(scores, found):
+                order = np.argsort(-query_scores)
+                results.append(
+                    [
+                        (self.ids[row], float(query_scores[i]), self.metadata[row])
+                        for i, row in ((i, int(query_rows[i])) for i in order)
+                        if self.ids[row] is not None
+                    ]
+                )
+        return results
+
+    def query(self, vector, top_k=10, filter=None, include_metadata=False, namespace=None, **kwargs):
+        """One query, with the response shape of the SDK's Index.query."""
+        matches = [
+            SimpleNamespace(id=vector_id, score=score, metadata=metadata if include_metadata else None)
+            for vector_id, score, metadata in self.search([vector], top_k, filter)[0]
+        ]
+        return SimpleNamespace(matches=matches)
+
+    def close(self):
+        with self._lock:
+            self._log.close()
+            if isinstance(self._vectors, np.memmap):
+                self._vectors.flush()
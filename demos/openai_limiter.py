@@ -0,0 +1,206 @@
+"""
+Shared, rate-limit-aware concurrency control for OpenAI calls.
+
+One controller per model (OpenAI limits are per model). Every call:
+- waits for a free slot. The number of slots adapts with AIMD: +1 slot per
+  window of successful calls, halved on a 429.
+- waits until the last x-ratelimit-remaining-requests/-tokens headers leave
+  room for it, counting the tokens of calls still in flight. Once the headers'
+  reset time passes, the budget is assumed to be refilled.
+- on a 429, pauses the whole model until the reset time instead of letting
+  every thread back off on its own schedule.
+
+Waiting calls are served by priority: INTERACTIVE before BULK, then first come
+first served.
+
+Usage:
+    raw = get_controller("gpt-4o").call(
+        lambda: client.chat.completions.with_raw_response.create(**request),
+        estimated_tokens=1500,
+        priority=BULK,
+    )
+    response = raw.parse()
+
+The OpenAI client should be built with max_retries=0 so 429s reach the
+controller instead of being retried inside the SDK. The controller retries
+server errors, connection errors and timeouts too, with exponential backoff.
+"""
+
+import heapq
+import itertools
+import random
+import re
+import threading
+import time
+
+INTERACTIVE = 0
+BULK = 1
+
+# Retry 429s, server errors and requests that never got a response (connection
+# errors, timeouts); anything else is the caller's problem.
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+try:
+    from openai import APIConnectionError  # APITimeoutError is a subclass
+
+    RETRY_EXCEPTIONS = (APIConnectionError, ConnectionError, TimeoutError)
+except ImportError:
+    RETRY_EXCEPTIONS = (ConnectionError, TimeoutError)
+
+
+def parse_reset(value):
+    """OpenAI reset headers look like "1s", "6m0s", "20ms" or "1h2m3.5s"."""
+    if not value:
+        return None
+    seconds = 0.0
+    for amount, unit in re.findall(r"([\d.]+)(ms|h|m|s)", value):
+        seconds += float(amount) * {"ms": 0.001, "s": 1, "m": 60, "h": 3600}[unit]
+    return seconds
+
+
+class RateLimitController:
+    def __init__(
+        self,
+        name,
+        initial_concurrency=4,
+        min_concurrency=1,
+        max_concurrency=64,
+        max_retries=6,
+    ):
+        self.name = name
+        self.concurrency = float(initial_concurrency)
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+
+        self.in_flight = 0
+        self.in_flight_tokens = 0
+        self.remaining_requests = None
+        self.remaining_tokens = None
+        self.budget_resets_at = 0.0
+        self.paused_until = 0.0
+        self.stats = {"calls": 0, "rate_limited": 0, "retries": 0}
+
+        self._cond = threading.Condition()
+        self._waiting = []  # heap of (priority, seq)
+        self._seq = itertools.count()
+
+    def _has_room(self, estimated_tokens, now):
+        if now < self.paused_until:
+            return False
+        if self.in_flight >= int(self.concurrency):
+            return False
+        if now >= self.budget_resets_at:
+            return True
+        if self.remaining_requests is not None and self.in_flight >= self.remaining_requests:
+            return False
+        if (
+            self.remaining_tokens is not None
+            and self.in_flight
+            and self.in_flight_tokens + estimated_tokens > self.remaining_tokens
+        ):
+            return False
+        return True
+
+    def _acquire(self, estimated_tokens, priority):
+        with self._cond:
+            ticket = (priority, next(self._seq))
+            heapq.heappush(self._waiting, ticket)
+            while True:
+                now = time.monotonic()
+                if self._waiting[0] == ticket and self._has_room(estimated_tokens, now):
+                    break
+                # Wake up on our own when a pause or the budget window ends.
+                wake_at = max(self.paused_until, self.budget_resets_at)
+                timeout = wake_at - now if wake_at > now else 1.0
+                self._cond.wait(timeout=min(timeout, 1.0))
+            heapq.heappop(self._waiting)
+            self.in_flight += 1
+            self.in_flight_tokens += estimated_tokens
+            self._cond.notify_all()
+
+    def _release(self, estimated_tokens):
+        with self._cond:
+            self.in_flight -= 1
+            self.in_flight_tokens -= estimated_tokens
+            self._cond.notify_all()
+
+    def _update_from_headers(self, headers):
+        if not headers:
+            return
+        with self._cond:
+            requests_left = headers.get("x-ratelimit-remaining-requests")
+            tokens_left = headers.get("x-ratelimit-remaining-tokens")
+            if requests_left is not None:
+                self.remaining_requests = int(requests_left)
+            if tokens_left is not None:
+                self.remaining_tokens = int(tokens_left)
+            resets = [
+                parse_reset(headers.get("x-ratelimit-reset-requests")),
+                parse_reset(headers.get("x-ratelimit-reset-tokens")),
+            ]
+            resets = [reset for reset in resets if reset is not None]
+            if resets:
+                self.budget_resets_at = time.monotonic() + max(resets)
+
+    def _on_success(self):
+        with self._cond:
+            # Additive increase: about one more slot per window of successful calls.
+            self.concurrency = min(
+                self.max_concurrency, self.concurrency + 1 / max(self.concurrency, 1)
+            )
+
+    def _on_rate_limited(self, headers):
+        with self._cond:
+            self.stats["rate_limited"] += 1
+            # Multiplicative decrease, and pause everyone until the limit resets.
+            self.concurrency = max(self.min_concurrency, self.concurrency / 2)
+            resets = [
+                parse_reset((headers or {}).get(header))
+                for header in ("x-ratelimit-reset-requests", "x-ratelimit-reset-tokens")
+            ]
+            pause = max([reset for reset in resets if reset is not None] or [1.0])
+            self.paused_until = max(self.paused_until, time.monotonic() + pause)
+            self._cond.notify_all()
+
+    def call(self, fn, estimated_tokens=0, priority=BULK):
+        """
+        Run fn() once there is room for it. fn should return a raw response
+        (with .headers), e.g. client.embeddings.with_raw_response.create(...).
+        """
+        for attempt in range(self.max_retries + 1):
+            self._acquire(estimated_tokens, priority)
+            try:
+                with self._cond:
+                    self.stats["calls"] += 1
+                response = fn()
+            except Exception as e:
+                status = getattr(e, "status_code", None)
+                retryable = status in RETRY_STATUSES or isinstance(e, RETRY_EXCEPTIONS)
+                if not retryable or attempt == self.max_retries:
+                    raise
+                headers = getattr(getattr(e, "response", None), "headers", None)
+                if status == 429:
+                    self._on_rate_limited(headers)
+                else:
+                    time.sleep(min(30, 0.5 * 2**attempt) * random.uniform(0.5, 1.5))
+                with self._cond:
+                    self.stats["retries"] += 1
+                continue
+            finally:
+                self._release(estimated_tokens)
+
+            self._update_from_headers(getattr(response, "headers", None))
+            self._on_success()
+            return response
+
+
+_controllers = {}
+_controllers_lock = threading.Lock()
+
+
+def get_controller(model):
+    """The process-wide controller for a model."""
+    with _controllers_lock:
+        if model not in _controllers:
+            _controllers[model] = RateLimitController(model)
+        return _controllers[model]
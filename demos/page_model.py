@@ -0,0 +1,224 @@
+"""
+Fetched-once, parsed-once page model for therapist profile pages.
+
+parse_page walks the document a single time and pulls out everything the
+pipeline stages need: the visible text (in blocks, in document order), the image
+candidates and the links. It uses lxml through BeautifulSoup when lxml is
+installed, which is several times faster than "html.parser".
+
+parse_page only takes and returns plain data, so it can run in a process pool
+and keep CPU-heavy parsing off the threads doing network I/O.
+
+Usage:
+    page = load_page(fetcher, "https://thrivedowntown.com/our-team/andrew-jarvis/")
+    page.text, page.images, page.links
+"""
+
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urljoin
+
+from bs4 import BeautifulSoup, NavigableString, Tag
+
+try:
+    import lxml  # noqa: F401
+
+    PARSER = "lxml"
+except ImportError:
+    PARSER = "html.parser"
+
+# Elements whose text never shows up on the rendered page.
+HIDDEN_TAGS = {"script", "style", "noscript", "template", "svg", "head", "iframe"}
+# Elements that start a new line of text.
+BLOCK_TAGS = {
+    "address", "article", "aside", "blockquote", "br", "dd", "div", "dl", "dt",
+    "figcaption", "figure", "footer", "form", "h1", "h2", "h3", "h4", "h5", "h6",
+    "header", "hr", "li", "main", "nav", "ol", "p", "section", "table", "td",
+    "th", "tr", "ul",
+}
+# Link targets worth showing in the text, e.g. a booking page or an email address.
+INLINE_LINK_SCHEMES = ("http:", "https:", "mailto:", "tel:")
+# Site chrome: navigation, sidebars, site-wide header/footer and overlays.
+# <header>/<footer> inside <article>/<main> belong to the content (e.g. the
+# entry header holding the therapist's name), so they don't count.
+CHROME_TAGS = {"nav", "aside"}
+PAGE_CHROME_TAGS = {"header", "footer"}
+CONTENT_TAGS = {"article", "main"}
+CHROME_CLASS_WORDS = ("cookie", "consent", "menu", "breadcrumb", "popup", "modal", "newsletter")
+
+
+class _BlockEnd:
+    """Pushed after a block element's children to close its text block."""
+
+    def __init__(self, chrome, content):
+        self.chrome = chrome
+        self.content = content
+
+
+class _LinkEnd:
+    """Pushed after a link's children to write its target after its text."""
+
+    def __init__(self, href):
+        self.href = href
+
+
+IMAGE_ATTRIBUTES = ("src", "data-src", "data-breeze", "alt", "title", "width", "height", "srcset")
+
+
+def parse_page(url, html):
+    """
+    Parse the HTML once. Returns a dict with:
+    text: visible text, one block per line, with each link's target after its
+          text as "text (url)"
+    blocks: [(order, text)] visible text pieces with their position in the document
+    chrome: orders of the blocks that sit in site chrome (nav, site header/footer,
+            cookie banners, menus)
+    images: [{order, url, and whichever of src, data-src, data-breeze, alt, title,
+              width, height, srcset the <img> has}]
+    links: absolute hrefs, in order, without duplicates
+    """
+    soup = BeautifulSoup(html, PARSER)
+    blocks = []
+    images = []
+    links = []
+    seen_links = set()
+
+    # Inline text (<b>, <span>, <a>...) joins the current block; block-level
+    # elements start a new one. Whitespace between inline elements is kept as a
+    # single space so "<b>Andrew</b> <b>Jarvis</b>" doesn't run together.
+    current = []
+    current_order = [0]
+    chrome = []
+    chrome_depth = 0
+    content_depth = 0
+
+    def end_block():
+        text = " ".join("".join(current).split())
+        if text:
+            blocks.append((current_order[0], text))
+            if chrome_depth:
+                chrome.append(current_order[0])
+        current.clear()
+
+    # Walk the tree once, depth first, with an explicit stack so deeply
+    # nested page builders can't hit the recursion limit.
+    order = 0
+    stack = [iter(soup.children)]
+    while stack:
+        child = next(stack[-1], None)
+        if child is None:
+            stack.pop()
+            continue
+        if isinstance(child, _BlockEnd):
+            end_block()
+            chrome_depth -= child.chrome
+            content_depth -= child.content
+            continue
+        if isinstance(child, _LinkEnd):
+            if child.href not in "".join(current):
+                if not current:
+                    current_order[0] = order
+                current.append(f" ({child.href})")
+            continue
+        order += 1
+        if isinstance(child, NavigableString):
+            # Comments, doctypes and CDATA are NavigableString subclasses.
+            if type(child) is NavigableString:
+                if child.strip():
+                    if not current:
+                        current_order[0] = order
+                    current.append(child)
+                elif current:
+                    current.append(" ")
+            continue
+        if not isinstance(child, Tag) or child.name in HIDDEN_TAGS:
+            continue
+
+        if child.name == "img":
+            # Like a bs4 Tag, missing attributes are absent, so img.get(name, "") works.
+            image = {
+                attribute: child[attribute]
+                for attribute in IMAGE_ATTRIBUTES
+                if child.get(attribute) is not None
+            }
+            image["order"] = order
+            # Lazy-loaded images often have a data: placeholder in src.
+            sources = [
+                image.get(attribute)
+                for attribute in ("src", "data-src", "data-breeze")
+                if image.get(attribute) and not image[attribute].startswith("data:")
+            ]
+            image["url"] = urljoin(url, sources[0]) if sources else None
+            images.append(image)
+        elif child.name == "a" and child.get("href"):
+            href = urljoin(url, child["href"])
+            if href not in seen_links:
+                seen_links.add(href)
+                links.append(href)
+            if href.startswith(INLINE_LINK_SCHEMES) and not child["href"].startswith("#"):
+                stack.append(itertools.chain(child.children, (_LinkEnd(href),)))
+                continue
+
+        if child.name in BLOCK_TAGS:
+            end_block()
+            marker = " ".join(child.get("class") or []) + " " + (child.get("id") or "")
+            is_chrome = (
+                child.name in CHROME_TAGS
+                or (child.name in PAGE_CHROME_TAGS and not content_depth)
+                or any(word in marker.lower() for word in CHROME_CLASS_WORDS)
+            )
+            is_content = child.name in CONTENT_TAGS
+            chrome_depth += is_chrome
+            content_depth += is_content
+            stack.append(
+                itertools.chain(child.children, (_BlockEnd(is_chrome, is_content),))
+            )
+        else:
+            stack.append(iter(child.children))
+    end_block()
+
+    return {
+        "url": url,
+        "text": "\n".join(text for _, text in blocks),
+        "blocks": blocks,
+        "chrome": chrome,
+        "images": images,
+        "links": links,
+    }
+
+
+class Page:
+    def __init__(self, url, html, parsed):
+        self.url = url
+        self.html = html
+        self.text = parsed["text"]
+        self.blocks = parsed["blocks"]
+        self.chrome = set(parsed["chrome"])
+        self.images = parsed["images"]
+        self.links = parsed["links"]
+
+
+_parse_pool = None
+
+
+def get_parse_pool(processes):
+    """Process pool for parse_page, created on first use."""
+    global _parse_pool
+    if _parse_pool is None:
+        _parse_pool = ProcessPoolExecutor(max_workers=processes)
+    return _parse_pool
+
+
+def build_page(url, html, processes=0):
+    """Parse html into a Page. With processes > 0 the parse runs in a shared process pool."""
+    if processes:
+        parsed = get_parse_pool(processes).submit(parse_page, url, html).result()
+    else:
+        parsed = parse_page(url, html)
+    return Page(url, html, parsed)
+
+
+def load_page(fetcher, url, processes=0, timeout=10):
+    """Fetch the page once and parse it once."""
+    html = fetcher.fetch(url, timeout=timeout).text
+    return build_page(url, html, processes)
@@ -0,0 +1,103 @@
+"""
+Shrinks a scraped profile page to the text extract_json actually needs.
+
+1. Drop site chrome (nav, site header/footer, cookie banners, menus) and lines
+   that are boilerplate anywhere (copyright, "skip to content", ...).
+2. Drop repeated blocks, e.g. the same call-to-action three times.
+3. Focus on the therapist: start a little before the first block that names
+   them (the name comes from the URL slug, since we haven't extracted it yet)
+   and read forward, so teasers for other team members at the bottom are the
+   first thing to go.
+4. Stop at the token budget.
+
+Usage:
+    text, stats = reduce_page(page, link, token_budget=3000, count_tokens=count_tokens)
+    stats -> {"tokens_before": 9120, "tokens_after": 1480, ...}
+"""
+
+import re
+from urllib.parse import urlsplit
+
+BOILERPLATE = re.compile(
+    r"^(©|copyright\b|all rights reserved|skip to (main )?content|toggle navigation|"
+    r"menu$|close$|search$|back to top|privacy policy|terms (of use|and conditions)|"
+    r"we use cookies|accept( all)?( cookies)?$|subscribe|sign up for our newsletter)",
+    re.IGNORECASE,
+)
+SLUG_SKIP = {"dr", "our", "team", "your", "meet", "the", "home", "therapist", "therapists", "counsellor"}
+# Link targets parse_page writes after link text; a link to the profile itself
+# has the name in its URL but doesn't name the therapist on the page.
+LINK_TARGET = re.compile(r" \((?:https?|mailto|tel):[^\s)]*\)")
+# Blocks kept ahead of the first mention of the name (titles, credentials).
+CONTEXT_BEFORE = 5
+
+
+def slug_name_tokens(link):
+    """Best guess at the therapist's name from the last URL path segment."""
+    segments = [segment for segment in urlsplit(link).path.split("/") if segment]
+    if not segments:
+        return []
+    words = re.findall(r"[a-z]+", segments[-1].lower())
+    words = [word for word in words if word not in SLUG_SKIP and len(word) > 1]
+    # Credentials tend to follow the name (tara-read-m-ed-rcc), so keep the front.
+    return words[:2]
+
+
+def _default_count_tokens(text):
+    return len(text) // 4 + 1
+
+
+def reduce_page(page, link, token_budget=3000, count_tokens=_default_count_tokens):
+    """Returns (reduced text, stats)."""
+    before_tokens = count_tokens(page.text)
+
+    blocks = []
+    seen = set()
+    for order, text in page.blocks:
+        if order in page.chrome or BOILERPLATE.match(text):
+            continue
+        key = " ".join(text.lower().split())
+        if key in seen:
+            continue
+        seen.add(key)
+        blocks.append((order, text))
+
+    tokens = slug_name_tokens(link)
+    anchor = 0
+    for position, (_, text) in enumerate(blocks):
+        lowered = LINK_TARGET.sub("", text).lower()
+        if tokens and all(token in lowered for token in tokens):
+            anchor = max(0, position - CONTEXT_BEFORE)
+            break
+
+    # Read forward from the anchor; the block that crosses the budget is cut
+    # short. Then fill any budget left with the blocks that came before.
+    kept = {}
+    used = 0
+    for position in range(anchor, len(blocks)):
+        text = blocks[position][1]
+        cost = count_tokens(text)
+        if used + cost > token_budget:
+            remaining = token_budget - used
+            if remaining > 0:
+                kept[position] = text[: len(text) * remaining // cost]
+                used = token_budget
+            break
+        kept[position] = text
+        used += cost
+    for position in range(anchor - 1, -1, -1):
+        text = blocks[position][1]
+        cost = count_tokens(text)
+        if used + cost > token_budget:
+            break
+        kept[position] = text
+        used += cost
+
+    text = "\n".join(kept[position] for position in sorted(kept))
+    stats = {
+        "tokens_before": before_tokens,
+        "tokens_after": count_tokens(text),
+        "blocks_before": len(page.blocks),
+        "blocks_after": len(kept),
+    }
+    return text, stats
@@ -0,0 +1,81 @@
+"""
+Per-page change detection for the therapist pipeline.
+
+For every link we keep the hash of each stage's input together with the output
+it produced. When a stage sees the same input hash again, it reuses the stored
+output instead of calling the LLM. The special "page" stage records the hash of
+the normalized page text once the whole profile was uploaded, so an unchanged
+page can be skipped entirely.
+
+Usage:
+    store = PageStateStore()
+    cached = store.get(link, "extract", text_hash)
+    if cached is None:
+        ...
+        store.put(link, "extract", text_hash, output)
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), ".cache", "page_state.sqlite3"
+)
+
+
+def content_hash(value):
+    """sha256 of whitespace-normalized text, or of the JSON form of anything else."""
+    if isinstance(value, str):
+        text = " ".join(value.split())
+    else:
+        text = json.dumps(value, sort_keys=True)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class PageStateStore:
+    def __init__(self, path=DEFAULT_PATH):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS stage_outputs (
+                link TEXT NOT NULL,
+                stage TEXT NOT NULL,
+                input_hash TEXT NOT NULL,
+                output TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (link, stage)
+            )"""
+        )
+        self._db.commit()
+
+    def get(self, link, stage, input_hash):
+        """The stored output of stage for link, if it was produced from the same input."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT output FROM stage_outputs WHERE link = ? AND stage = ? AND input_hash = ?",
+                (link, stage, input_hash),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put_many(self, link, outputs):
+        """outputs: {stage: (input_hash, output)}"""
+        now = time.time()
+        rows = [
+            (link, stage, input_hash, json.dumps(output), now)
+            for stage, (input_hash, output) in outputs.items()
+        ]
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO stage_outputs (link, stage, input_hash, output, updated_at) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._db.commit()
+
+    def put(self, link, stage, input_hash, output):
+        self.put_many(link, {stage: (input_hash, output)})
@@ -0,0 +1,124 @@
+"""
+Manifest of the PDFs already uploaded from a folder, and the vectors each one produced.
+
+Each file is recorded with its size, mtime, content hash and vector IDs. A file
+whose size and mtime are unchanged is taken as unchanged without reading it,
+so checking a folder that hasn't changed costs one stat per file. Only files
+whose size or mtime moved are hashed, and a file that was merely touched is
+still unchanged.
+
+Usage:
+    manifest = PdfManifest(pdf_manifest_path("ai41", "pdfs"))
+    diff = manifest.diff("pdfs")
+    diff -> {"new": {name: fingerprint}, "changed": {...}, "removed": [names], "unchanged": 12}
+"""
+
+import hashlib
+import json
+import os
+import threading
+import uuid
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+
+
+def folder_scope(folder_path):
+    """The folder's absolute path, which scopes its manifest and vector IDs."""
+    return os.path.abspath(folder_path)
+
+
+def pdf_manifest_path(index_name, folder_path):
+    """
+    One manifest per index and folder: the vector IDs are only meaningful in
+    that index, and syncing another folder mustn't see this one's files as removed.
+    """
+    scope = hashlib.sha1(folder_scope(folder_path).encode("utf-8")).hexdigest()[:12]
+    return os.path.join(CACHE_DIR, f"pdf_manifest-{index_name}-{scope}.json")
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_id(scope, name, sha256, number):
+    """
+    Deterministic vector ID for the number-th chunk of a version of a file.
+    scope (see folder_scope) keeps the same file in two folders apart.
+    """
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"pdf:{scope}:{name}:{sha256}:{number}"))
+
+
+class PdfManifest:
+    def __init__(self, path):
+        self.path = path
+        self.files = {}  # name relative to the folder -> {"size", "mtime_ns", "sha256", "vector_ids"}
+        # Set when entries change, so the caller knows to save.
+        self.dirty = False
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path) as f:
+                self.files = json.load(f).get("files", {})
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with self._lock:
+            data = {"files": dict(self.files)}
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+        self.dirty = False
+
+    def diff(self, folder_path):
+        """
+        Compare the folder with the manifest. New and changed files come with
+        their fingerprint {"size", "mtime_ns", "sha256"}.
+        """
+        new, changed = {}, {}
+        unchanged = 0
+        seen = set()
+        for name in sorted(os.listdir(folder_path)):
+            if not name.endswith(".pdf"):
+                continue
+            seen.add(name)
+            stat = os.stat(os.path.join(folder_path, name))
+            entry = self.files.get(name)
+            if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+                unchanged += 1
+                continue
+
+            fingerprint = {
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "sha256": file_hash(os.path.join(folder_path, name)),
+            }
+            if entry is None:
+                new[name] = fingerprint
+            elif entry["sha256"] == fingerprint["sha256"]:
+                # Touched but not edited: remember the new mtime, keep the vectors.
+                unchanged += 1
+                with self._lock:
+                    entry.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+                    self.dirty = True
+            else:
+                changed[name] = fingerprint
+        removed = sorted(name for name in self.files if name not in seen)
+        return {"new": new, "changed": changed, "removed": removed, "unchanged": unchanged}
+
+    def record(self, name, fingerprint, vector_ids):
+        with self._lock:
+            self.files[name] = {**fingerprint, "vector_ids": list(vector_ids)}
+            self.dirty = True
+
+    def forget(self, name):
+        with self._lock:
+            self.dirty = True
+            return self.files.pop(name, None)
+
+    def vector_ids(self, name):
+        with self._lock:
+            return list(self.files.get(name, {}).get("vector_ids", []))
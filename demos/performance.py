@@ -0,0 +1,229 @@
+"""
+Performance tracking for the Python pipelines.
+
+A port of supabase/functions/_lib/performance.ts: it produces the same
+PerformanceData shape (functionName, startTime, totalTime, events, summary,
+coldStart), with times in milliseconds. On top of that it is thread safe, can
+time many overlapping spans with the same name (one per link), writes the
+spans as JSON Lines and reports p50/p95/p99 per stage.
+
+With spans_path, each span is appended to that file when it ends instead of
+being kept in data["events"], and percentiles come from a fixed-size random
+sample per stage, so memory stays flat over a run of any length.
+
+Usage:
+    perf = create_performance_tracker("upload_therapist_directory", spans_path="spans.jsonl")
+    with perf.track("fetch", {"link": link}):
+        html = fetch(link)
+    data = perf.complete()
+    print(perf.percentiles())
+"""
+
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+# Track if this is the first tracker per function in this process.
+_cold_start = {}
+_cold_start_lock = threading.Lock()
+
+
+def _now():
+    """Milliseconds, like performance.now()."""
+    return time.perf_counter() * 1000
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of a non-empty list, q in [0, 100]."""
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * q // 100))
+    return ordered[int(rank) - 1]
+
+
+def create_performance_tracker(function_name, **options):
+    """Creates a new performance tracker for a function."""
+    with _cold_start_lock:
+        is_first_init = function_name not in _cold_start
+        _cold_start[function_name] = False
+    return PerformanceTracker(function_name, is_first_init, **options)
+
+
+class PerformanceTracker:
+    def __init__(
+        self, function_name, is_first_init, verbose=False, spans_path=None, max_samples=10000
+    ):
+        self.data = {
+            "functionName": function_name,
+            "startTime": _now(),
+            "events": [],
+            "coldStart": is_first_init,
+        }
+        # Logging every span is too noisy for a crawl of thousands of links.
+        self.verbose = verbose
+        self.max_samples = max_samples
+        self._active = {}  # name -> open events, oldest first
+        self._totals = {}  # summary category -> total ms
+        self._samples = {}  # name -> [count, max, sampled durations]
+        self._random = random.Random(0)
+        self._lock = threading.Lock()
+        self._spans = None
+        if spans_path:
+            directory = os.path.dirname(spans_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._spans = open(spans_path, "w")
+        print(f"[{function_name}] {'COLD' if is_first_init else 'WARM'} start")
+
+    def start_event(self, name, metadata=None):
+        """Start tracking a named event. Returns the event."""
+        event = {"name": name, "startTime": _now()}
+        if metadata:
+            event["metadata"] = dict(metadata)
+        with self._lock:
+            if not self._spans:
+                self.data["events"].append(event)
+            self._active.setdefault(name, []).append(event)
+        return event
+
+    def _record(self, event):
+        # Caller holds self._lock.
+        duration = event["duration"]
+        if duration:
+            category = event["name"].split(":")[0]
+            self._totals[category] = self._totals.get(category, 0) + duration
+        stats = self._samples.setdefault(event["name"], [0, 0.0, []])
+        stats[0] += 1
+        stats[1] = max(stats[1], duration)
+        # Reservoir sampling: every duration has the same chance to be kept.
+        if len(stats[2]) < self.max_samples:
+            stats[2].append(duration)
+        else:
+            slot = self._random.randrange(stats[0])
+            if slot < self.max_samples:
+                stats[2][slot] = duration
+        if self._spans:
+            line = {
+                "functionName": self.data["functionName"],
+                "coldStart": self.data["coldStart"],
+                **event,
+            }
+            self._spans.write(json.dumps(line) + "\n")
+
+    def end_event(self, name, additional_metadata=None, event=None):
+        """
+        End a named event and return its duration. Pass the event returned by
+        start_event to end that one when several with the same name are open;
+        otherwise the oldest open one is ended.
+        """
+        end_time = _now()
+        with self._lock:
+            open_events = self._active.get(name, [])
+            if event is None and open_events:
+                event = open_events[0]
+            if event is None or event not in open_events:
+                print(
+                    f"[{self.data['functionName']}] Attempted to end event '{name}' that wasn't started"
+                )
+                return 0
+            open_events.remove(event)
+            if not open_events:
+                del self._active[name]
+            event["endTime"] = end_time
+            event["duration"] = end_time - event["startTime"]
+            if additional_metadata:
+                event["metadata"] = {**event.get("metadata", {}), **additional_metadata}
+            self._record(event)
+
+        if self.verbose:
+            print(
+                f"[{self.data['functionName']}] {name} completed in {event['duration']:.2f}ms"
+            )
+        return event["duration"]
+
+    @contextmanager
+    def track(self, name, metadata=None):
+        """Time the body of a with block. Errors are recorded on the event and re-raised."""
+        event = self.start_event(name, metadata)
+        try:
+            yield event
+        except Exception as e:
+            self.end_event(name, {"error": str(e)}, event=event)
+            raise
+        self.end_event(name, event=event)
+
+    def complete(self):
+        """Complete the performance tracking and generate the summary."""
+        self.data["totalTime"] = _now() - self.data["startTime"]
+
+        # Summary by event type: the part of the name before the first ":".
+        with self._lock:
+            summary = dict(self._totals)
+            if self._spans:
+                self._spans.close()
+                self._spans = None
+        self.data["summary"] = summary
+
+        print(
+            f"[{self.data['functionName']}] Execution completed in {self.data['totalTime']:.2f}ms",
+            {"coldStart": self.data["coldStart"], "summary": summary},
+        )
+        return self.data
+
+    def percentiles(self):
+        """
+        {event name: {"count", "p50", "p95", "p99", "max"}} over finished events,
+        in ms. Exact up to max_samples events per name, sampled beyond that.
+        """
+        with self._lock:
+            samples = {name: (count, top, list(values)) for name, (count, top, values) in self._samples.items()}
+        return {
+            name: {
+                "count": count,
+                "p50": percentile(values, 50),
+                "p95": percentile(values, 95),
+                "p99": percentile(values, 99),
+                "max": top,
+            }
+            for name, (count, top, values) in samples.items()
+        }
+
+    def write_jsonl(self, path):
+        """
+        One line per event, tagged with the function name and cold start flag.
+        Not needed with spans_path, where spans are written as they end.
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            events = list(self.data["events"])
+        with open(path, "w") as f:
+            for event in events:
+                line = {
+                    "functionName": self.data["functionName"],
+                    "coldStart": self.data["coldStart"],
+                    **event,
+                }
+                f.write(json.dumps(line) + "\n")
+
+    def write_summary(self, path):
+        """The completed PerformanceData without its events, plus per-stage percentiles."""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        summary = {key: value for key, value in self.data.items() if key != "events"}
+        summary["percentiles"] = self.percentiles()
+        with open(path, "w") as f:
+            json.dump(summary, f, indent=2)
+
+    def print_percentiles(self):
+        print(f"{'stage':<24}{'count':>8}{'p50 ms':>12}{'p95 ms':>12}{'p99 ms':>12}")
+        stats = self.percentiles()
+        for name in sorted(stats, key=lambda name: -stats[name]["p95"]):
+            row = stats[name]
+            print(
+                f"{name:<24}{row['count']:>8}{row['p50']:>12.1f}{row['p95']:>12.1f}{row['p99']:>12.1f}"
+            )
@@ -0,0 +1,234 @@
+"""
+Buffered batch upserts to a Pinecone index.
+
+Vectors are collected and sent in batches that stay under Pinecone's per-request
+vector count and size limits. A batch is sent when it is full, or when the oldest
+buffered vector has waited flush_interval seconds. Batches are sent in parallel
+from a small thread pool. With a PerformanceTracker, every upsert request is
+timed as an "upsert" span. With on_result, each vector's outcome is reported as
+on_result(vector_id, error) as soon as its batch is done (error is None on
+success), so callers don't have to wait for close().
+
+A batch that fails in transit (connection error, timeout, 429 or 5xx) is
+retried whole with exponential backoff. One that Pinecone rejects as invalid
+(400 / INVALID_ARGUMENT) is split in half until the bad vectors are found, so
+they fail alone. Any other error fails the batch.
+
+Usage:
+    with UpsertWriter(index, metadata_validator=valid_metadata_size) as writer:
+        writer.add(vector_id, embedding, metadata)
+    print(writer.report())
+"""
+
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+import urllib3
+
+# Pinecone caps an upsert at 1000 vectors and 2MB, and recommends batches of
+# about 100 vectors for large dense vectors.
+MAX_BATCH_VECTORS = 100
+MAX_REQUEST_BYTES = 2 * 1024 * 1024
+MAX_METADATA_BYTES = 40960  # 40KB per vector
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# gRPC status codes, by name, for the same two cases.
+RETRY_CODES = {"UNAVAILABLE", "DEADLINE_EXCEEDED", "RESOURCE_EXHAUSTED", "INTERNAL", "ABORTED"}
+INVALID_CODES = {"INVALID_ARGUMENT", "OUT_OF_RANGE"}
+TRANSPORT_ERRORS = (
+    ConnectionError,
+    TimeoutError,
+    requests.ConnectionError,
+    requests.Timeout,
+    urllib3.exceptions.HTTPError,
+)
+
+
+def valid_metadata_size(metadata, verbose=True):
+    """Check under 40KB limit"""
+    metadata_json = json.dumps(metadata)
+    size = len(metadata_json.encode("utf-8"))
+
+    # Check if it exceeds Pinecone's limit
+    if size < MAX_METADATA_BYTES:
+        if verbose:
+            print(f"Metadata is under Pinecone's 40KB limit. {size}")
+        return True
+    else:
+        if verbose:
+            print("Metadata is above Pinecone's 40KB limit.")
+        return False
+
+
+def error_status(error):
+    """(HTTP status, gRPC code name) of an upsert error, either None if it has none."""
+    status = getattr(error, "status", None) or getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    code = getattr(error, "code", None)
+    code = code() if callable(code) else code
+    return status, getattr(code, "name", None)
+
+
+def is_invalid_request(error):
+    status, code = error_status(error)
+    return status == 400 or code in INVALID_CODES
+
+
+def is_transient(error):
+    status, code = error_status(error)
+    return isinstance(error, TRANSPORT_ERRORS) or status in RETRY_STATUSES or code in RETRY_CODES
+
+
+def estimate_vector_bytes(vector_id, values, metadata):
+    """Rough serialized size of one vector: float32 values, metadata JSON and the id."""
+    metadata_size = len(json.dumps(metadata).encode("utf-8")) if metadata else 0
+    return 4 * len(values) + metadata_size + len(vector_id) + 64
+
+
+class UpsertWriter:
+    def __init__(
+        self,
+        index,
+        batch_size=MAX_BATCH_VECTORS,
+        max_request_bytes=MAX_REQUEST_BYTES,
+        flush_interval=5.0,
+        max_parallel=4,
+        metadata_validator=None,
+        namespace=None,
+        tracker=None,
+        on_result=None,
+        max_retries=4,
+    ):
+        self.index = index
+        self.batch_size = batch_size
+        self.max_request_bytes = max_request_bytes
+        self.flush_interval = flush_interval
+        self.metadata_validator = metadata_validator
+        self.namespace = namespace
+        self.tracker = tracker
+        self.on_result = on_result
+        self.max_retries = max_retries
+
+        self.upserted = 0
+        self.failed = {}  # vector id -> error message
+        self._buffer = []
+        self._buffer_bytes = 0
+        self._oldest = None
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_parallel)
+        self._futures = []
+        self._closed = threading.Event()
+        self._timer = threading.Thread(target=self._flush_on_interval, daemon=True)
+        self._timer.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add(self, vector_id, values, metadata):
+        """
+        Buffer one vector. Returns False (and records the failure) if its
+        metadata is rejected by metadata_validator.
+        """
+        if self.metadata_validator and not self.metadata_validator(metadata):
+            self._record_failure(vector_id, "Metadata is above Pinecone's 40KB limit.")
+            return False
+
+        size = estimate_vector_bytes(vector_id, values, metadata)
+        vector = {"id": vector_id, "values": values, "metadata": metadata}
+        with self._lock:
+            if self._buffer and self._buffer_bytes + size > self.max_request_bytes:
+                self._send_buffer()
+            self._buffer.append(vector)
+            self._buffer_bytes += size
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            if len(self._buffer) >= self.batch_size:
+                self._send_buffer()
+        return True
+
+    def flush(self):
+        """Send whatever is buffered and wait for every in-flight batch."""
+        with self._lock:
+            self._send_buffer()
+            futures, self._futures = self._futures, []
+        for future in futures:
+            future.result()
+
+    def close(self):
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        self._timer.join()
+        self.flush()
+        self._pool.shutdown()
+
+    def report(self):
+        return {"upserted": self.upserted, "failed": dict(self.failed)}
+
+    def _send_buffer(self):
+        # Caller holds self._lock.
+        if not self._buffer:
+            return
+        batch = self._buffer
+        self._buffer = []
+        self._buffer_bytes = 0
+        self._oldest = None
+        self._futures.append(self._pool.submit(self._upsert, batch))
+
+    def _flush_on_interval(self):
+        while not self._closed.wait(min(1.0, self.flush_interval)):
+            with self._lock:
+                if (
+                    self._oldest is not None
+                    and time.monotonic() - self._oldest >= self.flush_interval
+                ):
+                    self._send_buffer()
+
+    def _upsert(self, batch):
+        """
+        Upsert one batch, retrying transient errors. If Pinecone rejects it as
+        invalid, split it in half and retry, so one bad vector only fails itself.
+        """
+        options = {"namespace": self.namespace} if self.namespace else {}
+        for attempt in range(self.max_retries + 1):
+            try:
+                if self.tracker:
+                    with self.tracker.track("upsert", {"vectors": len(batch)}):
+                        response = self.index.upsert(vectors=batch, **options)
+                else:
+                    response = self.index.upsert(vectors=batch, **options)
+                print(f"upsert response: {response}")
+                break
+            except Exception as e:
+                if is_invalid_request(e) and len(batch) > 1:
+                    middle = len(batch) // 2
+                    self._upsert(batch[:middle])
+                    self._upsert(batch[middle:])
+                    return
+                if is_transient(e) and attempt < self.max_retries:
+                    time.sleep(min(30, 0.5 * 2**attempt) * random.uniform(0.5, 1.5))
+                    continue
+                print(f"Upsert failed for {len(batch)} vector(s) starting at {batch[0]['id']}: {e}")
+                for vector in batch:
+                    self._record_failure(vector["id"], str(e))
+                return
+
+        with self._lock:
+            self.upserted += len(batch)
+        if self.on_result:
+            for vector in batch:
+                self.on_result(vector["id"], None)
+
+    def _record_failure(self, vector_id, error):
+        with self._lock:
+            self.failed[vector_id] = error
+        if self.on_result:
+            self.on_result(vector_id, error)
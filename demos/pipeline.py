@@ -0,0 +1,223 @@
+"""
+Staged pipeline engine.
+
+Every stage gets its own queue and pool of worker threads, so a slow stage
+(scraping, OpenAI, Pinecone) only blocks items waiting on that stage while the
+other stages keep working on other items.
+
+Usage:
+    pipeline = Pipeline(
+        [
+            Stage("scrape", scrape, workers=8),
+            Stage("extract", extract, workers=4),
+            Stage("upload", upload, workers=2),
+        ]
+    )
+    results, failures = pipeline.run(items)
+
+For inputs too big to hold in memory, pass a generator and stream the outcomes:
+    pipeline.run(items, on_result=save, on_failure=report)
+"""
+
+import queue
+import threading
+import time
+
+# Sentinel telling a worker there is nothing left for its stage.
+_DONE = object()
+
+
+class SkipItem(Exception):
+    """Raise from a stage to drop the item with an expected, reportable reason."""
+
+
+class FinishItem(Exception):
+    """Raise from a stage when an item needs no more work. It counts as a result, not a failure."""
+
+
+class Stage:
+    """
+    A named step with its own concurrency.
+
+    With batch_size set, the stage function receives a list of up to batch_size
+    items instead of one. A worker waits at most batch_wait seconds for a batch
+    to fill up before running it. The function returns a list of the same
+    length; an Exception in place of an item marks just that item as failed.
+    """
+
+    def __init__(self, name, fn, workers=1, batch_size=None, batch_wait=1.0):
+        if workers < 1:
+            raise ValueError(f"Stage {name} needs at least one worker, got {workers}")
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+
+
+class Pipeline:
+    def __init__(self, stages, max_queue=100):
+        """
+        stages: ordered list of Stage objects. Each stage function takes an item
+        and returns the item to pass on to the next stage.
+        max_queue: size of each stage queue. Producers block when a queue is
+        full, so a fast stage can't run far ahead of a slow one.
+        """
+        if not stages:
+            raise ValueError("Pipeline needs at least one stage")
+        self.stages = stages
+        self.max_queue = max_queue
+
+    def run(self, items, on_result=None, on_failure=None):
+        """
+        Push every item through all the stages. items can be any iterable; it is
+        read lazily, as the first stage's queue has room.
+
+        Returns (results, failures):
+        results: items that made it through every stage (or finished early), in input order.
+        failures: list of {"item", "stage", "error"} for items that were dropped.
+
+        With on_result / on_failure, each result or failure is passed to the
+        callback as soon as it is known instead of being kept, and that list
+        comes back empty. Callbacks run on worker threads, possibly several at
+        once. A callback that raises doesn't stop the pipeline: an on_result
+        error turns the item into a failure (stage "on_result"), and an
+        on_failure error is printed and the failure kept in the returned list.
+        """
+        queues = [queue.Queue(maxsize=self.max_queue) for _ in self.stages]
+        results = []
+        failures = []
+        lock = threading.Lock()
+        remaining = [stage.workers for stage in self.stages]
+        threads = []
+
+        def finish_worker(stage_index):
+            # The last worker out of a stage tells the next stage it's done.
+            with lock:
+                remaining[stage_index] -= 1
+                last = remaining[stage_index] == 0
+            if last and stage_index + 1 < len(self.stages):
+                for _ in range(self.stages[stage_index + 1].workers):
+                    queues[stage_index + 1].put(_DONE)
+
+        def record_failure(seq, item, stage_name, error):
+            if on_failure:
+                try:
+                    on_failure({"item": item, "stage": stage_name, "error": error})
+                    return
+                except Exception as e:
+                    print(f"on_failure raised handling a failure in {stage_name}: {e!r}")
+            with lock:
+                failures.append(
+                    {"seq": seq, "item": item, "stage": stage_name, "error": error}
+                )
+
+        def record_result(seq, item):
+            if on_result:
+                try:
+                    on_result(item)
+                except Exception as e:
+                    record_failure(seq, item, "on_result", e)
+                return
+            with lock:
+                results.append((seq, item))
+
+        def pass_on(stage_index, seq, item):
+            if stage_index + 1 < len(self.stages):
+                queues[stage_index + 1].put((seq, item))
+            else:
+                record_result(seq, item)
+
+        def worker(stage_index):
+            stage = self.stages[stage_index]
+            inbox = queues[stage_index]
+            try:
+                while True:
+                    entry = inbox.get()
+                    if entry is _DONE:
+                        return
+
+                    seq, item = entry
+                    try:
+                        item = stage.fn(item)
+                    except FinishItem:
+                        record_result(seq, item)
+                        continue
+                    except Exception as e:
+                        record_failure(seq, item, stage.name, e)
+                        continue
+                    pass_on(stage_index, seq, item)
+            finally:
+                # Even if this worker dies, the next stage must still be told
+                # it's done, or run() would wait forever.
+                finish_worker(stage_index)
+
+        def batch_worker(stage_index):
+            try:
+                run_batches(stage_index)
+            finally:
+                finish_worker(stage_index)
+
+        def run_batches(stage_index):
+            stage = self.stages[stage_index]
+            inbox = queues[stage_index]
+            done = False
+            while not done:
+                entry = inbox.get()
+                if entry is _DONE:
+                    break
+                batch = [entry]
+                deadline = time.monotonic() + stage.batch_wait
+                while len(batch) < stage.batch_size:
+                    try:
+                        entry = inbox.get(timeout=max(0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        break
+                    if entry is _DONE:
+                        done = True
+                        break
+                    batch.append(entry)
+
+                try:
+                    outputs = stage.fn([item for _, item in batch])
+                    if len(outputs) != len(batch):
+                        raise ValueError(
+                            f"Stage {stage.name} returned {len(outputs)} items for a batch of {len(batch)}"
+                        )
+                except Exception as e:
+                    for seq, item in batch:
+                        record_failure(seq, item, stage.name, e)
+                    continue
+
+                for (seq, item), output in zip(batch, outputs):
+                    if isinstance(output, FinishItem):
+                        record_result(seq, item)
+                    elif isinstance(output, Exception):
+                        record_failure(seq, item, stage.name, output)
+                    else:
+                        pass_on(stage_index, seq, output)
+
+        for stage_index, stage in enumerate(self.stages):
+            for n in range(stage.workers):
+                thread = threading.Thread(
+                    target=batch_worker if stage.batch_size else worker,
+                    args=(stage_index,),
+                    name=f"{stage.name}-{n}",
+                    daemon=True,
+                )
+                thread.start()
+                threads.append(thread)
+
+        for seq, item in enumerate(items):
+            queues[0].put((seq, item))
+        for _ in range(self.stages[0].workers):
+            queues[0].put(_DONE)
+
+        for thread in threads:
+            thread.join()
+
+        results.sort(key=lambda entry: entry[0])
+        failures.sort(key=lambda failure: failure["seq"])
+        for failure in failures:
+            del failure["seq"]
+        return [item for _, item in results], failures
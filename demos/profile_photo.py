@@ -0,0 +1,132 @@
+"""
+Deterministic ranking of <img> candidates for a therapist's profile photo.
+
+Each candidate is scored on:
+- the therapist's name in the image URL (src/data-src/data-breeze), alt or title
+- logo/icon-like URLs and data: placeholders, which are ruled out
+- size hints (width/height attributes, WordPress "-300x300" suffixes)
+- URL path: theme and plugin assets are unlikely, upload folders are likely
+- how close the image sits to the therapist's name in the page
+
+best_profile_photo returns the top candidate and a confidence between 0 and 1.
+Callers only need an LLM when the confidence is below their threshold.
+
+Usage:
+    url, confidence = best_profile_photo(page.images, "Andrew Jarvis", page.blocks)
+"""
+
+import re
+from urllib.parse import unquote, urlsplit
+
+NAME_SOURCES = ("src", "data-src", "data-breeze")
+NOT_A_PHOTO = ("logo", "icon", "favicon", "sprite", "placeholder", "badge", "banner", "spinner", "loader")
+ASSET_FOLDERS = ("/themes/", "/plugins/", "/assets/", "/static/", "/icons/")
+UPLOAD_FOLDERS = ("/uploads/", "/images/", "/team/", "/staff/", "/media/", "/photos/")
+TITLES = {"dr", "mr", "mrs", "ms", "mx"}
+
+# A confident pick needs roughly two strong signals (e.g. last name in the URL
+# plus first name in the alt text) and a clear lead over the runner-up.
+CONFIDENT_SCORE = 6.0
+CONFIDENT_MARGIN = 2.0
+
+
+def name_tokens(name):
+    """Lowercase name parts worth matching: no titles, no initials."""
+    words = re.findall(r"[a-z]+", (name or "").lower())
+    return [word for word in words if word not in TITLES and len(word) > 1]
+
+
+def image_size(image):
+    """Best guess at (width, height) from attributes or a -WxH file suffix."""
+    try:
+        return int(image.get("width")), int(image.get("height"))
+    except (TypeError, ValueError):
+        pass
+    for attribute in NAME_SOURCES:
+        match = re.search(r"-(\d{2,4})x(\d{2,4})\.\w+$", image.get(attribute) or "")
+        if match:
+            return int(match.group(1)), int(match.group(2))
+    return None
+
+
+def score_image(image, tokens, name_orders=()):
+    """Score one candidate. Returns None for images that can't be the photo."""
+    sources = [
+        unquote(image.get(attribute) or "").lower()
+        for attribute in NAME_SOURCES
+        if image.get(attribute) and not image[attribute].startswith("data:")
+    ]
+    if not sources:
+        return None
+    text = " ".join(
+        (image.get(attribute) or "").lower() for attribute in ("alt", "title")
+    )
+    if any(word in source for word in NOT_A_PHOTO for source in sources) or any(
+        word in text for word in NOT_A_PHOTO
+    ):
+        return None
+
+    score = 0.0
+    url_hits = [token for token in tokens if any(token in source for source in sources)]
+    text_hits = [token for token in tokens if token in text]
+    score += 2.5 * len(url_hits) + 1.5 * len(text_hits)
+    if tokens and len(url_hits) == len(tokens):
+        score += 1.0
+
+    path = urlsplit(sources[0]).path
+    if any(folder in path for folder in ASSET_FOLDERS):
+        score -= 2.0
+    if any(folder in path for folder in UPLOAD_FOLDERS):
+        score += 0.5
+    if path.count("/") <= 1:
+        score -= 0.5
+    if path.endswith((".svg", ".gif")):
+        score -= 2.0
+
+    size = image_size(image)
+    if size:
+        width, height = size
+        if width < 80 or height < 80:
+            score -= 3.0
+        elif width >= 150 and height >= 150 and 0.5 <= width / height <= 1.5:
+            score += 1.0
+
+    if name_orders and image.get("order") is not None:
+        distance = min(abs(image["order"] - order) for order in name_orders)
+        score += 2.0 * max(0.0, 1 - distance / 50)
+
+    return score
+
+
+def rank_images(images, name, blocks=()):
+    """Candidates that could be the photo, best first, as (score, image)."""
+    tokens = name_tokens(name)
+    name_orders = [
+        order for order, text in blocks if tokens and all(t in text.lower() for t in tokens)
+    ]
+    ranked = []
+    for image in images:
+        score = score_image(image, tokens, name_orders)
+        if score is not None:
+            ranked.append((score, image))
+    ranked.sort(key=lambda entry: (-entry[0], entry[1].get("order", 0)))
+    return ranked
+
+
+def best_profile_photo(images, name, blocks=()):
+    """(url, confidence) of the most likely profile photo, or (None, 0.0)."""
+    ranked = rank_images(images, name, blocks)
+    if not ranked:
+        return None, 0.0
+
+    top_score, top = ranked[0]
+    url = top.get("url") or top.get("src")
+    if len(ranked) == 1:
+        # The only real image on the page: fine unless it scored badly.
+        return url, 1.0 if top_score > 0 else 0.5
+    if top_score <= 0:
+        return url, 0.0
+
+    margin = top_score - ranked[1][0]
+    confidence = min(1.0, top_score / CONFIDENT_SCORE) * min(1.0, margin / CONFIDENT_MARGIN)
+    return url, round(confidence, 2)
@@ -0,0 +1,132 @@
+"""
+Long-lived similarity search over a Pinecone index.
+
+A Retriever is built once and reused: the embeddings model, the Pinecone
+connection and a small thread pool stay warm between calls. Query embeddings
+are kept in an in-memory LRU keyed by the query with whitespace collapsed, so
+a repeated query costs one vector search and no embedding call. A list of
+queries is embedded in one request (only the ones not cached) and searched
+concurrently.
+
+With VECTOR_BACKEND=local, searches go to the in-process LocalVectorIndex
+instead of Pinecone.
+
+Results are structured, one list per query, best match first:
+    [{"id": "...", "score": 0.83, "text": "...", "metadata": {...}}, ...]
+
+Usage:
+    retriever = Retriever("ai41")
+    matches = retriever.search("tell me about my packages in the json file")
+    per_query = retriever.search_many(["fees", "availability"], k=3)
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# The REST client, so importing this needs only the base pinecone package.
+from pinecone import Pinecone
+
+from embedding_cache import normalize_text
+from local_index import LocalVectorIndex, get_local_index, use_local_backend
+
+# PineconeVectorStore keeps each chunk's text under this metadata key.
+TEXT_KEY = "text"
+
+
+class Retriever:
+    def __init__(
+        self,
+        index_name="ai41",
+        k=6,
+        index=None,
+        embeddings_model=None,
+        cache_size=1024,
+        workers=8,
+    ):
+        if embeddings_model is None:
+            # Imported here, as document_loaders builds its retrievers from this module.
+            from document_loaders import get_embeddings_model
+
+            embeddings_model = get_embeddings_model()
+        self.embeddings_model = embeddings_model
+        if index is None:
+            if use_local_backend():
+                index = get_local_index(index_name)
+            else:
+                index = Pinecone(api_key=os.getenv("PINECONE_API_KEY")).Index(index_name)
+        self.index = index
+        self.k = k
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        self._embeddings = OrderedDict()  # normalized query -> vector, oldest first
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="retriever")
+
+    def embed_queries(self, queries):
+        """Vectors for the queries, in order. Uncached ones are embedded in one call."""
+        keys = [normalize_text(query) for query in queries]
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self._embeddings:
+                    self._embeddings.move_to_end(key)
+                    found[key] = self._embeddings[key]
+                    self.hits += 1
+        missing = [key for key in dict.fromkeys(keys) if key not in found]
+        if missing:
+            vectors = self.embeddings_model.embed_documents(missing)
+            with self._lock:
+                self.misses += len(missing)
+                for key, vector in zip(missing, vectors):
+                    self._embeddings[key] = vector
+                    self._embeddings.move_to_end(key)
+                while len(self._embeddings) > self.cache_size:
+                    self._embeddings.popitem(last=False)
+            found.update(zip(missing, vectors))
+        return [found[key] for key in keys]
+
+    @staticmethod
+    def _match(vector_id, score, metadata):
+        metadata = dict(metadata or {})
+        return {"id": vector_id, "score": score, "text": metadata.pop(TEXT_KEY, None), "metadata": metadata}
+
+    def _query(self, vector, k, filter):
+        response = self.index.query(
+            vector=list(vector), top_k=k, filter=filter, include_metadata=True
+        )
+        return [self._match(match.id, match.score, match.metadata) for match in response.matches]
+
+    def search(self, query, k=None, filter=None):
+        """The k best matches for one query."""
+        vector = self.embed_queries([query])[0]
+        return self._query(vector, k or self.k, filter)
+
+    def search_many(self, queries, k=None, filter=None):
+        """The k best matches for each query, searched concurrently."""
+        vectors = self.embed_queries(queries)
+        if isinstance(self.index, LocalVectorIndex):
+            # One pass over the local matrix scores every query at once.
+            return [
+                [self._match(*match) for match in matches]
+                for matches in self.index.search(vectors, k or self.k, filter)
+            ]
+        futures = [
+            self._executor.submit(self._query, vector, k or self.k, filter) for vector in vectors
+        ]
+        return [future.result() for future in futures]
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "cached": len(self._embeddings)}
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
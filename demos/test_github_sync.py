@@ -0,0 +1,186 @@
+"""
+sync_github_repo against FakeGitHub, with a LocalVectorIndex standing in for
+Pinecone and deterministic fake embeddings.
+
+Run from demos/: python -m pytest -q test_github_sync.py
+"""
+
+import hashlib
+
+import pytest
+
+import document_loaders
+from document_loaders import CachedEmbeddings, LocalVectorStore, sync_github_repo
+from embedding_cache import EmbeddingCache
+from fake_services import FakeGitHub
+from github_loader import RepoManifest
+from local_index import LocalVectorIndex
+
+REPO = "owner/repo"
+DIMENSIONS = 8
+
+
+class FakeEmbeddings:
+    model = "fake-embedding"
+    dimensions = DIMENSIONS
+
+    def embed_documents(self, texts):
+        return [
+            [byte / 255 + 0.01 for byte in hashlib.sha256(text.encode("utf-8")).digest()[:DIMENSIONS]]
+            for text in texts
+        ]
+
+
+@pytest.fixture
+def github():
+    with FakeGitHub() as service:
+        yield service
+
+
+class FailingVectorStore(LocalVectorStore):
+    """Fails any upload batch with a chunk containing fail_text, while it is set."""
+
+    fail_text = None
+
+    def add_documents(self, documents, ids=None):
+        if self.fail_text and any(self.fail_text in doc.page_content for doc in documents):
+            raise ConnectionError("upload failed")
+        return super().add_documents(documents, ids)
+
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    index = LocalVectorIndex(str(tmp_path / "index"), DIMENSIONS)
+    monkeypatch.setattr(
+        document_loaders,
+        "get_embeddings_model",
+        lambda: CachedEmbeddings(FakeEmbeddings(), EmbeddingCache(str(tmp_path / "embeddings.db"))),
+    )
+    monkeypatch.setattr(
+        document_loaders,
+        "get_vector_store",
+        lambda index_name, embedding: FailingVectorStore(index, embedding),
+    )
+    monkeypatch.setattr(FailingVectorStore, "fail_text", None)
+    yield index
+    index.close()
+
+
+@pytest.fixture
+def sync(github, index, tmp_path):
+    manifest = RepoManifest(str(tmp_path / "manifest.json"))
+
+    def run():
+        owner, repo = REPO.split("/")
+        return sync_github_repo(owner, repo, api_url=github.url, manifest=manifest)
+
+    run.manifest = manifest
+    return run
+
+
+def stored(index):
+    """{chunk text: sources} for every vector in the index."""
+    return {
+        metadata["text"]: metadata["sources"]
+        for metadata in index.metadata_rows()
+        if metadata is not None
+    }
+
+
+def test_unchanged_commit_is_one_api_call(github, index, sync):
+    github.push(REPO, {"a.json": '{"a": 1}', "b.jsx": "<B />"})
+    first = sync()
+    assert first["new"] == ["a.json", "b.jsx"]
+    vectors = stored(index)
+
+    second = sync()
+    assert second["unchanged"] == 2
+    assert second["new"] == second["changed"] == second["removed"] == []
+    assert second["dedup"] == {"chunks": 2, "unique": 2, "dedup_ratio": 1.0}
+    assert github.stats == {"commits": 2, "tarballs": 1}
+    assert stored(index) == vectors
+
+
+def test_new_commit_without_code_changes_has_dedup(github, index, sync):
+    github.push(REPO, {"a.json": '{"a": 1}', "README.md": "one"})
+    sync()
+    github.push(REPO, {"a.json": '{"a": 1}', "README.md": "two"})
+
+    summary = sync()
+    assert summary["unchanged"] == 1
+    assert summary["dedup"]["unique"] == 1
+    assert sync.manifest.commit == summary["commit"]
+
+
+def test_changed_file_replaces_its_vectors(github, index, sync):
+    github.push(REPO, {"a.json": '{"a": 1}', "b.json": '{"b": 1}'})
+    sync()
+    github.push(REPO, {"a.json": '{"a": 2}', "b.json": '{"b": 1}'})
+
+    summary = sync()
+    assert summary["changed"] == ["a.json"]
+    assert summary["unchanged"] == 1
+    assert stored(index) == {'{"a": 2}': ["a.json#0"], '{"b": 1}': ["b.json#0"]}
+    assert sync.manifest.commit == summary["commit"]
+
+
+def test_removed_file_deletes_its_vectors(github, index, sync):
+    github.push(REPO, {"a.json": '{"a": 1}', "b.json": '{"b": 1}'})
+    sync()
+    github.push(REPO, {"b.json": '{"b": 1}'})
+
+    summary = sync()
+    assert summary["removed"] == ["a.json"]
+    assert stored(index) == {'{"b": 1}': ["b.json#0"]}
+    assert set(sync.manifest.files) == {"b.json"}
+
+
+def test_removing_one_copy_keeps_a_shared_chunk(github, index, sync):
+    github.push(REPO, {"a.json": '{"license": "MIT"}', "b.json": '{"license": "MIT"}'})
+    first = sync()
+    assert stored(index) == {'{"license": "MIT"}': ["a.json#0", "b.json#0"]}
+    assert first["dedup"] == {"chunks": 2, "unique": 1, "dedup_ratio": 2.0}
+    github.push(REPO, {"b.json": '{"license": "MIT"}'})
+
+    sync()
+    assert stored(index) == {'{"license": "MIT"}': ["b.json#0"]}
+
+
+def test_force_push_syncs_to_the_rewritten_history(github, index, sync):
+    base = github.push(REPO, {"a.json": '{"v": 1}'})
+    sync()
+    github.push(REPO, {"a.json": '{"v": 2}', "c.json": '{"c": 1}'})
+    sync()
+
+    # Rewrite history: the new head descends from base, not from the commit indexed last.
+    github.heads[REPO] = base
+    head = github.push(REPO, {"a.json": '{"v": 1}', "d.json": '{"d": 1}'})
+
+    summary = sync()
+    assert summary["commit"] == head
+    assert summary["changed"] == ["a.json"]
+    assert summary["new"] == ["d.json"]
+    assert summary["removed"] == ["c.json"]
+    assert stored(index) == {'{"v": 1}': ["a.json#0"], '{"d": 1}': ["d.json#0"]}
+    assert sync.manifest.commit == head
+
+
+def test_failed_file_leaves_no_vectors_behind(github, index, sync):
+    # Enough chunks for two upload batches; only the one holding the last line fails.
+    github.push(REPO, {"small.json": '{"s": 1}'})
+    sync()
+    lines = [f"{number:04d} " + "x" * 190 for number in range(150)] + ["FAIL"]
+    github.push(REPO, {"big.json": "\n".join(lines), "small.json": '{"s": 1}'})
+    FailingVectorStore.fail_text = "FAIL"
+
+    summary = sync()
+    assert summary["failed"] == ["big.json"]
+    assert stored(index) == {'{"s": 1}': ["small.json#0"]}
+    assert set(sync.manifest.files) == {"small.json"}
+
+    FailingVectorStore.fail_text = None
+    github.push(REPO, {"big.json": '{"big": 2}', "small.json": '{"s": 1}'})
+    summary = sync()
+    assert summary["failed"] == []
+    assert stored(index) == {'{"big": 2}': ["big.json#0"], '{"s": 1}': ["small.json#0"]}
+    assert sync.manifest.commit == summary["commit"]
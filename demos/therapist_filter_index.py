@@ -0,0 +1,317 @@
+"""
+Filter-first candidate sets for therapist search.
+
+match_therapists (supabase/migrations/..._enhance_focus_matching.sql) checks
+every filter, and the vector distance, against every therapist. Here the
+categorical attributes are indexed up front: for each value, a bitmap (a
+Python int, bit i for record i) of the records that have it. A query ANDs
+together one bitmap per filter, and only the records that survive are scored
+against the query vector, so a selective query scores a few hundred vectors
+instead of the whole corpus.
+
+The filters mean what they mean in match_therapists:
+    gender, availability, clinic_city, clinic_province   equal to the value
+    sexuality, ethnicity, faith                          any overlap with the list
+    areas_of_focus                                       any area matching any term,
+                                                         with the same fuzzy rules
+    max_price_initial                                    initial_price at most this
+    accepting_clients                                    is_accepting_clients equals this
+                                                         (missing counts as True)
+A filter left as None doesn't constrain anything.
+
+Records can be therapists-table rows, or the metadata upload_therapist stores
+with each profile (the extract_json schema), which record_from_metadata maps to
+the same fields: gender, location -> clinic_city/clinic_province, specialties
+-> areas_of_focus, available_online -> availability, fees -> initial_price.
+
+Records are positions in a list (None for a gap), so an index built with
+from_local_index lines up with the rows of a LocalVectorIndex, and refresh()
+picks up rows added, changed or deleted since. upload_therapist.search_therapists
+searches the therapist index this way.
+
+Usage:
+    filters = TherapistFilterIndex.from_local_index(index)
+    matches = match_therapists(index, filters, query_embedding, top_k=10,
+                               gender="female", faith=["muslim"], clinic_city="Vancouver")
+"""
+
+import bisect
+import re
+import threading
+
+import numpy as np
+
+EQUAL_FIELDS = ("gender", "availability", "clinic_city", "clinic_province")
+OVERLAP_FIELDS = ("sexuality", "ethnicity", "faith")
+FOCUS_FIELD = "areas_of_focus"
+PRICE_FIELD = "initial_price"
+ACCEPTING_FIELD = "is_accepting_clients"
+LIVE = None  # postings key for "has a record at all"
+
+
+def parse_price(value):
+    """150, 150.0 or "$150 CAD" -> 150.0; None if there is no number."""
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = re.search(r"\d+(?:\.\d+)?", str(value).replace(",", ""))
+    return float(match.group()) if match else None
+
+
+def fee_price(fees):
+    """The first dollar amount in a list of fee descriptions: ["Individual (50min): $165"] -> 165.0."""
+    for fee in _as_list(fees):
+        match = re.search(r"\$\s*(\d+(?:\.\d+)?)", str(fee).replace(",", ""))
+        if match:
+            return float(match.group(1))
+    return None
+
+
+def record_from_metadata(metadata):
+    """
+    The filter fields of a profile uploaded by upload_therapist, in
+    therapists-table terms. Fields that are already there (e.g. on a
+    therapists-table row) are kept as they are.
+    """
+    record = dict(metadata)
+    gender = record.get("gender")
+    if isinstance(gender, str):
+        gender = gender.strip().lower().replace("-", "_").replace(" ", "_")
+        record["gender"] = None if gender in ("", "none") else gender
+    location = metadata.get("location")
+    if "clinic_city" not in record and isinstance(location, str) and location.strip():
+        city, _, province = location.rpartition(",")
+        if not city:
+            city, province = province, ""
+        record["clinic_city"] = city.strip()
+        record["clinic_province"] = province.strip() or None
+    if "areas_of_focus" not in record and metadata.get("specialties"):
+        record["areas_of_focus"] = metadata["specialties"]
+    online = metadata.get("available_online")
+    if "availability" not in record and isinstance(online, bool):
+        # A profile with a clinic address sees clients there too.
+        in_person = bool(record.get("clinic_city"))
+        record["availability"] = ("both" if in_person else "online") if online else "in_person"
+    if PRICE_FIELD not in record and metadata.get("fees"):
+        record[PRICE_FIELD] = fee_price(metadata["fees"])
+    return record
+
+
+def focus_matches(area, term):
+    """Whether a therapist's focus area matches a searched term, as in match_therapists."""
+    area_lower, term_lower = area.lower(), term.lower()
+    if term_lower in area_lower or area in (term, term.title()):
+        return True
+    if re.search(r"(^|\s)" + re.escape(term) + r"($|\s|\W)", area, re.IGNORECASE):
+        return True
+    if term_lower == "lgbtq" and re.search(r"lgbtq[a-z0-9+]*|two.?spirit", area_lower):
+        return True
+    if term_lower == "non-binary" and (
+        re.search(r"non.?binary|gender.?non.?conforming", area_lower) or area_lower in ("nb", "gnc")
+    ):
+        return True
+    return term_lower in ("lgbtq", "qtbipoc") and "qtbipoc" in area_lower
+
+
+def _as_list(value):
+    if value is None:
+        return []
+    return list(value) if isinstance(value, (list, tuple, set)) else [value]
+
+
+def bitmap_of(positions, size):
+    """Bitmap with the given positions set."""
+    bits = np.zeros(size, dtype=np.uint8)
+    bits[positions] = 1
+    return int.from_bytes(np.packbits(bits, bitorder="little").tobytes(), "little")
+
+
+def bitmap_rows(bitmap, size):
+    """The set bits of a bitmap, as a sorted int64 array of positions below size."""
+    if not bitmap:
+        return np.zeros(0, dtype=np.int64)
+    raw = np.frombuffer(bitmap.to_bytes((size + 7) // 8, "little"), dtype=np.uint8)
+    return np.flatnonzero(np.unpackbits(raw, bitorder="little")[:size]).astype(np.int64)
+
+
+class TherapistFilterIndex:
+    def __init__(self, records=()):
+        self.records = []  # position -> the record indexed there, or None
+        self.postings = {}  # field -> {value: bitmap}
+        self.live = 0  # bitmap of positions holding a record
+        self.not_accepting = 0
+        self._prices = []  # sorted distinct initial prices, the keys of postings[PRICE_FIELD]
+        self._focus_terms = {}  # lowercased term -> focus areas it matches
+        self._lock = threading.Lock()
+        self._load(list(records))
+
+    def _load(self, records):
+        # Collect positions per value first and pack each bitmap once; setting
+        # bits one at a time copies a whole big int per bit.
+        positions = {}
+        for position, record in enumerate(records):
+            if record is None:
+                continue
+            for field, value in self._keys(record):
+                positions.setdefault(field, {}).setdefault(value, []).append(position)
+        self.records = list(records)
+        for field, values in positions.items():
+            bitmaps = {value: bitmap_of(found, len(records)) for value, found in values.items()}
+            if field == LIVE:
+                self.live = bitmaps[True]
+            elif field == ACCEPTING_FIELD:
+                self.not_accepting = bitmaps[False]
+            else:
+                self.postings[field] = bitmaps
+        self._prices = sorted(self.postings.get(PRICE_FIELD, {}))
+
+    @staticmethod
+    def _keys(record):
+        """(field, value) for every posting list a record belongs in."""
+        record = record_from_metadata(record)
+        yield LIVE, True
+        for field in EQUAL_FIELDS + OVERLAP_FIELDS + (FOCUS_FIELD,):
+            for value in dict.fromkeys(_as_list(record.get(field))):
+                yield field, value
+        if record.get(ACCEPTING_FIELD) is False:
+            yield ACCEPTING_FIELD, False
+        price = parse_price(record.get(PRICE_FIELD))
+        if price is not None:
+            yield PRICE_FIELD, price
+
+    @classmethod
+    def from_local_index(cls, index):
+        """One position per LocalVectorIndex row, from the rows' metadata."""
+        return cls(index.metadata_rows())
+
+    def __len__(self):
+        return self.live.bit_count()
+
+    def add(self, position, record):
+        """Index a record at a position, replacing whatever was there."""
+        with self._lock:
+            self._remove(position)
+            while len(self.records) <= position:
+                self.records.append(None)
+            self.records[position] = record
+            self._update(record, 1 << position, add=True)
+
+    def remove(self, position):
+        with self._lock:
+            self._remove(position)
+
+    def _remove(self, position):
+        # Caller holds self._lock.
+        if position >= len(self.records) or self.records[position] is None:
+            return
+        record = self.records[position]
+        self.records[position] = None
+        self._update(record, 1 << position, add=False)
+
+    def _update(self, record, bit, add):
+        # Caller holds self._lock.
+        for field, value in self._keys(record):
+            if field == LIVE:
+                self.live = self.live | bit if add else self.live & ~bit
+            elif field == ACCEPTING_FIELD:
+                self.not_accepting = self.not_accepting | bit if add else self.not_accepting & ~bit
+            else:
+                postings = self.postings.setdefault(field, {})
+                if value not in postings:
+                    if field == FOCUS_FIELD:
+                        self._focus_terms.clear()
+                    if field == PRICE_FIELD:
+                        bisect.insort(self._prices, value)
+                    postings[value] = 0
+                postings[value] = postings[value] | bit if add else postings[value] & ~bit
+
+    def refresh(self, index):
+        """Catch up with a LocalVectorIndex after upserts and deletes."""
+        for position, record in enumerate(index.metadata_rows()):
+            known = self.records[position] if position < len(self.records) else None
+            if record is known:
+                continue
+            if record is None:
+                self.remove(position)
+            else:
+                self.add(position, record)
+
+    def _focus_areas(self, term):
+        # Caller holds self._lock. Match the term against each distinct area once.
+        key = term.lower()
+        if key not in self._focus_terms:
+            self._focus_terms[key] = [
+                area for area in self.postings.get(FOCUS_FIELD, {}) if focus_matches(area, term)
+            ]
+        return self._focus_terms[key]
+
+    def candidates(
+        self,
+        gender=None,
+        sexuality=None,
+        ethnicity=None,
+        faith=None,
+        availability=None,
+        areas_of_focus=None,
+        clinic_city=None,
+        clinic_province=None,
+        max_price_initial=None,
+        accepting_clients=None,
+    ):
+        """Bitmap of the records that pass every given filter."""
+        equal = {
+            "gender": gender,
+            "availability": availability,
+            "clinic_city": clinic_city,
+            "clinic_province": clinic_province,
+        }
+        overlap = {"sexuality": sexuality, "ethnicity": ethnicity, "faith": faith}
+        with self._lock:
+            bitmap = self.live
+            for field, value in equal.items():
+                if value is not None and bitmap:
+                    bitmap &= self.postings.get(field, {}).get(value, 0)
+            for field, values in overlap.items():
+                if values is not None and bitmap:
+                    postings = self.postings.get(field, {})
+                    union = 0
+                    for value in _as_list(values):
+                        union |= postings.get(value, 0)
+                    bitmap &= union
+            if areas_of_focus is not None and bitmap:
+                postings = self.postings.get(FOCUS_FIELD, {})
+                union = 0
+                for term in _as_list(areas_of_focus):
+                    for area in self._focus_areas(term):
+                        union |= postings[area]
+                bitmap &= union
+            if max_price_initial is not None and bitmap:
+                postings = self.postings.get(PRICE_FIELD, {})
+                union = 0
+                for price in self._prices[: bisect.bisect_right(self._prices, float(max_price_initial))]:
+                    union |= postings[price]
+                bitmap &= union
+            if accepting_clients is not None and bitmap:
+                bitmap &= ~self.not_accepting if accepting_clients else self.not_accepting
+            size = len(self.records)
+        return bitmap & ((1 << size) - 1)
+
+    def candidate_rows(self, **filters):
+        """candidates() as a sorted array of positions."""
+        return bitmap_rows(self.candidates(**filters), len(self.records))
+
+
+def match_therapists(index, filters, query_embedding, top_k=10, match_threshold=None, **criteria):
+    """
+    The best top_k therapists in a LocalVectorIndex for a query, scoring only
+    the rows that pass the criteria (see TherapistFilterIndex.candidates).
+    Returns [(vector ID, similarity, metadata)], best first.
+    """
+    rows = filters.candidate_rows(**criteria)
+    if not len(rows):
+        return []
+    matches = index.search([query_embedding], top_k, rows=rows)[0]
+    if match_threshold is not None:
+        matches = [match for match in matches if match[1] > match_threshold]
+    return matches
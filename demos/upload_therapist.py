@@ -1,59 +1,214 @@
-gimport os
+import os
 from dotenv import load_dotenv
 from openai import OpenAI
 from pinecone.grpc import PineconeGRPC as Pinecone
 from pinecone import ServerlessSpec
 import json
-import uuid
+import argparse
+import functools
+import subprocess
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 # from langchain_community.document_loaders import AsyncChromiumLoader
 # from langchain_community.document_transformers import BeautifulSoupTransformer
-import requests
-from bs4 import BeautifulSoup
 import time
-import requests
-from requests.adapters import HTTPAdapter
-from requests.packages.urllib3.util.retry import Retry
-
-load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-
-def generate_uuid():
-    return str(uuid.uuid4())
 
+from embedding_cache import EmbeddingCache
+from http_fetch import Fetcher
+from ingest_journal import IngestJournal, journaled, journaled_batch
+from local_index import LocalVectorIndex, get_local_index, use_local_backend
+from link_source import open_links, parse_shard, parse_since, select_links
+from openai_limiter import BULK, get_controller
+from page_model import build_page
+from page_reducer import reduce_page
+from llm_cache import LLMCache
+from llm_graph import LLMStage, run_graph
+from performance import create_performance_tracker
+from pinecone_writer import UpsertWriter, valid_metadata_size
+from profile_photo import best_profile_photo
+from therapist_filter_index import TherapistFilterIndex, match_therapists
+from page_state import PageStateStore, content_hash
+from pipeline import FinishItem, Pipeline, Stage, SkipItem
+from vector_manifest import FETCH_BATCH_SIZE, VectorManifest, therapist_id
 
-def get_embedding(text, model="text-embedding-3-small"):
+load_dotenv()
+# 429s, server errors and connection errors are retried by the shared
+# rate-limit controllers, not inside the SDK.
+client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0)
+embedding_cache = EmbeddingCache()
+page_state = PageStateStore()
+llm_cache = LLMCache(mode=os.getenv("LLM_CACHE_MODE", "on"))
+fetcher = Fetcher(offline=os.getenv("FETCH_OFFLINE") == "1")
+journal = IngestJournal()
+
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# OpenAI embeddings limits: inputs per request, tokens per input, tokens per request.
+EMBEDDING_MAX_INPUTS = 2048
+EMBEDDING_MAX_INPUT_TOKENS = 8191
+EMBEDDING_MAX_REQUEST_TOKENS = 300000
+
+
+@functools.lru_cache(maxsize=1)
+def _encoding():
+    """
+    tiktoken's cl100k_base, or None without it. tiktoken downloads the
+    encoding on first use, so offline that fails too and the estimate is used.
+    """
+    if not tiktoken:
+        return None
     try:
-        text = text.replace("\n", " ")
-        embedding = (
-            client.embeddings.create(input=[text], model=model).data[0].embedding
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        print(f"tiktoken unavailable, estimating tokens: {e}")
+        return None
+
+
+def count_tokens(text):
+    """Token count with tiktoken, or a ~4 chars per token estimate without it."""
+    encoding = _encoding()
+    if encoding:
+        return len(encoding.encode(text))
+    return len(text) // 4 + 1
+
+
+def _truncate_to_tokens(text, max_tokens):
+    encoding = _encoding()
+    if encoding:
+        return encoding.decode(encoding.encode(text)[:max_tokens])
+    return text[: max_tokens * 4]
+
+
+def _embedding_batches(texts):
+    """Group texts into batches of (position, text) that fit the request limits."""
+    batch = []
+    batch_tokens = 0
+    for position, text in enumerate(texts):
+        tokens = count_tokens(text)
+        if tokens > EMBEDDING_MAX_INPUT_TOKENS:
+            print(f"Input {position} has {tokens} tokens, truncating to {EMBEDDING_MAX_INPUT_TOKENS}.")
+            text = _truncate_to_tokens(text, EMBEDDING_MAX_INPUT_TOKENS)
+            tokens = EMBEDDING_MAX_INPUT_TOKENS
+        if batch and (
+            len(batch) >= EMBEDDING_MAX_INPUTS
+            or batch_tokens + tokens > EMBEDDING_MAX_REQUEST_TOKENS
+        ):
+            yield batch
+            batch = []
+            batch_tokens = 0
+        batch.append((position, text))
+        batch_tokens += tokens
+    if batch:
+        yield batch
+
+
+def _embed_batch(batch, model, dimensions=None):
+    """Embed one batch. If the API rejects it as too large, split it in half and retry."""
+    options = {"dimensions": dimensions} if dimensions else {}
+    inputs = [text for _, text in batch]
+    try:
+        response = get_controller(model).call(
+            lambda: client.embeddings.with_raw_response.create(
+                input=inputs, model=model, **options
+            ),
+            estimated_tokens=sum(count_tokens(text) for text in inputs),
+        ).parse()
+    except Exception as e:
+        if len(batch) > 1 and "maximum" in str(e).lower():
+            middle = len(batch) // 2
+            print(f"Embedding batch of {len(batch)} too large, splitting.")
+            return _embed_batch(batch[:middle], model, dimensions) + _embed_batch(
+                batch[middle:], model, dimensions
+            )
+        raise
+    # The API returns one item per input, tagged with the input's index.
+    vectors = sorted(response.data, key=lambda item: item.index)
+    return [(position, item.embedding) for (position, _), item in zip(batch, vectors)]
+
+
+def get_embeddings(texts, model="text-embedding-3-small", dimensions=None):
+    """
+    Embed many texts in as few requests as the API limits allow.
+
+    Vectors already in embedding_cache are not requested again.
+    Returns the vectors in the same order as texts.
+    """
+    texts = [text.replace("\n", " ") for text in texts]
+    embeddings = embedding_cache.get_many(model, dimensions, texts)
+    missing = [position for position, embedding in enumerate(embeddings) if embedding is None]
+    if not missing:
+        print(f"Embedding success. {len(texts)} texts from cache.")
+        return embeddings
+
+    missing_texts = [texts[position] for position in missing]
+    try:
+        new_embeddings = [None] * len(missing_texts)
+        batches = 0
+        for batch in _embedding_batches(missing_texts):
+            for position, embedding in _embed_batch(batch, model, dimensions):
+                new_embeddings[position] = embedding
+            batches += 1
+        print(
+            f"Embedding success. {len(missing_texts)} of {len(texts)} texts in {batches} batches."
         )
-        print(f"Embedding success.")
-        return embedding
     except Exception as e:
         raise Exception(f"Embedding Error: {e}")
 
+    embedding_cache.put_many(model, dimensions, missing_texts, new_embeddings)
+    for position, embedding in zip(missing, new_embeddings):
+        embeddings[position] = embedding
+    return embeddings
 
-def valid_metadata_size(metadata):
-    """Check under 40KB limit"""
-    metadata_json = json.dumps(metadata)
-    size = len(metadata_json.encode("utf-8"))
 
-    # Check if it exceeds Pinecone's limit
-    if size < 40960:  # 40KB in bytes
-        print(f"Metadata is under Pinecone's 40KB limit. {size}")
-        return True
-    else:
-        print("Metadata is above Pinecone's 40KB limit.")
-        return False
+def get_embedding(text, model="text-embedding-3-small", dimensions=None):
+    return get_embeddings([text], model=model, dimensions=dimensions)[0]
+
+
+@functools.lru_cache(maxsize=1)
+def get_index():
+    """
+    One gRPC client and index connection, shared by every call in the process.
+    With VECTOR_BACKEND=local, the in-process LocalVectorIndex instead.
+    """
+    if use_local_backend():
+        return get_local_index(os.getenv("PINECONE_INDEX") or "therapists")
+    pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
+    return pc.Index(os.getenv("PINECONE_INDEX"))
+
+
+@functools.lru_cache(maxsize=1)
+def get_filter_index():
+    """Bitmap filters over the local therapist index, built once per process."""
+    return TherapistFilterIndex.from_local_index(get_index())
+
+
+def search_therapists(query, top_k=10, match_threshold=None, **criteria):
+    """
+    The therapists best matching a free-text query, filtered like the
+    match_therapists SQL function (see TherapistFilterIndex.candidates for the
+    criteria). Only the profiles that pass the filters are scored.
+    Returns [(vector ID, similarity, metadata)], best first.
+    """
+    index = get_index()
+    if not isinstance(index, LocalVectorIndex):
+        raise ValueError("search_therapists runs on the local index; set VECTOR_BACKEND=local")
+    filters = get_filter_index()
+    filters.refresh(index)
+    return match_therapists(
+        index, filters, get_embedding(query), top_k, match_threshold, **criteria
+    )
 
 
 def upload_therapist(embedding, metadata):
     """Uses the OpenAI Embeddings model to upload a list of documents to a Pinecone index."""
 
-    pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
-    index = pc.Index(os.getenv("PINECONE_INDEX"))
+    index = get_index()
 
     if not valid_metadata_size(metadata):
         return
@@ -61,7 +216,11 @@ def upload_therapist(embedding, metadata):
     try:
         upsert_response = index.upsert(
             vectors=[
-                {"id": generate_uuid(), "values": embedding, "metadata": metadata},
+                {
+                    "id": therapist_id(metadata["bio_link"]),
+                    "values": embedding,
+                    "metadata": metadata,
+                },
             ],
         )
         print(f"upsert response: {upsert_response}")
@@ -140,11 +299,35 @@ def main():
     upload_therapist(embedding, metadata)
 
 
+# Rough allowance for the completion when estimating a chat call's tokens.
+COMPLETION_TOKENS_ESTIMATE = 1000
+
+
+def chat_completion(priority=BULK, **request):
+    """
+    Chat completion content, served from llm_cache when the same request was
+    made before. API calls go through the model's rate-limit controller.
+    """
+
+    def call():
+        estimated_tokens = COMPLETION_TOKENS_ESTIMATE + sum(
+            count_tokens(message["content"]) for message in request["messages"]
+        )
+        raw = get_controller(request["model"]).call(
+            lambda: client.chat.completions.with_raw_response.create(**request),
+            estimated_tokens=estimated_tokens,
+            priority=priority,
+        )
+        return raw.parse().choices[0].message.content
+
+    return llm_cache.get_or_call(request, call)
+
+
 def extract_json(website_contents):
     """Use LLM to parse to a JSON schema."""
     try:
 
-        response = client.chat.completions.create(
+        content = chat_completion(
             model="gpt-4o",
             temperature=0,
             response_format={"type": "json_object"},
@@ -187,15 +370,15 @@ def extract_json(website_contents):
                 {"role": "user", "content": f"""Website {website_contents}"""},
             ],
         )
-        # print(f"OpenAI: {response}")
+        # print(f"OpenAI: {content}")
     except Exception as e:
         print(f"An error occurred extracting the bio: {e}")
         raise
 
-    return response.choices[0].message.content
+    return content
 
 
-def extract_profile_pic(raw_html: list, name: str):
+def extract_profile_pic(raw_html: list, name: str, model="gpt-3.5-turbo"):
     """Use LLM to find the link to their profile picture"""
     print(f" Raw HTML : {raw_html} {type(raw_html)} {raw_html[0]}")
     if len(raw_html) == 0:
@@ -213,8 +396,8 @@ def extract_profile_pic(raw_html: list, name: str):
         return {"profile_link": src}
 
     try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
+        content = chat_completion(
+            model=model,
             response_format={"type": "json_object"},
             temperature=0,
             messages=[
@@ -239,13 +422,13 @@ def extract_profile_pic(raw_html: list, name: str):
                 },
             ],
         )
-        # print(f"OpenAI: {response}")
+        # print(f"OpenAI: {content}")
     except Exception as e:
         print(f"An error occurred extracting the bio: {e}")
         raise
 
     try:
-        response_json = json.loads(response.choices[0].message.content)
+        response_json = json.loads(content)
         return response_json
     except Exception as e:
         print("Erorr extracting json")
@@ -266,90 +449,48 @@ def extract_profile_pic(raw_html: list, name: str):
 #     return docs_transformed
 
 
-def fetch_raw_html(url, timeout=10):
-    """Returns HTML from a web url."""
-    session = requests.Session()
-    retry = Retry(total=5, backoff_factor=0.3, status_forcelist=[500, 502, 503, 504])
-    adapter = HTTPAdapter(max_retries=retry)
-    session.mount("http://", adapter)
-    session.mount("https://", adapter)
-
-    try:
-        response = session.get(url, timeout=timeout)
-        response.raise_for_status()  # Raises an HTTPError if the response code was unsuccessful
-    except requests.exceptions.RequestException as e:
-        raise Exception(f"Failed to load page {url}") from e
-
-    return response.text
-
-
-def extract_img_tags(html_content):
-    """Extract all 'img' tags from the ®aw HTML."""
-    try:
-        soup = BeautifulSoup(html_content, "html.parser")
-        img_tags = soup.find_all("img")
-        print(f"All Image Tags: {img_tags}")
-        if not img_tags:
-            raise ValueError("no image tags")
-    except Exception as e:
-        print(f"error extracting img tags {e}")
-    return img_tags
-
-
 def extract_img_info(img_tags, keyword):
-    """Filter the image tags to find the profile picture"""
-    img_info = []
-    keyword_lower = keyword.lower()
-    if " " in keyword_lower:
-        first_name, last_name = keyword_lower.split()
-    else:
-        first_name = keyword_lower
-        last_name = ""
-
+    """
+    Filter the image tags to find the profile picture.
+
+    Drops logos and data: placeholders. Images with the therapist's name in
+    them come back on their own; if none do, every remaining image does.
+    """
+    name_parts = keyword.lower().split()
+    first_name = name_parts[0] if name_parts else ""
+    last_name = name_parts[-1] if len(name_parts) > 1 else ""
+    names = [name for name in (first_name, last_name) if name]
+
+    matching = []
+    others = []
     for img in img_tags:
-        img_src = img.get("src", "").lower()
-        img_data_src = img.get("data-src", "").lower()
-        img_data_breeze = img.get("data-breeze", "").lower()
-        img_alt = img.get("alt", "").lower()
-        img_title = img.get("title", "").lower()
-
-        if (
-            first_name in img_src
-            or last_name in img_src
-            or first_name in img_data_src
-            or last_name in img_data_src
-            or first_name in img_data_breeze
-            or last_name in img_data_breeze
-            or first_name in img_alt
-            or last_name in img_alt
-            or first_name in img_title
-            or last_name in img_title
-            and not img_src.startswith("data:image/")
-            and "logo" not in img_src
-            and "logo" not in img_data_breeze
-            and "logo" not in img_data_src
-        ):
-            img_info.append(
-                {
-                    "src": img.get("src"),
-                    "data-src": img.get("data-src"),
-                    "data-breeze": img.get("data-breeze"),
-                    "alt": img.get("alt"),
-                    "title": img.get("title"),
-                }
-            )
-        # all other scenarios
+        img_src = (img.get("src") or "").lower()
+        img_data_src = (img.get("data-src") or "").lower()
+        img_data_breeze = (img.get("data-breeze") or "").lower()
+        img_alt = (img.get("alt") or "").lower()
+        img_title = (img.get("title") or "").lower()
+
+        placeholder = img_src.startswith("data:image/") and not (
+            img_data_src or img_data_breeze
+        )
+        logo = "logo" in img_src or "logo" in img_data_src or "logo" in img_data_breeze
+        if placeholder or logo:
+            continue
+
+        info = {
+            "src": img.get("src"),
+            "data-src": img.get("data-src"),
+            "data-breeze": img.get("data-breeze"),
+            "alt": img.get("alt"),
+            "title": img.get("title"),
+        }
+        fields = (img_src, img_data_src, img_data_breeze, img_alt, img_title)
+        if any(name in field for name in names for field in fields):
+            matching.append(info)
         else:
-            img_info.append(
-                {
-                    "src": img.get("src"),
-                    "data-src": img.get("data-src"),
-                    "data-breeze": img.get("data-breeze"),
-                    "alt": img.get("alt"),
-                    "title": img.get("title"),
-                }
-            )
+            others.append(info)
 
+    img_info = matching or others
     print(f"BS Image Info: {img_info} {type(img_info)}")
     return img_info
 
@@ -357,7 +498,7 @@ def extract_img_info(img_tags, keyword):
 def ai_long_summary(profile, model):
     """Summarize the profile."""
     try:
-        response = client.chat.completions.create(
+        content = chat_completion(
             model=model,
             temperature=0,
             messages=[
@@ -370,18 +511,18 @@ def ai_long_summary(profile, model):
                 {"role": "user", "content": f"""Website """},
             ],
         )
-        # print(f"OpenAI: {response}")
+        # print(f"OpenAI: {content}")
     except Exception as e:
         print(f"OpenAI: An error occurred summarizing the profile: {e}")
         raise
 
-    return response.choices[0].message.content
+    return content
 
 
 def ai_short_summary(long_summary, model="gpt-4o") -> str:
     """Write a two sentence summary of the therapist"""
     try:
-        response = client.chat.completions.create(
+        content = chat_completion(
             model=model,
             temperature=0,
             messages=[
@@ -402,335 +543,683 @@ def ai_short_summary(long_summary, model="gpt-4o") -> str:
                 {"role": "user", "content": f"""Website """},
             ],
         )
-        # print(f"OpenAI: {response}")
+        # print(f"OpenAI: {content}")
     except Exception as e:
         print(f"OpenAI: An error occurred summarizing the profile: {e}")
         raise
 
-    return response.choices[0].message.content
-
+    return content
+
+
+# Worker threads per stage. Scraping and the OpenAI calls are network bound,
+# so they get the most workers; Pinecone upserts are cheap.
+STAGE_WORKERS = {
+    "check_exists": 1,
+    "fetch": 8,
+    "parse": 2,
+    "extract": 4,
+    "llm": 4,
+    "embed": 1,
+    "upload": 1,
+}
+
+# Most of the page text sent to extract_json, after dropping boilerplate and
+# other team members' teasers.
+EXTRACT_TOKEN_BUDGET = int(os.getenv("EXTRACT_TOKEN_BUDGET", "3000"))
+
+# Below this confidence the deterministic photo ranking defers to the LLM.
+PHOTO_CONFIDENCE_THRESHOLD = 0.5
+
+# Processes for HTML parsing, so it doesn't hold the GIL the fetch and OpenAI
+# threads need. 0 parses inline on the parse stage threads.
+PARSE_PROCESSES = int(os.getenv("PARSE_PROCESSES", "2"))
+
+# Summaries are embedded together, up to this many per request. The embed
+# stage waits this many seconds for a batch to fill before sending it.
+EMBED_BATCH_SIZE = 256
+EMBED_BATCH_WAIT = 5.0
+PERF_DIR = os.getenv(
+    "PERF_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "perf"),
+)
+# Job fields each stage leaves behind, journaled so a resumed run can restore
+# them instead of re-running the stage. fetch and parse produce pages, which
+# aren't journaled; they re-run only for links that still need the page.
+JOURNAL_KEYS = {
+    "extract": ("therapist_json_string", "therapist_json", "stage_outputs"),
+    "llm": ("text_hash", "therapist_json", "stage_outputs", "errors"),
+    "embed": ("embedding",),
+}
+
+
+def stage_check_exists(jobs, manifest, seen, refresh=False):
+    """
+    Check a batch of links against the manifest and the index in one go.
+    Repeated links within the same run are skipped too. With refresh, links
+    already in the index go through again so changed pages get updated.
+    """
+    if refresh:
+        existing = set()
+    else:
+        existing = manifest.existing_links([job["link"] for job in jobs], get_index())
+    outputs = []
+    for job in jobs:
+        vector_id = therapist_id(job["link"])
+        if job["link"] in existing:
+            outputs.append(SkipItem("already exists in piencone"))
+        elif vector_id in seen:
+            outputs.append(SkipItem("duplicate link in this run"))
+        else:
+            seen.add(vector_id)
+            outputs.append(job)
+    return outputs
+
+
+def stage_fetch(job):
+    job["html"] = fetcher.fetch(job["link"]).text
+    return job
+
+
+def stage_parse(job):
+    """Parse the page once; every later stage reads from job["page"]."""
+    job["page"] = build_page(job["link"], job.pop("html"), PARSE_PROCESSES)
+    if not job["page"].text:
+        print("could not scrape website")
+        raise SkipItem("could not scrape website")
+    job["page_content"] = job["page"].text
+    job["text_hash"] = content_hash(job["page_content"])
+    job["stage_outputs"] = {}
+
+    # The whole profile was already uploaded from this exact page text.
+    if page_state.get(job["link"], "page", job["text_hash"]) is not None:
+        print(f"Unchanged page, nothing to do: {job['link']}")
+        job["unchanged"] = True
+        raise FinishItem()
+    return job
+
+
+def stage_extract(job):
+    link = job["link"]
+    cached = page_state.get(link, "extract", job["text_hash"])
+    if cached is not None:
+        job["therapist_json_string"] = cached
+    else:
+        reduced, job["reduce_stats"] = reduce_page(
+            job["page"], link, token_budget=EXTRACT_TOKEN_BUDGET, count_tokens=count_tokens
+        )
+        print(
+            f"Reduced page {job['reduce_stats']['tokens_before']} -> {job['reduce_stats']['tokens_after']} tokens: {link}"
+        )
+        job["therapist_json_string"] = extract_json(reduced)
+        job["stage_outputs"]["extract"] = (job["text_hash"], job["therapist_json_string"])
 
-def check_therapist_exists(bio_link):
     try:
-        pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
-        index = pc.Index(os.getenv("PINECONE_INDEX"))
-        search_embedding = get_embedding("hello world")
-
-        response = index.query(
-            vector=search_embedding,
-            filter={"bio_link": {"$eq": bio_link}},
-            top_k=3,
-            include_values=False,
-            include_metadata=True,
-        )
-        print(f"therapist_similarity_search response: {response.get('matches')}")
-        if len(response.get("matches")):
-            return True
-        else:
-            return False
+        therapist_json = json.loads(job["therapist_json_string"])
     except Exception as e:
-        error = f"Error in similarity search: {e} {type(bio_link)} {bio_link} "
-        print(error)
-        raise Exception(error)
-
-
-def upload_therapist_directory(links: list[str]):
-    errors = []
-    for link in links:
-        # Check if hte therapist is already in the director:
-        if check_therapist_exists(bio_link=link):
-            error = "already exists in piencone"
-            errors.append({"error": error, "link": link})
-            continue
-
-        website = bs([link])
-        print(website)
-        if not website[0].page_content:
-            error = "could not scrape website"
-            print(error)
-            errors.append({"error": error, "link": link})
-            continue
-
-        therapist_json_string = extract_json(website[0].page_content)
-
-        try:
-            therapist_json = json.loads(therapist_json_string)
-            if therapist_json["name"] == "John Smith":
-                errors.append({"error": "John Smith Error", "link": link})
-                continue
-            therapist_json["bio_link"] = link
-            print(f"JSON: {therapist_json}")
-        except Exception as e:
-            error_message = f"Error loading JSON for link {link}: {str(e)}"
-            print(error_message)
-            errors.append({"error": error_message, "link": link})
-            continue
+        error_message = f"Error loading JSON for link {link}: {str(e)}"
+        print(error_message)
+        raise SkipItem(error_message)
+
+    if therapist_json.get("name") == "John Smith":
+        raise SkipItem("John Smith Error")
+    therapist_json["bio_link"] = link
+    print(f"JSON: {therapist_json}")
+    job["therapist_json"] = therapist_json
+    return job
+
+
+def llm_profile_pic(job, inputs, model):
+    """Find the profile photo; only asks the LLM when the page ranking is unsure."""
+    link = job["link"]
+    name = job["therapist_json"].get("name")
+    img_tags = job["page"].images
+    if not img_tags:
+        raise ValueError("no image tags")
+
+    profile_link, confidence = best_profile_photo(img_tags, name, job["page"].blocks)
+    if confidence < PHOTO_CONFIDENCE_THRESHOLD:
+        # Too close to call from the page alone; ask the LLM.
+        print(f"Photo confidence {confidence} for {link}, asking the LLM.")
+        img_info = extract_img_info(img_tags, keyword=name)
+        images_hash = content_hash([img_info, name])
+        profile_link = page_state.get(link, "profile_pic", images_hash)
+        if profile_link is None:
+            profile_link = extract_profile_pic(img_info, name, model=model).get(
+                "profile_link"
+            )
+        job["stage_outputs"]["profile_pic"] = (images_hash, profile_link)
 
-        try:
-            html = fetch_raw_html(link)
-            img_tags = extract_img_tags(html)
-            img_info = extract_img_info(img_tags, keyword=therapist_json.get("name"))
-            img_json = extract_profile_pic(img_info, therapist_json.get("name"))
-            therapist_json["profile_link"] = img_json.get("profile_link")
-            print(f"Img Link: {therapist_json.get('profile_link')}")
-            if not therapist_json.get("profile_link").startswith("https://"):
-                error_message = f"Profile link does not start with https for link {link} {therapist_json.get('profile_link')}"
-                errors.append(
-                    {
-                        "error": error_message,
-                        "link": link,
-                    }
-                )
-                raise ValueError("Profile link could not be verified")
-        except Exception as e:
-            error_message = f"Error extracting image link for link {link}: {str(e)}"
+    print(f"Img Link: {profile_link}")
+    if not profile_link or not profile_link.startswith("https://"):
+        job["stage_outputs"].pop("profile_pic", None)
+        raise ValueError(
+            f"Profile link does not start with https for link {link} {profile_link}"
+        )
+    return profile_link
+
+
+def llm_long_summary(job, inputs, model):
+    """Summarize the extracted profile. Only depends on the extracted JSON."""
+    json_hash = content_hash(job["therapist_json_string"])
+    summary = page_state.get(job["link"], "long_summary", json_hash)
+    if summary is None:
+        summary = ai_long_summary(job["therapist_json_string"], model)
+        job["stage_outputs"]["long_summary"] = (json_hash, summary)
+    print(f"AI Long Summary: {summary[0:50]}")
+    return summary
+
+
+def llm_short_summary(job, inputs, model):
+    """Two sentences, written from the long summary rather than the whole profile."""
+    long_summary = inputs["long_summary"]
+    summary_hash = content_hash(long_summary)
+    short_summary = page_state.get(job["link"], "short_summary", summary_hash)
+    if short_summary is None:
+        short_summary = ai_short_summary(long_summary, model)
+        job["stage_outputs"]["short_summary"] = (summary_hash, short_summary)
+    print(f"AI Short Summary: {short_summary[0:50]}")
+    return short_summary
+
+
+# LLM calls made for each profile once its JSON is extracted. Stages without a
+# dependency between them run at the same time.
+PROFILE_LLM_GRAPH = [
+    LLMStage("profile_pic", llm_profile_pic, model="gpt-3.5-turbo"),
+    LLMStage("long_summary", llm_long_summary, model="gpt-4o"),
+    LLMStage(
+        "short_summary",
+        llm_short_summary,
+        needs=("long_summary",),
+        model="gpt-4o-mini",
+    ),
+]
+
+# What each LLM stage fills in on the record, and how its failures are reported.
+LLM_GRAPH_FIELDS = {
+    "profile_pic": ("profile_link", "Error extracting image link", "None"),
+    "long_summary": ("summary", "Error generating AI long summary", None),
+    "short_summary": ("short_summary", "Error generating AI short summary", None),
+}
+
+
+def stage_llm(job, executor, graph=PROFILE_LLM_GRAPH):
+    """
+    Run the profile's LLM graph and copy the results onto the record. Raises
+    if there is no long summary: it's what gets embedded, so the stage must
+    not be journaled done without it, or a retry would skip straight to a
+    failing embed.
+    """
+    link = job["link"]
+    therapist_json = job["therapist_json"]
+    outputs, errors = run_graph(graph, job, executor)
+    for name, (field, error_prefix, fallback) in LLM_GRAPH_FIELDS.items():
+        if name in outputs:
+            therapist_json[field] = outputs[name]
+        else:
+            error_message = f"{error_prefix} for link {link}: {str(errors[name])}"
             print(error_message)
-            therapist_json["profile_link"] = "None"
-            errors.append({"error": error_message, "link": link})
-
-        try:
-            summary = ai_long_summary(therapist_json_string, "gpt-4o")
-            therapist_json["summary"] = summary
-            print(f"AI Long Summary: {summary[0:50]}")
-        except Exception as e:
-            error_message = (
-                f"Error generating AI long summary for link {link}: {str(e)}"
-            )
-            therapist_json["summary"] = None
-            errors.append({"error": error_message, "link": link})
-
-        try:
-            short_summary = ai_short_summary(therapist_json_string, "gpt-4o")
-            therapist_json["short_summary"] = short_summary
-            print(f"AI Short Summary: {summary[0:50]}")
-        except Exception as e:
-            error_message = (
-                f"Error generating AI short summary for link {link}: {str(e)}"
+            therapist_json[field] = fallback
+            if name == "long_summary":
+                raise RuntimeError(error_message)
+            job["errors"].append({"error": error_message, "link": link})
+    return job
+
+
+def stage_embed(jobs):
+    """Embed the summaries of a batch of therapists in as few requests as possible."""
+    outputs = list(jobs)
+    to_embed = []
+    for position, job in enumerate(jobs):
+        if job["therapist_json"].get("summary"):
+            to_embed.append(position)
+        else:
+            outputs[position] = ValueError(
+                f"Error uploading therapist data for link {job['link']}: no summary to embed"
             )
-            therapist_json["short_summary"] = None
-            errors.append({"error": error_message, "link": link})
-
-        try:
-            embedding = get_embedding(therapist_json.get("summary"))
-            response = upload_therapist(embedding, therapist_json)
-            print(f"Pinecone Success: {response}")
-        except Exception as e:
-            error_message = f"Error uploading therapist data for link {link}: {str(e)}"
-            errors.append({"error": error_message, "link": link})
-
-    if errors:
-        print(f"{len(links)} links // {len(errors)} errors:")
-        for error in errors:
-            print(f"Link: {error['link']} - Error: {error['error']}")
+
+    if to_embed:
+        embeddings = get_embeddings(
+            [jobs[position]["therapist_json"]["summary"] for position in to_embed]
+        )
+        for position, embedding in zip(to_embed, embeddings):
+            jobs[position]["embedding"] = embedding
+    return outputs
+
+
+def stage_upload(job, writer, uploading):
+    """
+    Queue the therapist on the shared writer. The job waits in uploading
+    until the writer reports how its batch went.
+    """
+    job["vector_id"] = therapist_id(job["link"])
+    uploading[job["vector_id"]] = job
+    writer.add(job["vector_id"], job["embedding"], job["therapist_json"])
+    return job
+
+
+def save_page_state(job):
+    """Remember this run's stage outputs, and mark the page done if nothing failed."""
+    outputs = dict(job.get("stage_outputs", {}))
+    if not job["errors"]:
+        outputs["page"] = (job["text_hash"], {"vector_id": job["vector_id"]})
+    if outputs:
+        page_state.put_many(job["link"], outputs)
+
+
+def timed(perf, name, fn, model=None):
+    """Wrap a stage or LLM graph function so each call is a span tagged with its link(s)."""
+
+    @functools.wraps(fn)
+    def run(item, *args):
+        if isinstance(item, list):
+            metadata = {"links": [job["link"] for job in item]}
+        else:
+            metadata = {"link": item["link"]}
+        if model:
+            metadata["model"] = model
+        with perf.track(name, metadata):
+            return fn(item, *args)
+
+    return run
+
+
+def performance_paths(function_name):
+    """Where this run's spans and summary go under PERF_DIR."""
+    now = time.time()
+    stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(now)) + f"{now % 1:.3f}"[1:]
+    # Shards of the same run can start in the same millisecond.
+    stamp += f"-{os.getpid()}"
+    base = os.path.join(PERF_DIR, f"{function_name}-{stamp}")
+    return f"{base}.jsonl", f"{base}-summary.json"
+
+
+class RunReport:
+    """Running totals for a streamed run, so nothing per link is kept once it's done."""
+
+    def __init__(self):
+        self.links = 0
+        self.unchanged = 0
+        self.tokens_before = 0
+        self.tokens_after = 0
+        self.reduced = 0
+        self.errors = []
+        self._lock = threading.Lock()
+
+    def add_errors(self, errors):
+        with self._lock:
+            for error in errors:
+                kind = "Skipped" if error.get("skipped") else "Error"
+                print(f"Link: {error['link']} - {kind}: {error['error']}")
+                self.errors.append(error)
+
+    def failures(self):
+        """The errors that aren't skips (links already in the index, duplicates...)."""
+        with self._lock:
+            return [error for error in self.errors if not error.get("skipped")]
+
+    def job_done(self, job):
+        with self._lock:
+            if job.get("unchanged"):
+                self.unchanged += 1
+            stats = job.get("reduce_stats")
+            if stats:
+                self.reduced += 1
+                self.tokens_before += stats["tokens_before"]
+                self.tokens_after += stats["tokens_after"]
+
+
+def upload_therapist_directory(
+    links, workers: dict = None, refresh: bool = False, resume: bool = False
+):
+    """
+    Scrape, parse, summarize and upload each therapist link.
+
+    links can be any iterable, e.g. a generator reading a file; it is
+    consumed lazily and each link is forgotten once it is done, so memory
+    doesn't grow with the number of links.
+    Links flow through a staged pipeline so several profiles are in flight at
+    once. Pass workers={"extract": 8, ...} to override STAGE_WORKERS.
+    With refresh=True, links already in the index are re-checked: unchanged
+    pages are skipped, and changed pages only re-run the stages whose input
+    changed.
+    Every stage's outcome goes into the ingest journal. With resume=True,
+    links that finished in an earlier run are left out and stages that
+    completed are restored from the journal instead of re-run.
+    Each stage, LLM call and upsert is timed; the spans and a p50/p95/p99
+    summary per stage are written to PERF_DIR.
+    Returns the list of {"error", "link"} dicts, in the order they happened.
+    Links a stage skipped on purpose (SkipItem: already in the index, a
+    duplicate, nothing to scrape) have "skipped": True.
+    """
+    stage_workers = {**STAGE_WORKERS, **(workers or {})}
+    spans_path, summary_path = performance_paths("upload_therapist_directory")
+    perf = create_performance_tracker("upload_therapist_directory", spans_path=spans_path)
+    report = RunReport()
+    manifest = VectorManifest()
+    if not manifest.links:
+        manifest.sync(get_index())
+
+    # Jobs handed to the writer, until Pinecone confirms or rejects them.
+    uploading = {}
+
+    def upload_done(vector_id, upsert_error):
+        job = uploading.pop(vector_id, None)
+        if job is None:
+            return
+        if upsert_error:
+            error_message = f"Error uploading therapist data for link {job['link']}: {upsert_error}"
+            job["errors"].append({"error": error_message, "link": job["link"]})
+            journal.mark_failed(job["link"], "upload", upsert_error)
+        else:
+            manifest.add(job["link"], job["vector_id"])
+            save_page_state(job)
+            journal.mark_done(job["link"], "upload", {"vector_id": job["vector_id"]})
+        report.add_errors(job["errors"])
+        report.job_done(job)
+
+    def result(job):
+        # Uploaded jobs are finished by upload_done once Pinecone answers.
+        if job.get("unchanged"):
+            journal.mark_done(job["link"], "upload", {"unchanged": True})
+            report.add_errors(job["errors"])
+            report.job_done(job)
+
+    def failure(failure):
+        job = failure["item"]
+        error = failure["error"]
+        report.add_errors(
+            job["errors"]
+            + [
+                {
+                    "error": str(error),
+                    "link": job["link"],
+                    "skipped": isinstance(error, SkipItem),
+                }
+            ]
+        )
+        report.job_done(job)
+
+    def jobs():
+        for link in links:
+            report.links += 1
+            if resume:
+                if journal.is_finished(link):
+                    continue
+            else:
+                journal.reset([link])
+            yield {"link": link, "errors": []}
+
+    writer = UpsertWriter(
+        get_index(),
+        metadata_validator=valid_metadata_size,
+        tracker=perf,
+        on_result=upload_done,
+    )
+    # Every profile in the llm stage can have all its graph calls in flight.
+    llm_executor = ThreadPoolExecutor(
+        max_workers=stage_workers["llm"] * len(PROFILE_LLM_GRAPH)
+    )
+    llm_graph = [
+        LLMStage(
+            stage.name,
+            timed(perf, f"llm:{stage.name}", stage.fn, stage.model),
+            stage.needs,
+            stage.model,
+        )
+        for stage in PROFILE_LLM_GRAPH
+    ]
+    pipeline = Pipeline(
+        [
+            Stage(
+                "check_exists",
+                functools.partial(
+                    stage_check_exists, manifest=manifest, seen=set(), refresh=refresh
+                ),
+                stage_workers["check_exists"],
+                batch_size=FETCH_BATCH_SIZE,
+                batch_wait=0.5,
+            ),
+            Stage(
+                "fetch",
+                journaled(
+                    "fetch",
+                    timed(perf, "fetch", stage_fetch),
+                    journal,
+                    resume=resume,
+                    unneeded_after="llm",
+                ),
+                stage_workers["fetch"],
+            ),
+            Stage(
+                "parse",
+                journaled(
+                    "parse",
+                    timed(perf, "parse", stage_parse),
+                    journal,
+                    resume=resume,
+                    unneeded_after="llm",
+                ),
+                stage_workers["parse"],
+            ),
+            Stage(
+                "extract",
+                journaled(
+                    "extract",
+                    timed(perf, "extract", stage_extract),
+                    journal,
+                    JOURNAL_KEYS["extract"],
+                    resume,
+                ),
+                stage_workers["extract"],
+            ),
+            Stage(
+                "llm",
+                journaled(
+                    "llm",
+                    functools.partial(stage_llm, executor=llm_executor, graph=llm_graph),
+                    journal,
+                    JOURNAL_KEYS["llm"],
+                    resume,
+                ),
+                stage_workers["llm"],
+            ),
+            Stage(
+                "embed",
+                journaled_batch(
+                    "embed",
+                    timed(perf, "embed", stage_embed),
+                    journal,
+                    JOURNAL_KEYS["embed"],
+                    resume,
+                ),
+                stage_workers["embed"],
+                batch_size=EMBED_BATCH_SIZE,
+                batch_wait=EMBED_BATCH_WAIT,
+            ),
+            Stage(
+                "upload",
+                functools.partial(stage_upload, writer=writer, uploading=uploading),
+                stage_workers["upload"],
+            ),
+        ]
+    )
+    pipeline.run(jobs(), on_result=result, on_failure=failure)
+    llm_executor.shutdown()
+    writer.close()
+    manifest.save()
+
+    print(f"Pinecone: {writer.report()['upserted']} vectors upserted.")
+    if report.unchanged:
+        print(f"{report.unchanged} unchanged pages skipped.")
+    failures = report.failures()
+    if report.errors:
+        print(
+            f"{report.links} links // {len(failures)} errors, "
+            f"{len(report.errors) - len(failures)} skipped."
+        )
     else:
         print("No errors.")
+    if report.reduced:
+        print(
+            f"extract_json prompt: {report.tokens_before / report.reduced:.0f} -> "
+            f"{report.tokens_after / report.reduced:.0f} tokens on average."
+        )
+    print(f"Embedding cache: {embedding_cache.stats()}")
+    print(f"LLM cache: {llm_cache.stats()}")
+    perf.complete()
+    perf.write_summary(summary_path)
+    perf.print_percentiles()
+
+    return report.errors
+
+
+def retry_failed_links(workers: dict = None):
+    """
+    Re-run the dead-lettered links: each picks up at the stage that failed,
+    with the stages before it restored from the journal.
+    """
+    failed = journal.failed_links()
+    if not failed:
+        print("No failed links to retry.")
+        return []
+    for link, (stage, error, attempts) in failed.items():
+        print(f"Retrying {link} from {stage} (attempt {attempts + 1}): {error}")
+    # Failed links never made it into the manifest, except ones being refreshed.
+    return upload_therapist_directory(
+        list(failed), workers=workers, refresh=True, resume=True
+    )
+
+
+DEFAULT_LINKS_FILE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "therapist_links.txt"
+)
+
+
+def run_processes(argv, shard, processes):
+    """
+    Split this process's shard into `processes` sub-shards and run each in its
+    own child process with the same arguments. Returns the worst exit code.
+    """
+    index, count = shard or (0, 1)
+    children = []
+    for k in range(processes):
+        sub_shard = f"{index + count * k}/{count * processes}"
+        command = [sys.executable, os.path.abspath(__file__), *argv, "--shard", sub_shard]
+        print(f"Starting shard {sub_shard}")
+        children.append(subprocess.Popen(command))
+    return max(child.wait() for child in children)
+
+
+def cli(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    parser = argparse.ArgumentParser(description="Upload therapist profiles to Pinecone.")
+    parser.add_argument(
+        "command",
+        nargs="?",
+        default="run",
+        choices=["run", "retry", "search"],
+        help="run: process the input links; retry: re-run links that failed; "
+        "search: find therapists in the local index (VECTOR_BACKEND=local)",
+    )
+    parser.add_argument(
+        "-i",
+        "--input",
+        default=DEFAULT_LINKS_FILE,
+        help="file of links, one per line or NDJSON {\"link\": ...}; - for stdin",
+    )
+    parser.add_argument(
+        "--shard",
+        type=parse_shard,
+        help="i/N: only handle links whose hash falls in shard i (0-based) of N",
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=1,
+        help="split the work (or this --shard) across this many processes",
+    )
+    parser.add_argument("--limit", type=int, help="stop after this many links (per process)")
+    parser.add_argument(
+        "--since",
+        type=parse_since,
+        help="skip NDJSON records whose --since-field is older than this ISO date or Unix time",
+    )
+    parser.add_argument(
+        "--since-field",
+        default="updated_at",
+        help="NDJSON field --since compares against (default: updated_at)",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="skip links and stages finished by an earlier run",
+    )
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="re-check links that are already in the index",
+    )
+    search = parser.add_argument_group("search")
+    search.add_argument("-q", "--query", help="what the client is looking for")
+    search.add_argument("--top-k", type=int, default=10)
+    search.add_argument("--gender")
+    search.add_argument("--availability", choices=["online", "in_person", "both"])
+    search.add_argument("--clinic-city")
+    search.add_argument("--clinic-province")
+    search.add_argument("--focus", nargs="+", help="areas of focus, any of which can match")
+    search.add_argument("--max-price", type=float, help="highest initial session price")
+    args = parser.parse_args(argv)
+
+    if args.command == "retry":
+        retry_failed_links()
+        return 0
+
+    if args.command == "search":
+        if not args.query:
+            parser.error("search needs --query")
+        matches = search_therapists(
+            args.query,
+            args.top_k,
+            gender=args.gender,
+            availability=args.availability,
+            clinic_city=args.clinic_city,
+            clinic_province=args.clinic_province,
+            areas_of_focus=args.focus,
+            max_price_initial=args.max_price,
+        )
+        for vector_id, similarity, metadata in matches:
+            print(f"{similarity:.3f}  {metadata.get('name')}  {metadata.get('bio_link')}")
+        return 0
+
+    if args.processes > 1:
+        if args.input == "-":
+            parser.error("--processes needs a file input; stdin can only be read once")
+        child_argv = []
+        skip = False
+        for arg in argv:
+            if skip:
+                skip = False
+            elif arg in ("--processes", "--shard"):
+                skip = True
+            elif not arg.startswith(("--processes=", "--shard=")):
+                child_argv.append(arg)
+        return run_processes(child_argv, args.shard, args.processes)
 
-
-if __name__ == "__main__":
-    # thrive
     start = time.time()
-    links = [
-        # thrive
-        # "https://thrivedowntown.com/our-team/andressa-taverna/",
-        # "https://thrivedowntown.com/our-team/andrew-jarvis/",
-        # "https://thrivedowntown.com/our-team/estairia/",
-        # "https://thrivedowntown.com/our-team/colter-long/",
-        # "https://thrivedowntown.com/our-team/serena-slatten/",
-        # "https://thrivedowntown.com/our-team/xiva-taverna/",
-        # "https://thrivedowntown.com/our-team/jess-cumming/",
-        # "https://thrivedowntown.com/our-team/joel-myers/",
-        # "https://thrivedowntown.com/our-team/marwan-noueihed/",
-        # "https://thrivedowntown.com/our-team/fabiola-perez/",
-        # "https://thrivedowntown.com/our-team/mohit-bassi/",
-        # "https://thrivedowntown.com/our-team/laura-lu/",
-        # "https://thrivedowntown.com/our-team/giulia-haedar/",
-        # "https://thrivedowntown.com/our-team/cam-wharram/",
-        # "https://thrivedowntown.com/our-team/sara-bruno/",
-        # Avery
-        # "https://www.averytherapy.com/bruce-avery",
-        # "https://www.averytherapy.com/leifennie-ang",
-        # "https://www.averytherapy.com/jiten-beairsto",
-        # "https://www.averytherapy.com/alex-curtis",
-        # "https://www.averytherapy.com/nora-clarke",
-        # "https://www.averytherapy.com/alex-curtis",
-        # "https://www.averytherapy.com/chantal-esperanza",
-        # "https://www.averytherapy.com/nash-tawfik",
-        # "https://www.averytherapy.com/john-tolentino",
-        # "https://www.averytherapy.com/galina-freed",
-        # "https://www.averytherapy.com/lauren-gill",
-        # "https://www.averytherapy.com/jaylynn-henry",
-        # "https://www.averytherapy.com/zoe-ho",
-        # "https://www.averytherapy.com/jana-hruba",
-        # "https://www.averytherapy.com/yosra-matar",
-        # "https://www.averytherapy.com/alice-kim",
-        # "https://www.averytherapy.com/hanna-peterson",
-        # "https://www.averytherapy.com/lily-rogers",
-        # "https://www.averytherapy.com/alexia-spencer",
-        # "https://www.averytherapy.com/utku-ucay",
-        # "https://www.averytherapy.com/kudret-sekhon",
-        # "https://www.averytherapy.com/lisa-wu",
-        # "https://www.blueskywellnessclinic.ca/meet-the-team/annelise-price/",
-        # "https://www.blueskywellnessclinic.ca/meet-the-team/anya-farmer/",
-        # "https://www.blueskywellnessclinic.ca/meet-the-team/evanna-kieran/",
-        # "https://www.blueskywellnessclinic.ca/meet-the-team/jacqueline-allen/",
-        # "https://www.blueskywellnessclinic.ca/meet-the-team/kolby-kehr/",
-        # "https://www.blueskywellnessclinic.ca/meet-the-team/sangeeta-sirohi/",
-        # "https://www.blueskywellnessclinic.ca/meet-the-team/savannah-talbot-kelly/",
-        # "https://www.blueskywellnessclinic.ca/meet-the-team/stephanie-beck/",
-        # Peak Sky
-        # "https://www.peak-resilience.com/sarah-lally/",
-        # "https://www.peak-resilience.com/rachel-keyzer/",
-        # "https://www.peak-resilience.com/jona-ombao-appadu/",
-        # "https://www.peak-resilience.com/sunny-singhawachna/",
-        # "https://www.peak-resilience.com/jennifer-hollinshead/",
-        # "https://www.peak-resilience.com/mindy-chiang/",
-        # "https://www.peak-resilience.com/dr-miriam-pai-spering/",
-        # "https://www.peak-resilience.com/emily-potts/",
-        # "https://www.peak-resilience.com/jennifer-lingbaoan/",
-        # "https://www.peak-resilience.com/danny-doerksen/",
-        # "https://www.peak-resilience.com/kevin-vun/",
-        # "https://www.peak-resilience.com/erin-voith/",
-        # "https://www.peak-resilience.com/allie-montoya/",
-        # "https://www.peak-resilience.com/bess-mccarville/",
-        # "https://www.peak-resilience.com/mahlia-dalgleish/",
-        # "https://www.peak-resilience.com/harroop-sandhu/",
-        # "https://www.peak-resilience.com/tanu-gamble/",
-        # "https://www.peak-resilience.com/sk-skinner/",
-        # "https://www.peak-resilience.com/tajah-olson/",
-        # "https://www.peak-resilience.com/laura-langen/",
-        # "https://www.peak-resilience.com/wendy-ma/",
-        # "https://www.peak-resilience.com/geetika-virdi/",
-        # "https://www.peak-resilience.com/luke-primus/",
-        # "https://www.peak-resilience.com/stephanie-c/",
-        # "https://www.peak-resilience.com/sumeet-bhamra/",
-        # "https://www.peak-resilience.com/kassie-maxwell-2/",
-        # "https://skylarkclinic.ca/home/your-team/rebeka-senanayake/",
-        # "https://skylarkclinic.ca/your-team/Kevin-Kraussler/",
-        # "http://skylarkclinic.ca/your-team/anna-nicol",
-        # "https://skylarkclinic.ca/home/your-team/jenna-mitchell/",
-        # "http://skylarkclinic.ca/your-team/kalie-brown/",
-        # "https://skylarkclinic.ca/your-team/abby-wong/",
-        # "http://skylarkclinic.ca/heather-deans",
-        # "http://skylarkclinic.ca/your-team/elizabeth-medina",
-        # "http://skylarkclinic.ca/scott-arner/",
-        # "http://skylarkclinic.ca/your-team/laurie-hollingdrake/",
-        # "https://skylarkclinic.ca/clayton-andres",
-        # "https://skylarkclinic.ca/your-team/kaitlin-harvey",
-        # "https://skylarkclinic.ca/home/your-team/manmeet-chhina/",
-        # "https://skylarkclinic.ca/your-team/lorraine-schembri",
-        # "https://abbotsford.skylarkclinic.ca/your-team/pavan-goraya/?_gl=1*12csn18*_gcl_aw*R0NMLjE3MjAyMDUwOTEuQ2owS0NRandzNTYwQmhDdUFSSXNBSE1xRTBFWC1YOGVfVHFEX0xybUJ4dm51Q3pzdXU3S2dvdXlOVkhTSFdiLU1rTldhVWJzSDVrQ2xIWWFBaGFkRUFMd193Y0I.*_gcl_au*NTQyOTkxODIuMTcyMDIwNTA2OQ..*_ga*MjAxNTIyMjg5NC4xNzIwMjA1MDY5*_ga_0TT1ZL9H17*MTcyMDIwNTA2OC4xLjEuMTcyMDIwNTI1MS4yNi4wLjA.",
-        # "http://skylarkclinic.ca/rupinder-sidhu/",
-        # "http://skylarkclinic.ca/your-team/danielle-holtjer/",
-        # "https://lotustherapy.ca/chantale-pamplin/",
-        # "https://lotustherapy.ca/nilou-esmaeilpour/",
-        # "https://lotustherapy.ca/rachelle-buck/",
-        # "https://lotustherapy.ca/lisa-ward/",
-        # "https://lotustherapy.ca/jessica-atnikov/",
-        # "https://lotustherapy.ca/jessica-atnikov/",
-        # "https://lotustherapy.ca/dimi-nikolarakos/",
-        # "https://lotustherapy.ca/christianne-zamorano/",
-        # "https://lotustherapy.ca/carlos-dominguez/",
-        # "https://lotustherapy.ca/ryan-newman/",
-        # "https://lotustherapy.ca/andy-de-bruyns/",
-        # "https://lotustherapy.ca/alia-mai/",
-        # "https://lotustherapy.ca/nicole-che/",
-        # "https://lotustherapy.ca/parinaz-falsafi/",
-        # "https://lotustherapy.ca/khushi-meher/",
-        # "https://lotustherapy.ca/ferdie-mateos/",
-        # "https://www.latitude-wellness.com/shawna/",
-        # "https://www.latitude-wellness.com/duncan-keist/",
-        # "https://www.latitude-wellness.com/allisonmasse/",
-        # "https://www.latitude-wellness.com/humberto/",
-        # "https://www.latitude-wellness.com/jennifer-turnbrook/",
-        # "https://www.latitude-wellness.com/rita/",
-        # "https://www.latitude-wellness.com/ailee/",
-        # "https://www.latitude-wellness.com/vanessa/",
-        # "https://www.latitude-wellness.com/gorette-imm/",
-        # "https://www.latitude-wellness.com/rhiannon-latimer/",
-        # "https://www.latitude-wellness.com/jill/",
-        # "https://www.latitude-wellness.com/lauren/",
-        # "https://openspacecounselling.ca/jyoti-rana/",
-        # "https://openspacecounselling.ca/andy-park/",
-        # "https://openspacecounselling.ca/carly-belzberg/",
-        # "https://openspacecounselling.ca/nicola-thackwell/",
-        # "https://openspacecounselling.ca/cat-main/",
-        # "https://openspacecounselling.ca/maja-miljkovic/",
-        # "https://openspacecounselling.ca/peggy-harowitz/",
-        # "https://openspacecounselling.ca/jane-wyllychuk/",
-        # "https://openspacecounselling.ca/susan-oliveira/",
-        # "https://openspacecounselling.ca/sonja-huege/",
-        # "https://openspacecounselling.ca/mark-majewski/",
-        # "https://openspacecounselling.ca/kristina-barr/",
-        # "https://openspacecounselling.ca/julie-bodhanova/",
-        # "https://openspacecounselling.ca/nicole-nozick/",
-        # "https://openspacecounselling.ca/adriann-conner/",
-        # "https://www.nightingalecounselling.com/hart/",
-        # "https://www.nightingalecounselling.com/shane/",
-        # "https://www.nightingalecounselling.com/carolina-radovan/",
-        # "https://www.nightingalecounselling.com/ann-gudmundson/",
-        # "https://www.nightingalecounselling.com/faranak-ghorbani/",
-        # "https://www.nightingalecounselling.com/adrienne-foster/",
-        # "https://www.nightingalecounselling.com/melanie-fernandez/",
-        # "https://www.nightingalecounselling.com/jane-rea/",
-        # "https://www.nightingalecounselling.com/isaiah-finkelstein/",
-        # "https://www.nightingalecounselling.com/bernadette-amiscray/",
-        # "https://www.nightingalecounselling.com/evangelos-gkaldanidis/",
-        # "https://www.nightingalecounselling.com/bernadette-yeo/",
-        # "https://www.nightingalecounselling.com/nazanin-zarei/",
-        # "https://www.nightingalecounselling.com/justin-tillyer/",
-        # "https://www.nightingalecounselling.com/kenton-klassen/",
-        # "https://fieldworkcounselling.ca/team/chris-ho/",
-        # "https://fieldworkcounselling.ca/team/wendy-li/",
-        # "https://fieldworkcounselling.ca/team/elizabeth-smith/",
-        # "https://fieldworkcounselling.ca/team/veronika-tkacova/",
-        # "https://fieldworkcounselling.ca/team/kara-bezuko/",
-        # "https://fieldworkcounselling.ca/team/halina-deptuck/",
-        # "https://fieldworkcounselling.ca/team/sophia-mivasair/",
-        # "https://fieldworkcounselling.ca/team/graham-butler/",
-        # "https://fieldworkcounselling.ca/team/samantha-devlin/",
-        # "https://fieldworkcounselling.ca/team/fernanda-borja/",
-        # "https://fieldworkcounselling.ca/team/whitney-humphry/",
-        "https://anxietyandstressrelief.com/karen-benbassat-ali/",
-        "https://anxietyandstressrelief.com/dr-avrum-miller/",
-        "https://anxietyandstressrelief.com/carmen-everall/",
-        "https://anxietyandstressrelief.com/tara-read-m-ed-rcc/",
-        "https://anxietyandstressrelief.com/julia-meissenheimer/",
-        "https://anxietyandstressrelief.com/maryam-abdipour-ma-rcc/",
-        "https://anxietyandstressrelief.com/katrina-santos/",
-        "https://anxietyandstressrelief.com/christina-di-cesare-ma/",
-        "https://anxietyandstressrelief.com/lola-rozan/",
-        "https://anxietyandstressrelief.com/lori-sangha/",
-        "https://anxietyandstressrelief.com/sindy-taylor/",
-        "https://anxietyandstressrelief.com/leila-milani/",
-        "https://anxietyandstressrelief.com/shawn-hannay-ma-rcc/",
-        "https://anxietyandstressrelief.com/lisa-stefani-m-a-rcc/",
-        "https://anxietyandstressrelief.com/nogol-mesgarani/",
-        "https://anxietyandstressrelief.com/pam-vickram/",
-        "https://anxietyandstressrelief.com/isabelle-st-jean-rsw-pcc-rtc/",
-        "https://anxietyandstressrelief.com/stacy-kunder/",
-        "https://anxietyandstressrelief.com/godfrey-zimuto/",
-        "https://anxietyandstressrelief.com/jennifer-scott/",
-        "https://anxietyandstressrelief.com/skyelar-napier-m-a-r-c-c/",
-        "https://anxietyandstressrelief.com/geoff-lyon/",
-        "https://anxietyandstressrelief.com/sara-nahri-ma-rcc/",
-        "https://anxietyandstressrelief.com/jade-elise-kirk/",
-        "https://anxietyandstressrelief.com/nicole-bowlsby/",
-        "https://anxietyandstressrelief.com/susana-diaz-bahamon/",
-        "https://anxietyandstressrelief.com/alex-durian/",
-        # "https://counsellingservicesvancouver.com/clinical-director-ruth-ann-stewart/",
-        # "https://counsellingservicesvancouver.com/susan-giles/",
-        # "https://counsellingservicesvancouver.com/laura-chiarenza/",
-        # "https://counsellingservicesvancouver.com/richard-marquez/",
-        # "https://counsellingservicesvancouver.com/meena-hukam/",
-        # "https://counsellingservicesvancouver.com/karen-tennock/",
-        # "https://counsellingservicesvancouver.com/john-segui/",
-        # "https://counsellingservicesvancouver.com/Laura-Offenwanger/",
-        # "https://www.blueskywellnessclinic.ca/meet-the-team/ricardo-simczak-prates/",
-    ]
-
-    print(f"processing therapists {len(links)}")
-    upload_therapist_directory(links)
-
+    with open_links(args.input) as lines:
+        links = select_links(
+            lines,
+            shard=args.shard,
+            since=args.since,
+            since_field=args.since_field,
+            limit=args.limit,
+        )
+        errors = upload_therapist_directory(links, refresh=args.refresh, resume=args.resume)
     end = time.time()
+    print(f"total duration: {end - start} seconds")
+    # Skips are expected on every re-run; only real failures fail the run.
+    return 1 if any(not error.get("skipped") for error in errors) else 0
+
 
-    print(f"total duration for {len(links)} : {end - start} seconds")
+if __name__ == "__main__":
+    sys.exit(cli())
@@ -0,0 +1,120 @@
+"""
+Local manifest of which therapist links are already in the Pinecone index.
+
+Vector IDs are derived from the canonical bio_link, so the same therapist always
+maps to the same ID and can't be stored twice. Existence checks hit the local
+manifest first, then fall back to one batched fetch per 100 links.
+
+Usage:
+    manifest = VectorManifest()
+    if not manifest.links:
+        manifest.sync(index)  # one-time: list the index in pages
+    existing = manifest.existing_links(links, index)
+"""
+
+import json
+import os
+import threading
+import uuid
+from urllib.parse import urlsplit, urlunsplit
+
+DEFAULT_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), ".cache", "therapist_manifest.json"
+)
+# Pinecone fetches are sent as a list of IDs; keep each request small.
+FETCH_BATCH_SIZE = 100
+
+
+def canonical_link(link):
+    """
+    Normalize a bio link so trivial variations map to the same therapist:
+    https scheme, lowercase host without www, no query/fragment, no trailing slash.
+    """
+    parts = urlsplit(link.strip())
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit(("https", host, path, "", ""))
+
+
+def therapist_id(link):
+    """Deterministic vector ID for a bio link."""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, canonical_link(link)))
+
+
+class VectorManifest:
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        self.links = {}  # canonical link -> vector id
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path) as f:
+                self.links = json.load(f).get("links", {})
+
+    def save(self):
+        """
+        Write the manifest, merged with what is on disk, so processes working on
+        different shards don't drop each other's links.
+        """
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        on_disk = {}
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                on_disk = json.load(f).get("links", {})
+        with self._lock:
+            self.links = {**on_disk, **self.links}
+            data = {"links": dict(self.links)}
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    def add(self, link, vector_id=None):
+        with self._lock:
+            self.links[canonical_link(link)] = vector_id or therapist_id(link)
+
+    def existing_links(self, links, index):
+        """
+        Return the subset of links already in the index.
+
+        Links found in the manifest cost nothing. The rest are looked up by their
+        deterministic ID with one fetch per FETCH_BATCH_SIZE links.
+        """
+        existing = set()
+        unknown = {}
+        for link in links:
+            if canonical_link(link) in self.links:
+                existing.add(link)
+            else:
+                unknown.setdefault(therapist_id(link), []).append(link)
+
+        ids = list(unknown)
+        for start in range(0, len(ids), FETCH_BATCH_SIZE):
+            response = index.fetch(ids=ids[start : start + FETCH_BATCH_SIZE])
+            for vector_id in response.vectors:
+                for link in unknown.get(vector_id, []):
+                    existing.add(link)
+                    self.add(link, vector_id)
+        return existing
+
+    def sync(self, index, page_size=100):
+        """
+        Rebuild the manifest from the index: list every vector ID in pages, then
+        fetch the bio_link for IDs we don't know yet (records uploaded before IDs
+        were deterministic).
+        """
+        known_ids = set(self.links.values())
+        unknown_ids = []
+        for page in index.list(limit=page_size):
+            unknown_ids.extend(vector_id for vector_id in page if vector_id not in known_ids)
+
+        for start in range(0, len(unknown_ids), FETCH_BATCH_SIZE):
+            response = index.fetch(ids=unknown_ids[start : start + FETCH_BATCH_SIZE])
+            for vector_id, vector in response.vectors.items():
+                bio_link = (vector.metadata or {}).get("bio_link")
+                if bio_link:
+                    self.add(bio_link, vector_id)
+
+        print(f"Manifest synced: {len(self.links)} therapists in the index.")
+        self.save()